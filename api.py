@@ -0,0 +1,319 @@
+import asyncio
+import base64
+import json
+import os
+import secrets
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+import cache
+import db
+import library
+import migrations
+import paging
+import pdf_store
+import search
+import stats
+import writer
+
+# ===== HTTP API =====
+# JSON endpoints for kiosks and the campus portal, served by an ASGI server
+# next to the Streamlit UI:
+#
+#     LMS_API_TOKEN=... uvicorn api:app --workers 4
+#
+# Handlers are async; the blocking SQLite work runs on Starlette's thread
+# pool against one ConnectionPool per worker process, through the same
+# library/search/paging code the app uses. Writes are queued on the worker's
+# writer.WriteQueue and awaited without holding a thread. Reads go through a
+# QueryCache that notices commits from the app and other workers (PRAGMA
+# data_version). Uploaded PDFs are served from pdf_store at /pdfs/<sha256>.
+# Every request needs "Authorization: Bearer $LMS_API_TOKEN", except PDF
+# downloads: catalog links open in a plain browser tab, and the URL is the
+# hash of the file.
+
+API_TOKEN = os.environ.get("LMS_API_TOKEN")
+MAX_PAGE_SIZE = 100
+MAX_SEARCH_RESULTS = 50
+PDF_CACHE_CONTROL = "public, max-age=31536000, immutable"     # a stored file never changes
+
+
+@asynccontextmanager
+async def lifespan(app):
+    pool = db.ConnectionPool()
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    app.state.pool = pool
+    app.state.writer = writer.WriteQueue()
+    app.state.pdf_store = pdf_store.PdfStore()
+    app.state.cache = cache.QueryCache(watch_conn=db.open_connection())
+    yield
+    app.state.writer.close()
+    pool.close()
+
+
+app = FastAPI(title="Knowledge Hub API", lifespan=lifespan)
+bearer = HTTPBearer(auto_error=False)
+
+
+def require_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)):
+    if not API_TOKEN:
+        raise HTTPException(503, "API disabled: LMS_API_TOKEN is not set")
+    if credentials is None or not secrets.compare_digest(credentials.credentials, API_TOKEN):
+        raise HTTPException(401, "Invalid or missing API token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+def get_pool(request: Request):
+    return request.app.state.pool
+
+
+def get_cache(request: Request):
+    return request.app.state.cache
+
+
+def get_writer(request: Request):
+    return request.app.state.writer
+
+
+def get_pdf_store(request: Request):
+    return request.app.state.pdf_store
+
+
+@contextmanager
+def http_errors():
+    """Turn library errors into HTTP errors"""
+    try:
+        yield
+    except library.NotFound as e:
+        raise HTTPException(404, str(e))
+    except library.Unavailable as e:
+        raise HTTPException(409, str(e))
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+
+
+async def call(fn, *args):
+    """Run blocking library code off the event loop, mapping its errors"""
+    with http_errors():
+        return await run_in_threadpool(fn, *args)
+
+
+async def write(writes, query_cache, operation, *args):
+    """Queue a library write on the writer thread and drop the cached reads it affects"""
+    with http_errors():
+        result = await asyncio.wrap_future(writes.submit(operation, *args))
+    query_cache.invalidate(*library.WRITES[operation.__name__])
+    return result
+
+
+# ----- cursors: paging.Page.next_cursor <-> opaque string -----
+
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except ValueError:
+        raise HTTPException(422, "Invalid cursor")
+    if (not isinstance(cursor, list) or len(cursor) != 2
+            or not all(value is None or isinstance(value, (str, int, float)) for value in cursor)):
+        raise HTTPException(422, "Invalid cursor")
+    return tuple(cursor)
+
+
+# ----- request/response models -----
+
+class Book(BaseModel):
+    id: int
+    title: str
+    author: Optional[str] = None
+    genre: Optional[str] = None
+    price: Optional[float] = None
+    pdf_link: Optional[str] = None
+    status: str
+    available: int
+    copies: int
+
+
+class BookPage(BaseModel):
+    books: List[Book]
+    next_cursor: Optional[str] = None
+
+
+class LoanRequest(BaseModel):
+    username: str
+    title: str
+
+
+class AssignRequest(BaseModel):
+    username: str
+    title: str
+    assigned_by: str
+
+
+class BookRequestIn(BaseModel):
+    username: str
+    title: str
+
+
+class StatusUpdate(BaseModel):
+    status: str
+
+
+class CopiesUpdate(BaseModel):
+    title: str
+    copies: int
+
+
+def _book(row):
+    return Book(id=row[0], title=row[1], author=row[2], genre=row[3], price=row[4],
+                pdf_link=pdf_store.url(row[5]), status=row[6], available=row[7], copies=row[8])
+
+
+# ----- catalog -----
+
+@app.get("/books", response_model=BookPage, dependencies=[Depends(require_token)])
+async def list_books(cursor: Optional[str] = None,
+                     page_size: int = Query(paging.DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                     sort: str = "id", descending: bool = False,
+                     author: Optional[str] = None, genre: Optional[str] = None,
+                     pool=Depends(get_pool), query_cache=Depends(get_cache)):
+    """Keyset-paginated catalog; pass `next_cursor` back to get the next page"""
+    position = decode_cursor(cursor)
+    filters = {"author": author, "genre": genre}
+    key = ("page", "books", position, page_size, sort, descending, tuple(filters.items()))
+    page = await call(query_cache.get_or_load, key, paging.VIEWS["books"].tables,
+                      lambda: paging.fetch_page(pool, "books", cursor=position, page_size=page_size,
+                                                sort=sort, descending=descending, filters=filters))
+    return BookPage(books=[_book(row) for row in page.rows], next_cursor=encode_cursor(page.next_cursor))
+
+
+@app.get("/books/search", response_model=List[Book], dependencies=[Depends(require_token)])
+async def search_books(q: Optional[str] = None, author: Optional[str] = None,
+                       genre: Optional[str] = None,
+                       limit: int = Query(search.DEFAULT_LIMIT, ge=1, le=MAX_SEARCH_RESULTS),
+                       pool=Depends(get_pool), query_cache=Depends(get_cache)):
+    """Ranked search with availability (what SHAIGO's availability check uses)"""
+    rows = await call(query_cache.get_or_load, ("search", q, author, genre, limit), ("books", "loans"),
+                      lambda: search.search_books(pool, q, author=author, genre=genre, limit=limit))
+    return [_book(row) for row in rows]
+
+
+@app.put("/books/copies", dependencies=[Depends(require_token)])
+async def set_copies(body: CopiesUpdate, writes=Depends(get_writer), query_cache=Depends(get_cache)):
+    await write(writes, query_cache, library.set_copies, body.title, body.copies)
+    return {"title": body.title, "copies": body.copies}
+
+
+# ----- circulation -----
+
+@app.post("/loans", status_code=201, dependencies=[Depends(require_token)])
+async def borrow(body: LoanRequest, pool=Depends(get_pool), writes=Depends(get_writer),
+                 query_cache=Depends(get_cache)):
+    user = await call(library.user_id, pool, body.username)
+    loan_id, book_id = await write(writes, query_cache, library.borrow_book, body.title, user)
+    return {"loan_id": loan_id, "book_id": book_id}
+
+
+@app.post("/returns", dependencies=[Depends(require_token)])
+async def return_book(body: LoanRequest, pool=Depends(get_pool), writes=Depends(get_writer),
+                      query_cache=Depends(get_cache)):
+    user = await call(library.user_id, pool, body.username)
+    loan_id = await write(writes, query_cache, library.return_book, body.title, user)
+    return {"loan_id": loan_id}
+
+
+@app.get("/users/{username}/loans", dependencies=[Depends(require_token)])
+async def user_loans(username: str, pool=Depends(get_pool)):
+    user = await call(library.user_id, pool, username)
+    rows = await call(library.user_loans, pool, user)
+    return [{"title": title, "borrowed_at": borrowed_at} for title, borrowed_at in rows]
+
+
+@app.post("/assignments", status_code=201, dependencies=[Depends(require_token)])
+async def assign(body: AssignRequest, pool=Depends(get_pool), writes=Depends(get_writer),
+                 query_cache=Depends(get_cache)):
+    # assigned_books.assigned_by is the admin's user id, as the app stores it
+    admin = await call(library.user_id, pool, body.assigned_by)
+    assignment_id = await write(writes, query_cache, library.assign_book,
+                                body.title, body.username, admin)
+    return {"assignment_id": assignment_id}
+
+
+# ----- book requests -----
+
+@app.post("/requests", status_code=201, dependencies=[Depends(require_token)])
+async def request_book(body: BookRequestIn, pool=Depends(get_pool), writes=Depends(get_writer),
+                       query_cache=Depends(get_cache)):
+    user = await call(library.user_id, pool, body.username)
+    request_id = await write(writes, query_cache, library.request_book, body.title, user)
+    return {"request_id": request_id}
+
+
+@app.get("/requests", dependencies=[Depends(require_token)])
+async def list_requests(username: Optional[str] = None, pool=Depends(get_pool)):
+    """Every request, or one user's with ?username="""
+    if username:
+        user = await call(library.user_id, pool, username)
+        rows = await call(library.user_requests, pool, user)
+        return [{"id": r[0], "title": r[1], "requested_on": r[2], "status": r[3]} for r in rows]
+    rows = await call(library.all_requests, pool)
+    return [{"id": r[0], "title": r[1], "username": r[2], "requested_on": r[3], "status": r[4]}
+            for r in rows]
+
+
+@app.patch("/requests/{request_id}", dependencies=[Depends(require_token)])
+async def update_request(request_id: int, body: StatusUpdate, writes=Depends(get_writer),
+                         query_cache=Depends(get_cache)):
+    await write(writes, query_cache, library.update_request, request_id, body.status)
+    return {"id": request_id, "status": body.status}
+
+
+# ----- PDFs -----
+
+@app.post("/pdfs", status_code=201, dependencies=[Depends(require_token)])
+async def upload_pdf(request: Request, store=Depends(get_pdf_store)):
+    """Stream a raw PDF request body into the store; use the returned link as pdf_link"""
+    with store.upload() as upload:
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(upload.write, chunk)
+            digest = await run_in_threadpool(upload.finish)
+        except pdf_store.PdfTooLarge as e:
+            raise HTTPException(413, str(e))
+        except ValueError as e:
+            raise HTTPException(422, str(e))
+    return {"sha256": digest, "size": upload.size, "pdf_link": pdf_store.link(digest),
+            "url": pdf_store.url(pdf_store.link(digest))}
+
+
+@app.api_route("/pdfs/{digest}", methods=["GET", "HEAD"])
+async def get_pdf(digest: str, request: Request, store=Depends(get_pdf_store)):
+    """A stored PDF, with byte ranges so viewers can fetch only the pages they show"""
+    if not store.exists(digest):
+        raise HTTPException(404, "PDF not found")
+    headers = {"ETag": f'"{digest}"', "Cache-Control": PDF_CACHE_CONTROL}
+    if request.headers.get("if-none-match") in (headers["ETag"], f'W/"{digest}"'):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(store.path(digest), media_type="application/pdf", headers=headers,
+                        filename=f"{digest}.pdf", content_disposition_type="inline")
+
+
+# ----- statistics -----
+
+@app.get("/stats", dependencies=[Depends(require_token)])
+async def circulation_stats(pool=Depends(get_pool)):
+    return await call(stats.summary, pool)
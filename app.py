@@ -1,15 +1,30 @@
-import sqlite3
-import streamlit as st
-import pandas as pd
-import bcrypt
-import base64
-from PIL import Image
-import io
 import time
-import google.generativeai as genai
+run_started = time.perf_counter()  # for the run timings on the Performance page
+import streamlit as st
 import os
-from functools import lru_cache
-import re
+import db
+import migrations
+import search
+import paging
+import pdf_store
+import pdf_text
+import cache
+import assets
+import llm_cache
+import intent
+import stats
+import importer
+import provisioning
+import auth
+import library
+import startup
+import writer
+# Imported on first use, so screens that don't need them never load them
+pd = startup.LazyModule("pandas")
+Image = startup.LazyModule("PIL.Image")
+similar = startup.LazyModule("similar")        # NumPy
+recommend = startup.LazyModule("recommend")    # SciPy
+pdf_reader = startup.LazyModule("pdf_reader")  # pdfium
 # Set page config FIRST (before any other Streamlit commands)
 st.set_page_config(
     page_title="SHAIGO - Library Assistant", 
@@ -17,24 +32,79 @@ st.set_page_config(
 )
 
 
-# In code
-genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+
+# ===== ONCE-PER-PROCESS RESOURCES =====
+@st.cache_resource
+def get_genai():
+    """Import and configure the Gemini SDK on first use"""
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    return genai
+
+@st.cache_resource
+def get_run_timer():
+    """Durations of this process's script runs (cold start and reruns)"""
+    return startup.RunTimer()
+
+
+# ===== DATABASE CONNECTION POOL =====
+@st.cache_resource
+def get_db():
+    """Shared, tuned SQLite connection pool (one per server process).
+
+    Pending schema migrations are applied here, so they run once per
+    process instead of on every rerun.
+    """
+    pool = db.ConnectionPool()
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    return pool
+
+@st.cache_resource
+def get_pdf_store():
+    """Content-addressed PDF files served by api.py at /pdfs/<sha256>"""
+    return pdf_store.PdfStore()
+
+@st.cache_resource
+def get_pdf_extractor():
+    """Background text extraction for book PDFs (worker processes start on first use)"""
+    return pdf_text.Extractor(get_db(), get_pdf_store()).start()
+
+@st.cache_resource
+def get_page_renderer():
+    """Renders book pages to images on demand, with a disk cache and prefetching"""
+    return pdf_reader.PageRenderer(get_pdf_store())
+
+@st.cache_resource
+def get_writer():
+    """Per-process writer thread; every session's writes are group-committed on it"""
+    get_db()    # migrations first
+    return writer.WriteQueue()
 
 
 
 # ===== PROFESSIONAL BACKGROUND HANDLER =====
-def set_background(image_path):
+@st.cache_resource
+def prepare_backgrounds():
+    """Resize/recompress every page background once per process"""
+    assets.build_all(backgrounds.values())
+
+def set_background(image_name):
     """
-    Enhanced background function with intelligent text contrast
+    Enhanced background function with intelligent text contrast.
+    Uses the pre-built variants from assets.py: static file URLs when static
+    serving is enabled, otherwise a memoized small WebP data URI.
     """
-    with open(image_path, "rb") as f:
-        img_data = base64.b64encode(f.read()).decode()
+    if st.get_option("server.enableStaticServing"):
+        background_rules = assets.background_css(image_name)
+    else:
+        background_rules = f'.stApp {{ background-image: url("{assets.background_data_uri(image_name)}"); }}'
     
     st.markdown(
         f"""
         <style>
+        {background_rules}
         .stApp {{
-            background-image: url("data:image/png;base64,{img_data}");
             background-size: cover;
             background-position: center;
             background-attachment: fixed;
@@ -170,11 +240,13 @@ st.markdown("""
 
 # ===== APPLICATION LAYOUT =====
 # Background setup
+# (file names in Images/, resolved relative to this app by assets.py)
 backgrounds = {
-    "🏠 Home": r"C:\Users\GOPIRAJ\lmsstreamlit\Images\rainlightbook.jpg",
-    "📘 Library Manager": r"C:\Users\GOPIRAJ\lmsstreamlit\Images\rainchair.jpg",
-    "📖 Learning Den": r"C:\Users\GOPIRAJ\lmsstreamlit\Images\cupwithbook.jpg"
+    "🏠 Home": "rainlightbook.jpg",
+    "📘 Library Manager": "rainchair.jpg",
+    "📖 Learning Den": "cupwithbook.jpg"
 }
+prepare_backgrounds()
 
 # Sidebar navigation
 
@@ -192,109 +264,94 @@ set_background(backgrounds[page])
 
 
 
-# Initialize the database
+# Initialize the database (schema migrations run inside get_db)
+get_db()
+get_pdf_extractor()
 
 
-def create_tables():
-    conn = sqlite3.connect('lms.db')
-    c = conn.cursor()
+# ===== QUERY RESULT CACHE =====
+@st.cache_resource
+def get_query_cache():
+    """Per-process read cache; every write path calls query_cache.invalidate()"""
+    return cache.QueryCache(watch_conn=db.open_connection())
 
-    # Users table for admins and users
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            email TEXT UNIQUE,
-            password_hash TEXT,
-            role TEXT CHECK(role IN ('admin', 'user'))
-        )
-    ''')
+query_cache = get_query_cache()
 
-    # Books table
-    # Add the pdf_link column
-   
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            author TEXT,
-            genre TEXT,
-            price REAL,
-            pdf_link TEXT  -- New column for PDF link
-        )
-    ''')
-
-    # Assigned books table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS assigned_books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_id INTEGER,
-            user_id INTEGER,
-            assigned_by INTEGER,
-            assigned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(book_id) REFERENCES books(id),
-            FOREIGN KEY(user_id) REFERENCES users(id),
-            FOREIGN KEY(assigned_by) REFERENCES users(id)
-        )
-    ''')
-
-    # Borrowed books table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS borrowed_books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_id INTEGER,
-            user_id INTEGER,
-            borrowed_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(book_id) REFERENCES books(id),
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
-     
-    # New table for returned books
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS returned_books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_id INTEGER,
-            user_id INTEGER,
-            returned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(book_id) REFERENCES books(id),
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
- 
-     # Add this new table for book requests
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS book_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_title TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            requested_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'Pending',
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
+def write(operation, *args):
+    """Run a library write on the writer thread, then drop the cached reads it affects"""
+    result = get_writer().run(operation, *args)
+    query_cache.invalidate(*library.WRITES[operation.__name__])
+    return result
+
+# Cached results that also depend on the clock ("days borrowed") expire after this
+CLOCK_TTL = 300
 
-    conn.commit()
-   
-    
-    conn.close()
-@st.cache_data
-def get_returned_books():
-    conn = sqlite3.connect('lms.db')
-    returned_books = conn.execute('''
-        SELECT b.title, u.username, r.returned_date
-        FROM returned_books r
-        JOIN books b ON r.book_id = b.id
-        JOIN users u ON r.user_id = u.id
-    ''').fetchall()
-    conn.close()
-    return returned_books    
-    
-create_tables()
 
-# Fetch returned books data
-returned_books = get_returned_books()
-# Display returned books
+@query_cache.cached("loans", "books", "users")
+def get_returned_books():
+    return library.returned_books(get_db())
+
+@query_cache.cached("books", "loans")
+def fetch_books_status():
+    """All books with availability, for the chatbot"""
+    return library.books_status(get_db())
+
+@query_cache.cached("users")
+def fetch_users():
+    return library.users(get_db())
+
+@query_cache.cached("loans", "books")
+def fetch_user_borrowed(user_id):
+    """Books currently borrowed by one user, newest first"""
+    return library.user_loans(get_db(), user_id)
+
+@query_cache.cached("book_requests")
+def fetch_user_requests(user_id):
+    """One user's book requests, newest first"""
+    return library.user_requests(get_db(), user_id)
+
+@query_cache.cached("books")
+def fetch_genres():
+    """Distinct genres, used by SHAIGO to spot genre words in questions"""
+    return [row[0] for row in get_db().query(
+        "SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND genre != ''")]
+
+@query_cache.cached("books", "loans")
+def search_catalog(text, author=None, genre=None, limit=10):
+    return search.search_books(get_db(), text, author=author, genre=genre, limit=limit)
+
+@query_cache.cached("books", "book_pdfs", "pdf_pages")
+def search_inside_books(text, limit=10):
+    return search.search_inside(get_db(), text, limit=limit)
+
+@query_cache.cached("books", "book_pdfs")
+def find_readable_book(title):
+    return pdf_reader.readable_book(get_db(), title)
+
+def page_link(pdf_link, page):
+    """Link that opens a PDF at one page (browsers' PDF viewers honour #page=)"""
+    return f"{pdf_store.url(pdf_link)}#page={page}"
+
+@st.cache_resource
+def get_similarity_index():
+    """Per-process TF-IDF index of the catalog; Add/Remove Book keep it current"""
+    return similar.build_index(get_db())
+
+@st.cache_resource
+def get_recommender():
+    """Per-process co-borrowing recommender; borrow_book feeds it new loans"""
+    return recommend.build_recommender(get_db())
+
+def load_page(view_name, cursor, page_size, sort, descending, filters):
+    """Cached keyset page of one of the paging.VIEWS"""
+    view = paging.VIEWS[view_name]
+    key = ("page", view_name, cursor, page_size, sort, descending, tuple(filters.items()))
+    return query_cache.get_or_load(
+        key, view.tables,
+        lambda: paging.fetch_page(get_db(), view_name, cursor=cursor, page_size=page_size,
+                                  sort=sort, descending=descending, filters=filters),
+        ttl=CLOCK_TTL if view_name == "borrowed" else None
+    )
 
 
 # Initialize session state
@@ -308,8 +365,6 @@ if 'user_username' not in st.session_state:
     st.session_state['user_username'] = None
     
 
-if 'returned_books' not in st.session_state:
-    st.session_state['returned_books'] = get_returned_books()
 # Function to log out admin
 def logout_admin():
     st.session_state['admin_logged_in'] = False
@@ -343,16 +398,19 @@ st.session_state['last_activity'] = time.time()
 st.title("📚 Knowledge Hub")
 st.write("Centralized Knowledge Management System")
 
+GEMINI_MODEL = 'gemini-1.5-flash'
+GEMINI_GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "top_p": 0.7,
+    "top_k": 20,
+    "max_output_tokens": 512
+}
+
 def get_gemini_model():
     """Configure and return Gemini model"""
-    return genai.GenerativeModel(
-        'gemini-1.5-flash',
-        generation_config={
-            "temperature": 0.3,
-            "top_p": 0.7,
-            "top_k": 20,
-            "max_output_tokens": 512
-        },
+    return get_genai().GenerativeModel(
+        GEMINI_MODEL,
+        generation_config=GEMINI_GENERATION_CONFIG,
         safety_settings={
             "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
             "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
@@ -361,8 +419,34 @@ def get_gemini_model():
         }
     )
 
+@st.cache_resource
+def get_llm_cache():
+    """Persistent SHAIGO answer cache, shared by all sessions"""
+    return llm_cache.LLMCache()
+
+TRUNCATED_NOTICE = "\n\n⚠️ The answer was cut off. Please ask again.\n\n- SHAIGO"
+
+def stream_llm_answer(cache_prompt, config, stream, fallback):
+    """Yield a stored Gemini answer at once, or Gemini's chunks as they arrive.
+
+    Streamed answers are stored once complete. The sidebar "Fresh answer"
+    toggle bypasses and refreshes the entry. If Gemini fails, `fallback` is
+    yielded instead, or a truncation notice when part of the answer is
+    already on screen (partial answers are never cached).
+    """
+    streamed = False
+    try:
+        for chunk in get_llm_cache().stream_or_generate(
+            cache_prompt, GEMINI_MODEL, config, stream,
+            refresh=st.session_state.get('shaigo_refresh', False)
+        ):
+            streamed = streamed or bool(chunk)
+            yield chunk
+    except Exception:
+        yield TRUNCATED_NOTICE if streamed else fallback
+
 # SHAIGO's avatar path (replace with your actual path)
-SHAIGO_AVATAR_PATH = r"C:\Users\GOPIRAJ\OneDrive\Desktop\lmsstreamlit\Images\shaigo.png"  # Path relative to your app.py
+SHAIGO_AVATAR_PATH = assets.image_path("shaigo.png")  # Path relative to app.py
 
 def load_shaigo_avatar():
     """Load SHAIGO's avatar image with error handling"""
@@ -391,76 +475,6 @@ def handle_signup_question(user_role):
         
 Note: Admin approval may be required for full access.\n\n- SHAIGO"""
 
-def handle_user_queries(query):
-    """Handle user-specific queries (excluding requests which are handled separately)"""
-    user_id = st.session_state.get('user_id')
-    if not user_id:
-        return "Please login to access this information.\n\n- SHAIGO"
-    
-    query = query.lower()
-    conn = sqlite3.connect('lms.db')
-    cursor = conn.cursor()
-    
-    try:
-        # Handle borrowed books query
-        if "my borrowed books" in query or "books i have" in query:
-            cursor.execute('''
-                SELECT b.title, bb.borrowed_date
-                FROM borrowed_books bb
-                JOIN books b ON bb.book_id = b.id
-                WHERE bb.user_id = ?
-                ORDER BY bb.borrowed_date DESC
-            ''', (user_id,))
-            books = cursor.fetchall()
-            
-            if books:
-                response = "📚 Books You've Borrowed:\n" + "\n".join(
-                    [f"- {title} (since {date})" for title, date in books])
-            else:
-                response = "You haven't borrowed any books yet."
-            return response + "\n\n- SHAIGO"
-        
-        # Handle general user queries
-        return generate_general_response(query)
-    
-    finally:
-        conn.close()
-
-def extract_book_title(query):
-    """Extract book title from natural language queries"""
-    # Remove common question phrases
-    stop_phrases = [
-        "tell me about", "what is", "summary of", "information about",
-        "details of", "who wrote", "describe", "explain"
-    ]
-    clean_query = query.lower()
-    for phrase in stop_phrases:
-        clean_query = clean_query.replace(phrase, "")
-    
-    # Remove special characters and extra spaces
-    clean_query = re.sub(r'[^\w\s]', '', clean_query).strip()
-    return clean_query if clean_query else None
-
-def get_book_summary(book_title):
-    """Get book summary from Gemini with library-appropriate formatting"""
-    prompt = f"""Provide a concise summary (3-4 sentences) of the book "{book_title}" 
-    as a librarian would describe it to a patron. Include:
-    - Author if known
-    - Main themes/subject
-    - Typical audience
-    - Similar books in our collection
-    
-    Format response professionally and sign as '- SHAIGO'"""
-    
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"⚠️ Couldn't retrieve information about '{book_title}'. " \
-               f"Please check the title and try again.\n\n- SHAIGO"        
-
-
 # SHAIGO Core Functions
 def chatbot():
     """SHAIGO Chatbot - Shows only after login with 3 core functions"""
@@ -482,6 +496,11 @@ def chatbot():
         role = "You" if msg["role"] == "user" else "SHAIGO"
         st.sidebar.markdown(f"**{role}:** {msg['content']}")
     
+    # New messages are rendered here, right below the history
+    live_chat = st.sidebar.container()
+    
+    st.sidebar.checkbox("🔄 Fresh answer (skip cache)", key="shaigo_refresh")
+    
     # Clear conversation button
     if st.sidebar.button("🧹 Clear Chat"):
         st.session_state.shaigo_history = []
@@ -495,65 +514,125 @@ def chatbot():
     
     # Process input when there's new text and Enter is pressed
     if user_input and user_input != st.session_state.get('last_processed_input'):
-        process_query(user_input)
+        process_query(user_input, live_chat)
 
-def process_query(query):
-    """Process user query and generate response"""
+def process_query(query, live_chat):
+    """Process user query and render the response as it is generated"""
     # Store the input being processed
     st.session_state.last_processed_input = query
     
     # Add user message to history
     st.session_state.shaigo_history.append({"role": "user", "content": query})
+    live_chat.markdown(f"**You:** {query}")
     
-    # Generate appropriate response
+    # Generate appropriate response; LLM answers arrive as a stream of chunks
     response = generate_response(query)
+    if isinstance(response, str):
+        live_chat.markdown(f"**SHAIGO:** {response}")
+    else:
+        placeholder = live_chat.empty()
+        text = ""
+        for chunk in response:
+            text += chunk
+            placeholder.markdown(f"**SHAIGO:** {text}▌")
+        placeholder.markdown(f"**SHAIGO:** {text}")
+        response = text
     
-    # Add bot response to history
+    # Add bot response to history once streaming has finished
     st.session_state.shaigo_history.append({"role": "assistant", "content": response})
-    
-    # Clear the input field by forcing a rerun
-    st.rerun()
+
+@st.cache_resource
+def get_intent_router():
+    """Intent router, trained once per process"""
+    return intent.IntentRouter()
+
+HELP_TEXT = ("I can help with:\n"
+             "- Book availability ('show available books')\n"
+             "- Catalog search ('books by [author]', 'find [title]', 'any [genre] books')\n"
+             "- Your account ('my borrowed books', 'my requests')\n"
+             "- Book summaries ('tell me about [book]')\n"
+             "- Similar books we have ('books like [book]')\n"
+             "- Search inside books ('which books mention [topic]')\n"
+             "- User lists for admins ('show users')\n\n"
+             "- SHAIGO")
 
 def generate_response(query):
-    """Generate response based on query type"""
-    query = query.lower().strip()
+    """Generate response based on the query's intent.
+
+    Catalog and account questions are answered from the database; only
+    open-ended questions and book summaries go to Gemini.
+    """
+    parsed = get_intent_router().route(query, known_genres=fetch_genres())
+    slots = parsed.slots
     
-    # 1. Handle greetings
-    if query in ['hi', 'hello', 'hey']:
+    if parsed.name == intent.GREETING:
         return "Hello! How can I help with library resources today?\n\n- SHAIGO"
     
-    # 2. Handle available books request
-    if "available books" in query or "show books" in query:
+    if parsed.name == intent.LIST_BOOKS:
         return get_books_status()
     
-    # 3. Handle users list (admin only)
-    if "users" in query and st.session_state.get('admin_logged_in'):
-        return get_users_list()
+    if parsed.name == intent.LIST_USERS:
+        if st.session_state.get('admin_logged_in'):
+            return get_users_list()
+        return "🔒 Only Library Managers can view the user list.\n\n- SHAIGO"
+    
+    if parsed.name == intent.SEARCH:
+        return check_book_availability(slots["title"], slots["author"], slots["genre"])
+    
+    if parsed.name == intent.MY_LOANS:
+        return get_my_borrowed_books()
     
-    # 4. Handle book summary requests
-    if any(keyword in query for keyword in ["summary", "about", "tell me", "what is"]):
-        return get_book_summary(query)
+    if parsed.name == intent.MY_REQUESTS:
+        return get_my_requests()
+    
+    if parsed.name == intent.SIGNUP:
+        return handle_signup_question(st.session_state.get('user_role'))
+    
+    if parsed.name == intent.SIMILAR:
+        return get_similar_books(slots["title"])
+    
+    if parsed.name == intent.SUMMARY:
+        return get_book_summary(slots["title"])
+    
+    if parsed.name == intent.INSIDE:
+        return get_inside_matches(slots["phrase"])
+    
+    if parsed.name == intent.OPEN_ENDED:
+        return generate_general_response(query)
     
-    # Default response for unrecognized queries
-    return ("I can help with:\n"
-            "- Book availability ('show available books')\n"
-            "- Book summaries ('tell me about [book]')\n"
-            "- User lists for admins ('show users')\n\n"
-            "- SHAIGO")
+    return HELP_TEXT
+
+def get_my_borrowed_books():
+    """Books the logged-in user currently has out"""
+    user_id = st.session_state.get('user_id')
+    if not user_id:
+        return "Please login to access this information.\n\n- SHAIGO"
+    books = fetch_user_borrowed(user_id)
+    if books:
+        response = "📚 Books You've Borrowed:\n" + "\n".join(
+            [f"- {title} (since {date})" for title, date in books])
+    else:
+        response = "You haven't borrowed any books yet."
+    return response + "\n\n- SHAIGO"
+
+def get_my_requests():
+    """Status of the logged-in user's book requests"""
+    user_id = st.session_state.get('user_id')
+    if not user_id:
+        return "Please login to access this information.\n\n- SHAIGO"
+    requests = fetch_user_requests(user_id)
+    if requests:
+        response = "📝 Your Book Requests:\n" + "\n".join(
+            [f"- {title} ({status}, requested {requested_on})"
+             for _, title, requested_on, status in requests])
+    else:
+        response = "You haven't requested any books yet."
+    return response + "\n\n- SHAIGO"
 
 def get_books_status():
     """Get all books with availability status"""
-    conn = sqlite3.connect('lms.db')
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT b.title, b.author, 
-                   CASE WHEN bb.id IS NULL THEN 'Available' ELSE 'Borrowed' END as status
-            FROM books b
-            LEFT JOIN borrowed_books bb ON b.id = bb.book_id
-            ORDER BY b.title
-        ''')
-        books = cursor.fetchall()
+        books = fetch_books_status()
         
         if not books:
             return "No books found in the library.\n\n- SHAIGO"
@@ -566,16 +645,11 @@ def get_books_status():
     
     except Exception as e:
         return f"⚠️ Error accessing library: {str(e)}\n\n- SHAIGO"
-    finally:
-        conn.close()
 
 def get_users_list():
     """Get list of all registered users (admin only)"""
-    conn = sqlite3.connect('lms.db')
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT username, email, role FROM users ORDER BY username")
-        users = cursor.fetchall()
+        users = fetch_users()
         
         if not users:
             return "No users registered yet.\n\n- SHAIGO"
@@ -588,44 +662,74 @@ def get_users_list():
     
     except Exception as e:
         return f"⚠️ Error accessing user records: {str(e)}\n\n- SHAIGO"
-    finally:
-        conn.close()
 
-def get_book_summary(query):
+def find_similar_books(book_title, k=None):
+    """Catalog books most like `book_title`, as (id, title, author, genre).
+
+    If the title is in our catalog its indexed vector is used, otherwise the
+    title text itself.
+    """
+    k = k or similar.DEFAULT_K
+    index = get_similarity_index()
+    matches = search_catalog(book_title, limit=1)
+    if matches:
+        neighbours = index.similar_to(matches[0][0], k=k)
+    else:
+        neighbours = index.query(book_title, k=k)
+    return similar.describe(get_db(), [book_id for book_id, _ in neighbours])
+
+def get_similar_books(book_title):
+    """Answer 'books like X' straight from the similarity index"""
+    if not book_title:
+        return "Please specify a book title.\n\n- SHAIGO"
+    books = find_similar_books(book_title)
+    if not books:
+        return f"I couldn't find books like '{book_title}' in our collection.\n\n- SHAIGO"
+    books_info = "\n".join(f"- {title} by {author} ({genre})" for _, title, author, genre in books)
+    return f"📚 Books in our collection like '{book_title}':\n{books_info}\n\n- SHAIGO"
+
+def get_inside_matches(phrase):
+    """Answer 'which books mention X' from the text of the book PDFs"""
+    matches = search_inside_books(phrase, limit=5)
+    if not matches:
+        return f"I couldn't find '{phrase}' inside any of our book PDFs.\n\n- SHAIGO"
+    pages = "\n".join(f"- {title} by {author}, [page {page}]({page_link(pdf_link, page)}): {snippet}"
+                      for _, title, author, pdf_link, page, snippet in matches)
+    return f"📄 '{phrase}' inside our books:\n{pages}\n\n- SHAIGO"
+
+def get_book_summary(book_title):
     """Generate book summary using Gemini AI"""
-    # Extract book title from query
-    book_title = query.replace("summary of", "").replace("tell me about", "").replace("about", "").replace("what is", "").strip('"').strip()
-    
     if not book_title:
         return "Please specify a book title.\n\n- SHAIGO"
     
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(
-            f"""As a librarian, provide a concise 3-sentence summary of "{book_title}":
+    # Ground point 3 in the actual catalog instead of letting the model guess
+    similar_books = find_similar_books(book_title)
+    if similar_books:
+        collection = "\n".join(f"            - {title} by {author} ({genre})"
+                               for _, title, author, genre in similar_books)
+        similar_point = ("3. Similar books in our collection, chosen only from this list:\n"
+                         + collection)
+    else:
+        similar_point = "3. Say that we have no similar books in our collection yet"
+    
+    prompt = f"""As a librarian, provide a concise 3-sentence summary of "{book_title}":
             1. Author and main theme
             2. Why readers enjoy it
-            3. Similar books in our collection
+            {similar_point}
             
             Format: Professional tone, end with '- SHAIGO'"""
-        )
-        return response.text if response else f"Couldn't find information about {book_title}.\n\n- SHAIGO"
-    except Exception as e:
-        return f"⚠️ Error retrieving book information.\n\n- SHAIGO"
+    
+    return stream_llm_answer(
+        prompt, None,
+        lambda: (chunk.text for chunk in
+                 get_genai().GenerativeModel(GEMINI_MODEL).generate_content(prompt, stream=True)),
+        fallback="⚠️ Error retrieving book information.\n\n- SHAIGO"
+    )
 
 def get_books_status():
     """Retrieve all books with availability status"""
-    conn = sqlite3.connect('lms.db')
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT b.title, b.author, 
-                   CASE WHEN bb.id IS NULL THEN 'Available' ELSE 'Borrowed' END as status
-            FROM books b
-            LEFT JOIN borrowed_books bb ON b.id = bb.book_id
-            ORDER BY b.title
-        ''')
-        books = cursor.fetchall()
+        books = fetch_books_status()
         
         if not books:
             return "No books found in the library.\n\n- SHAIGO"
@@ -638,16 +742,11 @@ def get_books_status():
     
     except Exception as e:
         return f"⚠️ Error accessing library: {str(e)}\n\n- SHAIGO"
-    finally:
-        conn.close()
 
 def get_users_list():
     """Retrieve all registered users (admin only)"""
-    conn = sqlite3.connect('lms.db')
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT username, email, role FROM users ORDER BY username")
-        users = cursor.fetchall()
+        users = fetch_users()
         
         if not users:
             return "No users registered yet.\n\n- SHAIGO"
@@ -660,64 +759,76 @@ def get_users_list():
     
     except Exception as e:
         return f"⚠️ Error accessing user records: {str(e)}\n\n- SHAIGO"
-    finally:
-        conn.close()
-
-def get_book_summary(query):
-    """Generate book summary using Gemini AI"""
-    # Extract book title
-    book_title = query.replace("summary of", "").replace("tell me about", "").strip('"').strip()
-    
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(
-            f"""As a professional librarian, provide a concise 3-sentence summary of "{book_title}":
-            1. Author and main theme
-            2. Why readers enjoy it
-            3. Similar books we have
-            
-            Format: Bullet points, end with '- SHAIGO'"""
-        )
-        return response.text if response else f"Couldn't find information about {book_title}.\n\n- SHAIGO"
-    except Exception as e:
-        return f"⚠️ Error retrieving book information.\n\n- SHAIGO"
 
 # ================ MAIN APPLICATION ================
-def main():
-    create_tables
 
 # [Keep your existing check_book_availability() and get_gemini_model() functions]
 
+# ===== AUTHENTICATION =====
+@st.cache_resource
+def get_password_hasher():
+    """Per-process bounded bcrypt pool at the configured work factor"""
+    return auth.PasswordHasher()
+
+@st.cache_resource
+def get_login_throttle():
+    """Per-process failed-login counters, shared by every session"""
+    return auth.LoginThrottle()
+
 # Helper function to hash passwords
 def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return get_password_hasher().hash(password)
 
 # Helper function to verify passwords
 def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return get_password_hasher().verify(password, hashed)
+
+def client_address():
+    """Best-effort client IP for login throttling"""
+    try:
+        return st.context.ip_address
+    except AttributeError:
+        return None
 
 # Function to register users
 def register_user(username, email, password, role):
-    conn = sqlite3.connect('lms.db')
-    c = conn.cursor()
-    hashed_password = hash_password(password)
     try:
-        c.execute("INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)", (username, email, hashed_password, role))
-        conn.commit()
+        hashed_password = hash_password(password)
+    except auth.PasswordServiceBusy:
+        st.error("⏳ The server is busy, please try again in a moment.")
+        return
+    try:
+        write(library.add_user, username, email, hashed_password, role)
         st.success(f"🎉 {username}, you are successfully registered as {role}!")
-    except sqlite3.IntegrityError:
-        st.error("❗ Username or email already exists!")
-    finally:
-        conn.close()
+    except ValueError as e:
+        st.error(f"❗ {e}!")
 
 # Function to authenticate users
 def login_user(username, password, role):
-    conn = sqlite3.connect('lms.db')
-    c = conn.cursor()
-    c.execute("SELECT id, password_hash FROM users WHERE username = ? AND role = ?", (username, role))
-    user = c.fetchone()
-    conn.close()
-    if user and verify_password(password, user[1]):
+    throttle = get_login_throttle()
+    client = client_address()
+    wait = throttle.retry_after(username, client)
+    if wait > 0:
+        st.error(f"⏳ Too many failed attempts. Try again in {int(wait // 60) + 1} minute(s).")
+        return False
+
+    user = library.credentials(get_db(), username, role)
+    try:
+        # Unknown usernames are checked against a dummy hash so they cost the same
+        valid = verify_password(password, user[1] if user else None)
+    except auth.PasswordServiceBusy:
+        st.error("⏳ The server is busy, please try again in a moment.")
+        return False
+
+    if valid:
+        throttle.succeeded(username)
+        hasher = get_password_hasher()
+        if hasher.needs_rehash(user[1]):
+            # Stored at an old work factor: upgrade while we have the password
+            try:
+                write(library.set_password_hash, user[0], hasher.hash(password))
+            except auth.PasswordServiceBusy:
+                pass    # try again on the next login
         st.session_state['user_id'] = user[0]  # Store user ID in session state
         st.session_state['user_role'] = role  # Update user role in session state
         st.session_state['logged_in'] = True
@@ -725,6 +836,7 @@ def login_user(username, password, role):
         st.success(f"✅ Welcome {username}, you are logged in as {role.capitalize()}!")
         return True
     else:
+        throttle.failed(username, client)
         st.error("❌ Invalid username or password!")
         return False
 
@@ -746,72 +858,132 @@ def logout_user():
 
 # Function to assign a book
 def assign_book(book_title, username, assigned_by):
-    conn = sqlite3.connect('lms.db')
-    c = conn.cursor()
-    c.execute("SELECT id FROM books WHERE title = ?", (book_title,))
-    book = c.fetchone()
-    c.execute("SELECT id FROM users WHERE username = ?", (username,))
-    user = c.fetchone()
-    if book and user:
-        book_id = book[0]
-        user_id = user[0]
-        c.execute("INSERT INTO assigned_books (book_id, user_id, assigned_by) VALUES (?, ?, ?)", (book_id, user_id, assigned_by))
-        conn.commit()
-        conn.close()
-        st.success(f"📚 Book '{book_title}' assigned successfully to {username}!")
-    else:
+    try:
+        write(library.assign_book, book_title, username, assigned_by)
+    except library.NotFound:
         st.error("❌ Book or user not found!")
+        return
+    st.success(f"📚 Book '{book_title}' assigned successfully to {username}!")
 
 # Function to borrow a book
 def borrow_book(book_title, user_id):
-    conn = sqlite3.connect('lms.db')
-    c = conn.cursor()
-    c.execute("SELECT id FROM books WHERE title = ?", (book_title,))
-    book = c.fetchone()
-    if book:
-        book_id = book[0]
-        c.execute("INSERT INTO borrowed_books (book_id, user_id) VALUES (?, ?)", (book_id, user_id))
-        conn.commit()
-        conn.close()
-        st.success(f"📚 You have successfully borrowed '{book_title}'!")
-    else:
+    try:
+        _, book_id = write(library.borrow_book, book_title, user_id)
+    except library.NotFound:
         st.error("❌ Book not found!")
+        return
+    except library.Unavailable as e:
+        st.warning(f"📕 {e} right now. You can request it from the Return Book page.")
+        return
+    get_recommender().add_loan(user_id, book_id)
+    st.success(f"📚 You have successfully borrowed '{book_title}'!")
+    show_recommendations("👥 Readers also borrowed",
+                         get_recommender().also_borrowed(book_id))
+
+def show_recommendations(heading, book_ids):
+    """List recommended catalog books, skipping any that were removed"""
+    books = similar.describe(get_db(), book_ids)
+    if books:
+        st.markdown(f"**{heading}**")
+        st.markdown("\n".join(f"- {title} by {author} ({genre})"
+                               for _, title, author, genre in books))
+
+
+# ===== PAGE-LEVEL PDF READER =====
+def _turn_page(key, step, last):
+    st.session_state[key] = min(max(st.session_state[key] + step, 1), last)
+
+def book_reader():
+    """Read a stored book PDF a few pages at a time, rendered on the server"""
+    st.subheader("📘 Read a Book")
+    title = st.text_input("📘 Enter Book Title to Read", key="reader_title")
+    if not title.strip():
+        return
+    book = find_readable_book(title.strip())
+    if book is None:
+        st.info(f"No stored PDF for '{title}' yet")
+        return
+    title, digest = book
+    renderer = get_page_renderer()
+    try:
+        last = renderer.page_count(digest)
+    except FileNotFoundError:
+        st.warning(f"⏳ The PDF of '{title}' is still being fetched. Try again in a minute.")
+        return
+    
+    key = f"reader_page_{digest}"
+    step = pdf_reader.PAGES_PER_VIEW
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    st.session_state.setdefault(key, 1)
+    col_page.number_input(f"Page (of {last})", min_value=1, max_value=last, key=key)
+    col_prev.button("⬅️ Previous", key="reader_prev", disabled=st.session_state[key] == 1,
+                    on_click=_turn_page, args=(key, -step, last))
+    col_next.button("Next ➡️", key="reader_next", disabled=st.session_state[key] + step > last,
+                    on_click=_turn_page, args=(key, step, last))
+    
+    try:
+        for number, path in renderer.pages(digest, st.session_state[key]):
+            st.image(path, caption=f"{title}, page {number} of {last}", use_container_width=True)
+    except Exception as e:
+        st.error(f"❌ Could not render this page: {e}")
 
 
-def check_book_availability(query):
-    conn = sqlite3.connect('lms.db')
-    cursor = conn.cursor()
+# ===== PAGED TABLE CONTROLS =====
+def _page_back(key):
+    st.session_state[f"{key}_cursors"].pop()
+
+def _page_forward(key, cursor):
+    st.session_state[f"{key}_cursors"].append(cursor)
+
+def paged_view(key, view_name, sort_labels, filter_name=None, filter_label=None,
+               filter_options=None, descending=False):
+    """Sort, filter and page controls for a keyset-paginated view.
+
+    Returns the current page and the row offset of its first row.
+    """
+    col_sort, col_order, col_size = st.columns(3)
+    sort_label = col_sort.selectbox("Sort by", list(sort_labels), key=f"{key}_sort")
+    order = col_order.selectbox("Order", ["Ascending", "Descending"],
+                                index=int(descending), key=f"{key}_order")
+    page_size = col_size.selectbox("Rows per page", paging.PAGE_SIZES, key=f"{key}_size")
     
-    # Extract search terms
-    search_terms = []
-    if "by" in query.lower():
-        author = query.split("by")[1].strip()
-        search_terms.append(f"author LIKE '%{author}%'")
-    if "about" in query.lower():
-        topic = query.split("about")[1].strip()
-        search_terms.append(f"(title LIKE '%{topic}%' OR genre LIKE '%{topic}%')")
+    filters = {}
+    if filter_name:
+        if filter_options:
+            value = st.selectbox(filter_label, ["All"] + filter_options, key=f"{key}_filter")
+            filters[filter_name] = "" if value == "All" else value
+        else:
+            filters[filter_name] = st.text_input(filter_label, key=f"{key}_filter").strip()
     
-    # Build query
-    where_clause = " AND ".join(search_terms) if search_terms else "1=1"
-    sql = f"""
-    SELECT title, author, genre, 
-           CASE WHEN id IN (SELECT book_id FROM borrowed_books) THEN 'Checked Out' 
-                ELSE 'Available' END as status
-    FROM books
-    WHERE {where_clause}
-    LIMIT 5
-    """
+    # Go back to the first page whenever sorting, size or filters change
+    signature = (sort_label, order, page_size, tuple(filters.items()))
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+    
+    page = load_page(view_name, cursors[-1], page_size, sort_labels[sort_label],
+                     order == "Descending", filters)
     
-    cursor.execute(sql)
-    results = cursor.fetchall()
-    conn.close()
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    col_prev.button("◀ Prev", key=f"{key}_prev", disabled=len(cursors) == 1,
+                    on_click=_page_back, args=(key,))
+    col_info.caption(f"Page {len(cursors)}")
+    col_next.button("Next ▶", key=f"{key}_next", disabled=not page.has_more,
+                    on_click=_page_forward, args=(key, page.next_cursor))
+    return page, (len(cursors) - 1) * page_size
+
+# Words that frame a catalog question but are not part of what to look for
+def check_book_availability(text=None, author=None, genre=None):
+    """Ranked catalog search for chatbot queries like 'books by tolkien'"""
+    results = search_catalog(text, author=author, genre=genre, limit=5)
     
     if results:
-        books_info = "\n".join([f"- {title} by {author} ({genre}) - {status}" 
-                              for title, author, genre, status in results])
-        return f"Here are some matching books:\n{books_info}"
+        books_info = "\n".join([f"- {row[1]} by {row[2]} ({row[3]}) - {row[6]}" 
+                              for row in results])
+        return f"Here are some matching books:\n{books_info}\n\n- SHAIGO"
     else:
-        return "No matching books found in our database."
+        return "No matching books found in our database.\n\n- SHAIGO"
 
 def get_available_actions():
     if st.session_state.get('user_role') == 'admin':
@@ -820,12 +992,10 @@ def get_available_actions():
         return "Browse books, borrow, return"
     return "Browse books"
 
+@query_cache.cached("loans")
 def get_last_update_time():
-    conn = sqlite3.connect('lms.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(borrowed_date) FROM borrowed_books")
-    last_update = cursor.fetchone()[0]
-    conn.close()
+    last_update = get_db().query_one(
+        "SELECT MAX(borrowed_at) FROM loans WHERE returned_at IS NULL")[0]
     return last_update or "Today"
 
 def generate_general_response(prompt):
@@ -841,22 +1011,29 @@ def generate_general_response(prompt):
     Last database update: {get_last_update_time()}
     """
     
-    response = model.generate_content(
-        f"""You're a specialized library assistant. First check if this query requires 
-        database lookup. If not, respond helpfully.
-        
-        Context: {context}
-        Question: {prompt}
-        
-        Response guidelines:
-        1. For book queries: check database first
-        2. For account questions: verify user status
-        3. Be concise and factual
-        4. Never make up book information""",
-        stream=True
-    )
+    def stream():
+        response = model.generate_content(
+            f"""You're a specialized library assistant. First check if this query requires 
+            database lookup. If not, respond helpfully.
+            
+            Context: {context}
+            Question: {prompt}
+            
+            Response guidelines:
+            1. For book queries: check database first
+            2. For account questions: verify user status
+            3. Be concise and factual
+            4. Never make up book information""",
+            stream=True
+        )
+        for chunk in response:
+            yield chunk.text
     
-    return "".join([chunk.text for chunk in response])    
+    # The context's last-update timestamp changes with every loan, so the
+    # cache key only uses the parts of it that shape the answer
+    cache_prompt = f"{st.session_state.get('user_role', 'guest')} | {page} | {prompt}"
+    return stream_llm_answer(cache_prompt, GEMINI_GENERATION_CONFIG, stream,
+                             fallback="⚠️ Error contacting SHAIGO's AI service.\n\n- SHAIGO")    
 
 # ADD THIS LINE TO SHOW CHATBOT ON ALL PAGES
 # =============================================
@@ -966,6 +1143,9 @@ elif page == "📘 Library Manager":
             if st.button("📖 Assign"):
                 st.session_state['admin_action'] = "assign"
         
+        if st.sidebar.button("⚡ Performance"):
+            st.session_state['admin_action'] = "performance"
+        
         # Logout Button (matches login button style)
         if st.sidebar.button("🚪 Logout", type="primary", use_container_width=True):
             with st.spinner("Logging out..."):
@@ -976,11 +1156,29 @@ elif page == "📘 Library Manager":
         if st.session_state.get('admin_action') == "home":
             st.subheader("Admin Dashboard")
             st.write("Manage your library system using the options in the sidebar")
-            
+
+            st.subheader("⚡ Query Cache")
+            cache_stats = query_cache.stats()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+            col2.metric("Hits", cache_stats["hits"])
+            col3.metric("Misses", cache_stats["misses"])
+            col4.metric("Cached Results", cache_stats["entries"])
+
+            st.subheader("🤖 SHAIGO Answer Cache")
+            llm_stats = get_llm_cache().stats()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Stored Answers", llm_stats["entries"])
+            col2.metric("Hits", llm_stats["hits"])
+            col3.metric("Misses", llm_stats["misses"])
+            if st.button("🗑️ Clear SHAIGO Cache"):
+                get_llm_cache().clear()
+                st.success("SHAIGO answer cache cleared")
+
         elif st.session_state.get('admin_action') == "books":
             st.subheader("📚 Book Management")
             
-            tab1, tab2, tab3 = st.tabs(["Add Book", "Remove Book", "View Books"])
+            tab1, tab2, tab3, tab4 = st.tabs(["Add Book", "Remove Book", "View Books", "Bulk Import"])
             
             with tab1:
                 with st.form("add_book_form"):
@@ -989,18 +1187,22 @@ elif page == "📘 Library Manager":
                     genre = st.text_input("🎭 Genre")
                     price = st.number_input("💸 Price (₹)", min_value=0.0)
                     pdf_link = st.text_input("🔗 PDF Link (optional)")
+                    pdf_file = st.file_uploader("📄 ...or upload the PDF", type=["pdf"])
+                    copies = st.number_input("📦 Copies", min_value=1, value=1, step=1)
                     
                     if st.form_submit_button("✅ Register Book"):
                         if title and author and genre and price:
-                            conn = sqlite3.connect('lms.db')
-                            c = conn.cursor()
-                            c.execute('''
-                                INSERT INTO books (title, author, genre, price, pdf_link)
-                                VALUES (?, ?, ?, ?, ?)
-                            ''', (title, author, genre, price, pdf_link))
-                            conn.commit()
-                            conn.close()
-                            st.success(f"📗 '{title}' registered successfully!")
+                            try:
+                                if pdf_file is not None:
+                                    # Streamed to disk in chunks; identical files are stored once
+                                    pdf_link = pdf_store.link(get_pdf_store().save_file(pdf_file))
+                                book_id = write(library.add_book, title, author, genre, price, pdf_link, copies)
+                                get_similarity_index().add(book_id, title, author, genre)
+                                if pdf_link:
+                                    get_pdf_extractor().wake()
+                                st.success(f"📗 '{title}' registered successfully!")
+                            except ValueError as e:
+                                st.error(f"❗ {e}!")
                         else:
                             st.error("All fields except PDF link are required!")
             
@@ -1009,29 +1211,84 @@ elif page == "📘 Library Manager":
                     book_to_remove = st.text_input("🔍 Enter Book Title to Remove")
                     if st.form_submit_button("❌ Remove Book"):
                         if book_to_remove:
-                            conn = sqlite3.connect('lms.db')
-                            c = conn.cursor()
-                            c.execute("DELETE FROM books WHERE title = ?", (book_to_remove,))
-                            conn.commit()
-                            conn.close()
+                            removed = write(library.remove_book, book_to_remove)
+                            for book_id in removed:
+                                get_similarity_index().remove(book_id)
                             st.success(f"🗑️ '{book_to_remove}' removed successfully!")
             
             with tab3:
                 st.subheader("All Books in Library")
-                conn = sqlite3.connect('lms.db')
-                books_data = conn.execute("SELECT id, title, author, genre, price, pdf_link FROM books").fetchall()
-                conn.close()
-
-                if books_data:
-                    df = pd.DataFrame(books_data, columns=["ID", "Title", "Author", "Genre", "Price", "PDF Link"])
+                table_page, _ = paged_view("admin_books", "books",
+                                     {"ID": "id", "Title": "title", "Author": "author",
+                                      "Genre": "genre", "Price": "price"},
+                                     filter_name="genre", filter_label="Filter by genre")
+
+                if table_page.rows:
+                    df = pd.DataFrame(table_page.rows, columns=["ID", "Title", "Author", "Genre", "Price", "PDF Link",
+                                                          "Status", "Available", "Copies"])
+                    df["PDF Link"] = df["PDF Link"].map(pdf_store.url)
                     st.dataframe(df, use_container_width=True)
                 else:
                     st.info("No books available in the library")
+                
+                pdf_progress = pdf_text.progress(get_db())
+                st.caption(f"📄 Searchable PDFs: {pdf_progress['done']} books indexed "
+                           f"({pdf_progress['pages']} pages), {pdf_progress['pending']} queued, "
+                           f"{pdf_progress['failed']} failed")
+                
+                with st.form("set_copies_form"):
+                    st.write("### 📦 Update Copies")
+                    copies_title = st.text_input("Book Title")
+                    copies = st.number_input("Copies owned", min_value=0, value=1, step=1)
+                    if st.form_submit_button("🔄 Update Copies"):
+                        if copies_title:
+                            try:
+                                write(library.set_copies, copies_title, copies)
+                                st.success(f"📦 '{copies_title}' now has {copies} copies")
+                            except library.NotFound:
+                                st.error("❌ Book not found!")
+                            except ValueError as e:
+                                st.error(f"❗ {e}; can't go below that.")
+            
+            with tab4:
+                st.subheader("📥 Bulk Import")
+                st.caption("CSV or JSON with title, author, genre, price and pdf_link columns, "
+                           "or binary MARC 21 records. Titles already in the catalog are skipped; "
+                           "re-uploading a file after a failed import resumes where it stopped.")
+                upload = st.file_uploader("Catalog file", type=["csv", "json", "jsonl", "ndjson", "mrc", "marc"])
+                if upload and st.button("📥 Import Books"):
+                    progress_bar = st.progress(0.0, text="Starting import...")
+                    
+                    def show_progress(done, total, result):
+                        progress_bar.progress(min(done / max(total, 1), 1.0),
+                                              text=f"{result.inserted} added, {result.skipped} skipped, "
+                                                   f"{result.rejected} rejected")
+                    
+                    try:
+                        result = importer.import_books(get_db(), upload, importer.detect_format(upload.name),
+                                                       source=upload.name, progress=show_progress)
+                    except Exception as e:
+                        st.error(f"❌ Import stopped: {str(e)}. Upload the same file again to resume.")
+                    else:
+                        if result.resumed_from:
+                            st.info(f"Resumed after record {result.resumed_from}")
+                        col1, col2, col3 = st.columns(3)
+                        col1.metric("Added", result.inserted)
+                        col2.metric("Already in catalog", result.skipped)
+                        col3.metric("Rejected", result.rejected)
+                        if result.rejects:
+                            st.dataframe(pd.DataFrame(result.rejects, columns=["Record", "Problem"]),
+                                         use_container_width=True)
+                    finally:
+                        # Committed batches are in the catalog even if a later one failed
+                        query_cache.invalidate("books")
+                        get_similarity_index().rebuild(similar.load_books(get_db()))
+                        get_pdf_extractor().wake()
         
         elif st.session_state.get('admin_action') == "users":
             st.subheader("👥 User Management")
             
-            tab1, tab2 = st.tabs(["Add/Remove Users", "View Users"])
+            tab1, tab2, tab3 = st.tabs(["Add/Remove Users", "View Users", "Bulk Provisioning"])
             
             with tab1:
                 with st.form("add_user_form"):
@@ -1051,24 +1308,49 @@ elif page == "📘 Library Manager":
                     remove_user = st.text_input("Enter Username to Remove")
                     if st.form_submit_button("❌ Remove User"):
                         if remove_user:
-                            conn = sqlite3.connect('lms.db')
-                            c = conn.cursor()
-                            c.execute("DELETE FROM users WHERE username = ?", (remove_user,))
-                            conn.commit()
-                            conn.close()
+                            write(library.remove_user, remove_user)
                             st.success(f"User '{remove_user}' removed successfully!")
             
             with tab2:
                 st.subheader("All Registered Users")
-                conn = sqlite3.connect('lms.db')
-                users_data = conn.execute("SELECT id, username, email, role FROM users").fetchall()
-                conn.close()
+                table_page, _ = paged_view("admin_users", "users",
+                                     {"ID": "id", "Username": "username", "Email": "email"},
+                                     filter_name="role", filter_label="Role",
+                                     filter_options=["admin", "user"])
 
-                if users_data:
-                    df = pd.DataFrame(users_data, columns=["ID", "Username", "Email", "Role"])
+                if table_page.rows:
+                    df = pd.DataFrame(table_page.rows, columns=["ID", "Username", "Email", "Role"])
                     st.dataframe(df, use_container_width=True)
                 else:
                     st.info("No users registered yet")
+            
+            with tab3:
+                st.subheader("👥 Bulk Provisioning")
+                st.caption("CSV with username and email columns, plus optional password and role "
+                           "(user or admin). Rows without a password get a generated one.")
+                roster = st.file_uploader("Roster CSV", type=["csv"], key="roster_upload")
+                default_role = st.selectbox("Role for rows without one", provisioning.ROLES)
+                if roster and st.button("👥 Create Accounts"):
+                    total_rows = max(roster.getvalue().count(b"\n") - 1, 1)
+                    progress_bar = st.progress(0.0, text="Hashing passwords...")
+                    result = provisioning.provision_users(
+                        get_db(), roster, default_role=default_role,
+                        progress=lambda done, created: progress_bar.progress(
+                            min(done / total_rows, 1.0), text=f"{created} accounts created"))
+                    query_cache.invalidate("users")
+                    
+                    col1, col2 = st.columns(2)
+                    col1.metric("Accounts Created", result.created)
+                    col2.metric("Rows Skipped", len(result.problems))
+                    if result.problems:
+                        st.dataframe(pd.DataFrame(result.problems, columns=["Row", "Username", "Problem"]),
+                                     use_container_width=True)
+                    if result.credentials:
+                        st.download_button(
+                            "⬇️ Download generated passwords",
+                            pd.DataFrame(result.credentials, columns=["username", "password"])
+                              .to_csv(index=False),
+                            file_name="generated_passwords.csv", mime="text/csv")
         
         elif st.session_state.get('admin_action') == "assign":
             st.subheader("📖 Book Assignments")
@@ -1085,108 +1367,82 @@ elif page == "📘 Library Manager":
             
             with tab2:
                 st.subheader("Current Assignments")
-                conn = sqlite3.connect('lms.db')
-                assigned_books = conn.execute('''
-                    SELECT b.title, u.username, a.assigned_date
-                    FROM assigned_books a
-                    JOIN books b ON a.book_id = b.id
-                    JOIN users u ON a.user_id = u.id
-                ''').fetchall()
-                conn.close()
+                table_page, _ = paged_view("admin_assignments", "assignments",
+                                     {"Date": "assigned_date", "ID": "id"},
+                                     filter_name="username", filter_label="Filter by username",
+                                     descending=True)
                 
-                if assigned_books:
-                    df = pd.DataFrame(assigned_books, columns=["Book", "Assigned To", "Date"])
+                if table_page.rows:
+                    df = pd.DataFrame(table_page.rows, columns=["Book", "Assigned To", "Date"])
                     st.dataframe(df, use_container_width=True)
                 else:
                     st.info("No books currently assigned")
             
             with tab3:
                 st.subheader("📚 Currently Borrowed Books")
-                conn = sqlite3.connect('lms.db')
-                borrowed_books = conn.execute('''
-                    SELECT 
-                        b.title as "Book Title",
-                        u.username as "Borrowed By",
-                        bb.borrowed_date as "Borrowed Date",
-                        (julianday('now') - julianday(bb.borrowed_date)) as "Days Borrowed"
-                    FROM borrowed_books bb
-                    JOIN books b ON bb.book_id = b.id
-                    JOIN users u ON bb.user_id = u.id
-                    ORDER BY bb.borrowed_date DESC
-                ''').fetchall()
-                conn.close()
+                table_page, _ = paged_view("admin_borrowed", "borrowed",
+                                     {"Borrowed Date": "borrowed_date", "ID": "id"},
+                                     filter_name="username", filter_label="Filter by username",
+                                     descending=True)
                 
-                if borrowed_books:
-                    df = pd.DataFrame(borrowed_books, 
+                if table_page.rows:
+                    df = pd.DataFrame(table_page.rows, 
                                     columns=["Book Title", "Borrowed By", "Borrowed Date", "Days Borrowed"])
                     st.dataframe(df, use_container_width=True)
                     
-                    # Add summary statistics
+                    # Add summary statistics (trigger-maintained totals, one row read)
+                    circulation = stats.summary(get_db())
                     st.subheader("📊 Borrowing Statistics")
                     col1, col2 = st.columns(2)
                     with col1:
-                        st.metric("Total Books Borrowed", len(borrowed_books))
+                        st.metric("Total Books Borrowed", circulation["open_loans"])
                     with col2:
-                        # Filter out None values before calculating average
-                        days_borrowed = [book[3] for book in borrowed_books if book[3] is not None]
-                        avg_days = sum(days_borrowed) / len(days_borrowed) if days_borrowed else 0
-                        st.metric("Average Borrow Duration", f"{avg_days:.1f} days")
+                        st.metric("Average Borrow Duration",
+                                  f"{circulation['avg_open_days'] or 0:.1f} days")
+                    
+                    daily = stats.daily(get_db(), days=30)
+                    if daily:
+                        st.caption("Loans and returns per day (last 30 days)")
+                        st.bar_chart(pd.DataFrame(daily, columns=["Day", "Borrowed", "Returned"])
+                                     .set_index("Day"))
+                    top_books = stats.top_books(get_db(), limit=5)
+                    if top_books:
+                        st.caption("Most borrowed books")
+                        st.table(pd.DataFrame(top_books,
+                                              columns=["Book Title", "Times Borrowed", "Currently Out"]))
                 else:
                     st.info("No books currently borrowed")
 
             with tab4:
                 st.subheader("📚 Returned Books History")
-                conn = sqlite3.connect('lms.db')
-                returned_books = conn.execute('''
-                    SELECT 
-                        b.title as "Book Title",
-                        u.username as "Returned By",
-                        r.returned_date as "Returned Date",
-                        (SELECT bb.borrowed_date 
-                         FROM borrowed_books bb 
-                         WHERE bb.book_id = r.book_id AND bb.user_id = r.user_id
-                         ORDER BY bb.borrowed_date DESC LIMIT 1) as "Borrowed Date",
-                        (julianday(r.returned_date) - 
-                         (SELECT julianday(bb.borrowed_date)
-                          FROM borrowed_books bb 
-                          WHERE bb.book_id = r.book_id AND bb.user_id = r.user_id
-                          ORDER BY bb.borrowed_date DESC LIMIT 1)) as "Days Kept"
-                    FROM returned_books r
-                    JOIN books b ON r.book_id = b.id
-                    JOIN users u ON r.user_id = u.id
-                    ORDER BY r.returned_date DESC
-                ''').fetchall()
-                conn.close()
+                table_page, _ = paged_view("admin_returned", "returned",
+                                     {"Returned Date": "returned_date", "ID": "id"},
+                                     filter_name="username", filter_label="Filter by username",
+                                     descending=True)
                 
-                if returned_books:
-                    df = pd.DataFrame(returned_books, 
+                if table_page.rows:
+                    df = pd.DataFrame(table_page.rows, 
                                     columns=["Book Title", "Returned By", "Returned Date", 
                                             "Borrowed Date", "Days Kept"])
                     st.dataframe(df, use_container_width=True)
                     
-                    # Add summary statistics
+                    # Add summary statistics (the average skips loans migrated without a borrow date)
+                    circulation = stats.summary(get_db())
                     st.subheader("📊 Return Statistics")
                     col1, col2 = st.columns(2)
                     with col1:
-                        st.metric("Total Books Returned", len(returned_books))
+                        st.metric("Total Books Returned", circulation["returned_loans"])
                     with col2:
-                        # Filter out None values before calculating average
-                        days_kept = [book[4] for book in returned_books if book[4] is not None]
-                        avg_days = sum(days_kept) / len(days_kept) if days_kept else 0
-                        st.metric("Average Keeping Duration", f"{avg_days:.1f} days")
+                        st.metric("Average Keeping Duration",
+                                  f"{circulation['avg_kept_days'] or 0:.1f} days")
                 else:
                     st.info("No books have been returned yet")
 
             with tab5:
                 st.subheader("Book Requests")
-                conn = sqlite3.connect('lms.db')
-                requested_books = conn.execute('''
-                    SELECT br.id, br.book_title, u.username, br.requested_on, br.status
-                    FROM book_requests br
-                    JOIN users u ON br.user_id = u.id
-                    ORDER BY br.requested_on DESC
-                ''').fetchall()
-                conn.close()
+                requested_books = query_cache.get_or_load(
+                    ("book_requests",), ("book_requests", "users"),
+                    lambda: library.all_requests(get_db()))
                 
                 if requested_books:
                     df = pd.DataFrame(requested_books, columns=["ID", "Book", "Requested By", "Date", "Status"])
@@ -1194,26 +1450,73 @@ elif page == "📘 Library Manager":
                     
                     with st.form("update_request_form"):
                         request_id = st.number_input("Request ID to Update", min_value=1)
-                        new_status = st.selectbox("New Status", ["Pending", "Approved", "Rejected", "Procured"])
+                        new_status = st.selectbox("New Status", library.REQUEST_STATUSES)
                         
                         if st.form_submit_button("🔄 Update Status"):
-                            conn = sqlite3.connect('lms.db')
                             try:
-                                c = conn.cursor()
-                                c.execute('''
-                                    UPDATE book_requests
-                                    SET status = ?
-                                    WHERE id = ?
-                                ''', (new_status, request_id))
-                                conn.commit()
+                                write(library.update_request, request_id, new_status)
                                 st.success("Status updated successfully!")
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"Error: {str(e)}")
-                            finally:
-                                conn.close()
                 else:
                     st.info("No book requests pending")
+        
+        elif st.session_state.get('admin_action') == "performance":
+            st.subheader("⚡ Query Performance")
+            st.caption(f"SQL statements run by this server process since it started. "
+                       f"Statements slower than {db.monitor.slow_ms:.0f} ms are logged with their query plan.")
+            
+            run_stats = get_run_timer().stats()
+            col1, col2, col3 = st.columns(3)
+            if run_stats["cold_start_ms"] is not None:
+                col1.metric("Cold Start", f"{run_stats['cold_start_ms']:.0f} ms",
+                            f"budget {startup.COLD_START_BUDGET_MS} ms", delta_color="off")
+            if run_stats["reruns"]:
+                col2.metric("Rerun p50", f"{run_stats['rerun_p50_ms']:.0f} ms")
+                col3.metric("Rerun p95", f"{run_stats['rerun_p95_ms']:.0f} ms",
+                            f"budget {startup.RERUN_BUDGET_MS} ms", delta_color="off")
+                if run_stats["rerun_p95_ms"] > startup.RERUN_BUDGET_MS:
+                    st.warning("⚠️ Reruns are over budget; check the top statements below.")
+            
+            write_stats = get_writer().stats()
+            if write_stats["batches"]:
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Writes", write_stats["writes"])
+                col2.metric("Writes per Commit", f"{write_stats['writes_per_batch']:.1f}")
+                col3.metric("Lock Retries", write_stats["retries"])
+            
+            tab1, tab2 = st.tabs(["Top Statements", "Slow Query Log"])
+            
+            with tab1:
+                order = st.radio("Rank by", ["Total time", "p95 time", "Calls"], horizontal=True)
+                top = db.monitor.top(by={"Total time": "total", "p95 time": "p95", "Calls": "calls"}[order],
+                                     limit=25)
+                if top:
+                    df = pd.DataFrame(top)[["sql", "calls", "total_ms", "p95_ms", "mean_ms", "max_ms",
+                                            "rows", "site"]]
+                    df.columns = ["Statement", "Calls", "Total (ms)", "p95 (ms)", "Mean (ms)",
+                                  "Max (ms)", "Rows", "Called From"]
+                    st.dataframe(df.round(2), use_container_width=True)
+                else:
+                    st.info("No statements recorded yet (is LMS_SQL_MONITOR=0 set?)")
+            
+            with tab2:
+                slow = db.monitor.slow_queries()
+                if slow:
+                    for entry in slow[:50]:
+                        with st.expander(f"{entry['ms']:.1f} ms · {entry['site']} · "
+                                         f"{time.strftime('%H:%M:%S', time.localtime(entry['at']))}"):
+                            st.code(entry["sql"], language="sql")
+                            st.caption(f"Rows: {entry['rows']}")
+                            if entry["plan"]:
+                                st.code(entry["plan"], language="text")
+                else:
+                    st.info("No slow queries logged 🎉")
+            
+            if st.button("🔄 Reset Statistics"):
+                db.monitor.reset()
+                st.rerun()
             
 
 # User Section (Learning Den)
@@ -1260,6 +1563,9 @@ elif page == "📖 Learning Den":
         if st.sidebar.button("📖 Return Book"):
             st.session_state['user_action'] = "return"
         
+        if st.sidebar.button("📘 Read a Book"):
+            st.session_state['user_action'] = "read"
+        
         # Updated logout button (now a regular button like login)
         if st.sidebar.button("🚪 Logout", type="primary"):
             logout_user()
@@ -1271,19 +1577,30 @@ elif page == "📖 Learning Den":
             
         elif st.session_state.get('user_action') == "books":
             st.subheader("📚 Available Books")
-            conn = sqlite3.connect('lms.db')
-            books_data = conn.execute("SELECT id, title, author, genre, price, pdf_link FROM books").fetchall()
-            conn.close()
+            search_text = st.text_input("🔍 Search by title, author or genre",
+                                        placeholder='e.g. tolkien, "lord of the rings", fantasy')
+            if search_text.strip():
+                books_data = search_catalog(search_text, limit=50)
+                if not books_data:
+                    st.info(f"No books match '{search_text}'")
+                offset = 0
+            else:
+                table_page, offset = paged_view("user_books", "books",
+                                          {"Title": "title", "Author": "author", "Genre": "genre",
+                                           "Price": "price"},
+                                          filter_name="genre", filter_label="Filter by genre")
+                books_data = table_page.rows
 
             table_data = []
             for i, row in enumerate(books_data):
                 book_entry = {
-                    "Sr. No.": i + 1,
+                    "Sr. No.": offset + i + 1,
                     "Title": row[1],
                     "Author": row[2],
                     "Genre": row[3],
                     "Price (₹)": row[4],
-                    "PDF Link": f'<a href="{row[5]}" target="_blank">View PDF</a>' if row[5] else "No PDF"
+                    "Availability": f"{row[7]} of {row[8]} available",
+                    "PDF Link": f'<a href="{pdf_store.url(row[5])}" target="_blank">View PDF</a>' if row[5] else "No PDF"
                 }
                 table_data.append(book_entry)
 
@@ -1300,82 +1617,65 @@ elif page == "📖 Learning Den":
             )
             st.write(pd.DataFrame(table_data).to_html(escape=False, index=False), unsafe_allow_html=True)
 
+            show_recommendations("✨ Recommended for you",
+                                 get_recommender().for_user(st.session_state['user_id']))
+
+            st.subheader("📄 Search Inside Books")
+            inside_text = st.text_input("🔎 Find words or a \"phrase\" in the book PDFs",
+                                        placeholder='e.g. photosynthesis, "salt march"')
+            if inside_text.strip():
+                matches = search_inside_books(inside_text, limit=20)
+                if matches:
+                    st.markdown("\n".join(
+                        f"- **{title}** by {author}, [page {page}]({page_link(pdf_link, page)}): {snippet}"
+                        for _, title, author, pdf_link, page, snippet in matches))
+                else:
+                    st.info(f"No book pages mention '{inside_text}' yet")
+
             st.subheader("📖 Borrow Book")
             book_title = st.text_input("📘 Enter Book Title to Borrow")
             if st.button("📩 Borrow Book"):
                 if book_title:
                     borrow_book(book_title, st.session_state['user_id'])
         
+        elif st.session_state.get('user_action') == "read":
+            book_reader()
+        
         elif st.session_state.get('user_action') == "return":
             st.subheader("📖 Return Book")
             book_title = st.text_input("📘 Enter Book Title to Return")
             if st.button("📩 Return Book"):
                 if book_title:
-                    # Check if the book is borrowed by the user
-                    conn = sqlite3.connect('lms.db')
-                    c = conn.cursor()
-                    c.execute("SELECT id FROM books WHERE title = ?", (book_title,))
-                    book = c.fetchone()
-                    if book:
-                        book_id = book[0]
-                        user_id = st.session_state['user_id']
-                        # Check if the book is borrowed by the user
-                        c.execute("SELECT id FROM borrowed_books WHERE book_id = ? AND user_id = ?", (book_id, user_id))
-                        borrowed_book = c.fetchone()
-                        if borrowed_book:
-                            # Move the book to returned_books
-                            c.execute("INSERT INTO returned_books (book_id, user_id) VALUES (?, ?)", (book_id, user_id))
-                            # Remove the book from borrowed_books
-                            c.execute("DELETE FROM borrowed_books WHERE book_id = ? AND user_id = ?", (book_id, user_id))
-                            conn.commit()
-                            conn.close()
-                            st.success(f"✅ You have successfully returned '{book_title}'!")
-                        else:
-                            st.error(f"❌ You have not borrowed '{book_title}'.")
-                    else:
-                        st.error(f"❌ Book '{book_title}' not found.")
+                    try:
+                        write(library.return_book, book_title, st.session_state['user_id'])
+                        st.success(f"✅ You have successfully returned '{book_title}'!")
+                    except library.NotFound as e:
+                        st.error(f"❌ {e}.")
             
             st.subheader("📖 Request a Book")
             with st.form("request_book_form"):
                 book_title = st.text_input("Enter book title to request")
                 if st.form_submit_button("Submit Request"):
                     if book_title.strip():
-                        conn = sqlite3.connect('lms.db')
                         try:
-                            c = conn.cursor()
-                            c.execute('''
-                                INSERT INTO book_requests (book_title, user_id)
-                                VALUES (?, ?)
-                            ''', (book_title, st.session_state['user_id']))
-                            conn.commit()
+                            write(library.request_book, book_title, st.session_state['user_id'])
                             st.success(f"📖 Your request for '{book_title}' has been submitted!")
                             st.balloons()
                         except Exception as e:
                             st.error(f"Error submitting request: {str(e)}")
-                        finally:
-                            conn.close()
                     else:
                         st.warning("Please enter a book title")
             
             st.subheader("Your Book Requests")
-            conn = sqlite3.connect('lms.db')
-            user_requests = conn.execute('''
-                SELECT 
-                    id,
-                    book_title,
-                    requested_on,
-                    status
-                FROM book_requests
-                WHERE user_id = ?
-                ORDER BY requested_on DESC
-            ''', (st.session_state['user_id'],)).fetchall()
-            conn.close()
+            user_requests = fetch_user_requests(st.session_state['user_id'])
 
             if user_requests:
                 st.table(pd.DataFrame(user_requests,
                         columns=["Request ID", "Book Title", "Requested On", "Status"]))
             else:
                 st.info("You haven't requested any books yet")
-        
 
-        
\ No newline at end of file
+
+# ===== RUN TIMING =====
+# Runs cut short by st.rerun()/st.stop() never get here and aren't counted
+get_run_timer().record(time.perf_counter() - run_started)
@@ -0,0 +1,145 @@
+import base64
+import os
+import re
+import sys
+from functools import lru_cache
+
+# ===== BACKGROUND IMAGE ASSET PIPELINE =====
+# Page backgrounds are resized and recompressed once (at startup, or ahead
+# of time with `python assets.py`) into static/backgrounds/, which Streamlit
+# serves as cacheable files at app/static/... when static serving is on.
+# The page then only carries a short CSS rule instead of a base64 JPEG.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(APP_DIR, "Images")
+STATIC_DIR = os.path.join(APP_DIR, "static", "backgrounds")
+STATIC_URL = "app/static/backgrounds"
+
+WIDTHS = (640, 1024, 1600)
+WEBP_QUALITY = 70
+JPEG_QUALITY = 72
+
+
+def image_path(name):
+    """Absolute path of a file in Images/"""
+    return os.path.join(IMAGES_DIR, name)
+
+
+def _variant_widths(source_width):
+    # Never upscale: the largest variant is the source width
+    return sorted({min(width, source_width) for width in WIDTHS})
+
+
+def _variant_name(name, width, ext):
+    stem = os.path.splitext(name)[0]
+    return f"{stem}-{width}.{ext}"
+
+
+def _existing_variants(name):
+    """(width, ext, DirEntry) for every variant of `name` in STATIC_DIR"""
+    pattern = re.compile(rf"{re.escape(os.path.splitext(name)[0])}-(\d+)\.(webp|jpg)")
+    for entry in os.scandir(STATIC_DIR) if os.path.isdir(STATIC_DIR) else ():
+        match = pattern.fullmatch(entry.name)
+        if match:
+            yield int(match.group(1)), match.group(2), entry
+
+
+def built_widths(name):
+    """Widths of a background's variants if all are on disk and newer than
+    the source, else None. Reads no pixels: the widest variant is
+    min(source width, max(WIDTHS)), which determines the rest."""
+    source_mtime = os.path.getmtime(image_path(name))
+    found = {}
+    for width, ext, entry in _existing_variants(name):
+        if entry.stat().st_mtime < source_mtime:
+            return None
+        found.setdefault(width, set()).add(ext)
+    if not found:
+        return None
+    widths = _variant_widths(max(found))
+    if sorted(found) != widths or any(found[width] != {"webp", "jpg"} for width in widths):
+        return None
+    return widths
+
+
+def build_background(name):
+    """Write WebP and progressive JPEG variants of one background.
+
+    Up-to-date variants are left alone, and when all of them are, PIL is
+    never loaded. Returns the widths built.
+    """
+    widths = built_widths(name)
+    if widths is not None:
+        return widths
+
+    from PIL import Image   # deferred: app.py builds backgrounds on every cold start
+
+    source = image_path(name)
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    with Image.open(source) as img:
+        img = img.convert("RGB")
+        widths = _variant_widths(img.width)
+        for width in widths:
+            webp_path = os.path.join(STATIC_DIR, _variant_name(name, width, "webp"))
+            jpeg_path = os.path.join(STATIC_DIR, _variant_name(name, width, "jpg"))
+            if all(os.path.exists(p) and os.path.getmtime(p) >= os.path.getmtime(source)
+                   for p in (webp_path, jpeg_path)):
+                continue
+            height = round(img.height * width / img.width)
+            resized = img.resize((width, height), Image.LANCZOS) if width != img.width else img
+            resized.save(webp_path, "WEBP", quality=WEBP_QUALITY, method=6)
+            resized.save(jpeg_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    # Leftovers from an earlier source of another size would fail built_widths()
+    for width, _, entry in list(_existing_variants(name)):
+        if width not in widths:
+            os.remove(entry.path)
+    return widths
+
+
+@lru_cache(maxsize=None)
+def background_widths(name):
+    """Widths available for a background, building the variants if needed"""
+    return tuple(build_background(name))
+
+
+def build_all(names):
+    for name in names:
+        background_widths(name)
+
+
+def background_css(name):
+    """CSS for `.stApp` loading the best-sized static variant per viewport"""
+    widths = background_widths(name)
+    rules = []
+    for i, width in enumerate(widths):
+        webp = f"{STATIC_URL}/{_variant_name(name, width, 'webp')}"
+        jpeg = f"{STATIC_URL}/{_variant_name(name, width, 'jpg')}"
+        declarations = (
+            f'background-image: url("{jpeg}"); '
+            f'background-image: image-set(url("{webp}") type("image/webp"), '
+            f'url("{jpeg}") type("image/jpeg"));'
+        )
+        if i == 0:
+            rules.append(f".stApp {{ {declarations} }}")
+        else:
+            rules.append(f"@media (min-width: {widths[i - 1] + 1}px) {{ .stApp {{ {declarations} }} }}")
+    return "\n".join(rules)
+
+
+@lru_cache(maxsize=None)
+def background_data_uri(name):
+    """Fallback when static serving is off: the smallest WebP as a data URI.
+
+    Computed once per process instead of re-encoding the original on every
+    rerun.
+    """
+    width = background_widths(name)[0]
+    with open(os.path.join(STATIC_DIR, _variant_name(name, width, "webp")), "rb") as f:
+        return "data:image/webp;base64," + base64.b64encode(f.read()).decode()
+
+
+if __name__ == "__main__":
+    # Build ahead of time: python assets.py rainlightbook.jpg rainchair.jpg ...
+    for image_name in sys.argv[1:] or sorted(os.listdir(IMAGES_DIR)):
+        if image_name.lower().endswith((".jpg", ".jpeg", ".png")):
+            print(image_name, build_background(image_name))
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# ===== PASSWORD HASHING AND LOGIN THROTTLING =====
+# bcrypt runs on a small bounded pool (bcrypt releases the GIL, so threads
+# use every core) instead of on whichever script thread asked, so a login
+# burst queues for at most `workers` cores rather than oversubscribing the
+# CPU. When too many requests are already waiting, new ones are refused
+# quickly with PasswordServiceBusy. The work factor comes from
+# LMS_BCRYPT_ROUNDS; hashes stored at another cost are replaced on the next
+# successful login. LoginThrottle rejects flooded usernames and clients
+# before any bcrypt work is done.
+
+BCRYPT_ROUNDS = int(os.environ.get("LMS_BCRYPT_ROUNDS", "12"))
+WORKERS = os.cpu_count() or 2
+MAX_PENDING = WORKERS * 8       # queued + running hash jobs
+QUEUE_TIMEOUT = 2.0             # seconds to wait for a queue slot
+
+MAX_FAILURES_PER_USER = 5
+MAX_FAILURES_PER_CLIENT = 20
+FAILURE_WINDOW = 15 * 60        # seconds
+LOCKOUT = 5 * 60                # seconds, doubled for each further failure
+MAX_TRACKED = 100000            # usernames/addresses with recent failures kept
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Too many hashing jobs are already queued"""
+
+
+def hash_cost(hashed):
+    """Work factor of a stored bcrypt hash ("$2b$12$..." -> 12), or None"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt on a bounded thread pool with a target work factor"""
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=WORKERS, max_pending=MAX_PENDING):
+        self.rounds = rounds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Checked against unknown usernames so they take as long as known ones
+        self._dummy_hash = bcrypt.hashpw(b"dummy", bcrypt.gensalt(rounds))
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT):
+            raise PasswordServiceBusy("Password service is busy")
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify(self, password, hashed):
+        """True if `password` matches `hashed`; a None hash never matches"""
+        if hashed is None:
+            self._run(bcrypt.checkpw, password.encode("utf-8"), self._dummy_hash)
+            return False
+        try:
+            return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            # Not a bcrypt hash
+            return False
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+
+class LoginThrottle:
+    """Sliding-window failure counts per username and per client address"""
+
+    def __init__(self, max_per_user=MAX_FAILURES_PER_USER, max_per_client=MAX_FAILURES_PER_CLIENT,
+                 window=FAILURE_WINDOW, lockout=LOCKOUT, max_tracked=MAX_TRACKED):
+        self.max_per_user = max_per_user
+        self.max_per_client = max_per_client
+        self.window = window
+        self.lockout = lockout
+        self.max_tracked = max_tracked
+        # key -> failure timestamps, least recently failed first
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        failures = self._failures.get(key)
+        if not failures:
+            return failures or ()
+        while failures and now - failures[0] > self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+        return failures
+
+    def _prune(self, now):
+        """Forget keys with no failure inside the window, then the least
+        recently failed beyond max_tracked (made-up usernames are free)"""
+        while self._failures:
+            key, failures = next(iter(self._failures.items()))
+            if len(self._failures) <= self.max_tracked and now - failures[-1] <= self.window:
+                break
+            del self._failures[key]
+
+    def _wait(self, key, limit, now):
+        failures = self._recent(key, now)
+        if len(failures) < limit:
+            return 0.0
+        # Each failure beyond the limit doubles the lockout
+        lockout = self.lockout * 2 ** min(len(failures) - limit, 6)
+        return max(0.0, failures[-1] + lockout - now)
+
+    def retry_after(self, username, client=None):
+        """Seconds until this username/client may try again (0 if allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            wait = self._wait(("user", username.lower()), self.max_per_user, now)
+            if client:
+                wait = max(wait, self._wait(("client", client), self.max_per_client, now))
+            return wait
+
+    def failed(self, username, client=None):
+        now = time.monotonic()
+        keys = [("user", username.lower())] + ([("client", client)] if client else [])
+        with self._lock:
+            for key in keys:
+                self._failures.setdefault(key, deque()).append(now)
+                self._failures.move_to_end(key)
+            self._prune(now)
+
+    def succeeded(self, username):
+        with self._lock:
+            self._failures.pop(("user", username.lower()), None)
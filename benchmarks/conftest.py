@@ -0,0 +1,80 @@
+import hashlib
+import os
+import shutil
+
+import pytest
+
+import auth
+import db
+import synthetic
+import writer
+
+# Catalog sizes to benchmark at; LMS_BENCH_SCALES=1000,10000,100000 for the full set
+SCALES = [int(n) for n in os.environ.get("LMS_BENCH_SCALES", "1000,10000").split(",")]
+SEED = 42
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+
+def _fingerprint():
+    """Changes whenever the generator or the schema does"""
+    digest = hashlib.sha256()
+    for module in (synthetic, db, synthetic.migrations):
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:10]
+
+
+def _template(books):
+    """Generated database for `books`, built once and reused across runs"""
+    path = os.path.join(DATA_DIR, f"lms-{books}-{SEED}-{_fingerprint()}.db")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        synthetic.generate(path + ".tmp", books=books, seed=SEED)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+@pytest.fixture(scope="session", params=SCALES, ids=lambda n: f"{n}books")
+def scale(request):
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def pool(scale, tmp_path_factory):
+    """Pool over a private copy of the generated database (writes are allowed)"""
+    path = str(tmp_path_factory.mktemp(f"lms{scale}") / "lms.db")
+    shutil.copyfile(_template(scale), path)
+    pool = db.ConnectionPool(path)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def write_queue(pool):
+    """Writer thread over the same database copy as `pool`"""
+    queue = writer.WriteQueue(pool.path)
+    yield queue
+    queue.close()
+
+
+@pytest.fixture(scope="session")
+def hasher():
+    # Same cost as the generated hashes, so login timings measure our code
+    return auth.PasswordHasher(rounds=synthetic.HASH_ROUNDS)
+
+
+@pytest.fixture(scope="session")
+def busiest_user(pool):
+    """(id, username) of the reader with the most loans"""
+    return pool.query_one('''
+        SELECT u.id, u.username FROM circulation_user_stats s JOIN users u ON u.id = s.user_id
+        ORDER BY s.loans DESC LIMIT 1
+    ''')
+
+
+@pytest.fixture(scope="session")
+def popular_title(pool):
+    return pool.query_one('''
+        SELECT b.title FROM circulation_book_stats s JOIN books b ON b.id = s.book_id
+        ORDER BY s.loans DESC LIMIT 1
+    ''')[0]
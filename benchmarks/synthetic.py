@@ -0,0 +1,150 @@
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import migrations
+
+# ===== SYNTHETIC LIBRARY DATA =====
+# Builds a database at any size, with the same output for the same seed.
+# Book popularity and reader activity follow Zipf-like curves (a few
+# bestsellers and heavy readers, a long tail of both). Most loans have been
+# returned; the rest are still out, and each book owns enough copies to
+# cover its open loans. Every account has the password PASSWORD, hashed
+# once at HASH_ROUNDS so generation stays fast.
+
+PASSWORD = "password"
+HASH_ROUNDS = 4
+BOOK_SKEW = 1.1         # Zipf exponent for how often each book is borrowed
+READER_SKEW = 0.8       # ... and how often each user borrows
+RETURNED_SHARE = 0.85
+HISTORY_DAYS = 365
+EPOCH = datetime(2026, 1, 1)    # fixed "now" so dates don't depend on the clock
+
+GENRES = ["Fiction", "Fantasy", "Science Fiction", "Mystery", "Romance", "Thriller", "History",
+          "Biography", "Autobiography", "Philosophy", "Science", "Technology", "Poetry",
+          "Self-Help", "Business", "Travel", "Children", "Horror", "Drama", "Mythology"]
+ADJECTIVES = ["Silent", "Hidden", "Last", "Golden", "Broken", "Lost", "Wandering", "Secret",
+              "Endless", "Burning", "Quiet", "Distant", "Forgotten", "Crimson", "Midnight", "Little"]
+NOUNS = ["River", "Kingdom", "Garden", "Letter", "Mountain", "Empire", "Voyage", "Library",
+         "Monsoon", "Engine", "Orchard", "Harbor", "Theory", "Festival", "Mirror", "Village"]
+FIRST_NAMES = ["Asha", "Ravi", "Meera", "Arjun", "Kavya", "Rohan", "Ishaan", "Ananya", "Vikram",
+               "Sara", "Nikhil", "Priya", "Aditya", "Diya", "Karan", "Neha"]
+LAST_NAMES = ["Sharma", "Iyer", "Reddy", "Khan", "Das", "Nair", "Mehta", "Rao", "Gupta", "Singh",
+              "Patel", "Bose", "Menon", "Joshi", "Kapoor", "Varma"]
+
+
+def zipf_sampler(rng, n, skew):
+    """Draw 0..n-1 with P(i) proportional to 1 / (i + 1) ** skew"""
+    cumulative = list(itertools.accumulate(1 / (i + 1) ** skew for i in range(n)))
+    total = cumulative[-1]
+    return lambda: min(bisect.bisect_left(cumulative, rng.random() * total), n - 1)
+
+
+def _timestamp(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate(path, books=1000, users=None, loans=None, seed=42):
+    """Create a fresh, fully migrated database at `path`.
+
+    Defaults: one user per ten books and five loans per book. Returns the
+    row counts that were written.
+    """
+    users = users if users is not None else max(10, books // 10)
+    loans = loans if loans is not None else books * 5
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    pool = db.ConnectionPool(path, size=1)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+               for _ in range(max(1, books // 5))]
+    genre_of = zipf_sampler(rng, len(GENRES), 0.7)
+    book_rows = [(f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}",
+                  rng.choice(authors), GENRES[genre_of()], round(rng.uniform(99, 1999), 2),
+                  f"https://pdflink.to/book{i + 1}/")
+                 for i in range(books)]
+
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(HASH_ROUNDS)).decode("utf-8")
+    user_rows = [("admin", "admin@example.edu", password_hash, "admin")]
+    user_rows += [(f"user{i:06d}", f"user{i:06d}@example.edu", password_hash, "user")
+                  for i in range(1, users + 1)]
+
+    # Popularity ranks are shuffled so bestsellers are spread over the catalog
+    book_ids = list(range(1, books + 1))
+    reader_ids = list(range(2, users + 2))
+    rng.shuffle(book_ids)
+    rng.shuffle(reader_ids)
+    pick_book = zipf_sampler(rng, books, BOOK_SKEW)
+    pick_reader = zipf_sampler(rng, users, READER_SKEW)
+    loan_rows = []
+    for _ in range(loans):
+        borrowed = EPOCH - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        returned = None
+        if rng.random() < RETURNED_SHARE:
+            returned = min(EPOCH, borrowed + timedelta(days=rng.uniform(0.5, 30)))
+        loan_rows.append((book_ids[pick_book()], reader_ids[pick_reader()], _timestamp(borrowed),
+                          _timestamp(borrowed + timedelta(days=migrations.LOAN_DAYS)),
+                          _timestamp(returned) if returned else None))
+    loan_rows.sort(key=lambda row: row[2])
+
+    # Enough copies for every open loan, plus a spare or two on the shelf
+    open_loans = Counter(row[0] for row in loan_rows if row[4] is None)
+    copies = [max(1, open_loans[i + 1] + rng.randint(0, 2)) for i in range(books)]
+    book_rows = [(*row, n, n) for row, n in zip(book_rows, copies)]
+
+    request_rows = [(f"Requested Title {i + 1}", reader_ids[pick_reader()],
+                     _timestamp(EPOCH - timedelta(minutes=rng.randrange(HISTORY_DAYS * 1440))),
+                     rng.choice(["Pending", "Pending", "Approved", "Rejected", "Procured"]))
+                    for i in range(max(1, users // 2))]
+    assignment_rows = [(book_ids[pick_book()], reader_ids[pick_reader()], 1)
+                       for _ in range(max(1, users // 4))]
+
+    with pool.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, genre, price, pdf_link, copies, available)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', book_rows)
+        conn.executemany("INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)",
+                         user_rows)
+        conn.executemany('''
+            INSERT INTO loans (book_id, user_id, borrowed_at, due_at, returned_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', loan_rows)
+        conn.executemany('''
+            INSERT INTO book_requests (book_title, user_id, requested_on, status)
+            VALUES (?, ?, ?, ?)
+        ''', request_rows)
+        conn.executemany("INSERT INTO assigned_books (book_id, user_id, assigned_by) VALUES (?, ?, ?)",
+                         assignment_rows)
+    with pool.connection() as conn:
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pool.close()
+    return {"books": books, "users": users + 1, "loans": loans,
+            "book_requests": len(request_rows), "assigned_books": len(assignment_rows)}
+
+
+if __name__ == "__main__":
+    # python benchmarks/synthetic.py big.db --books 100000
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database")
+    parser.add_argument("path")
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--loans", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate(args.path, args.books, args.users, args.loans, args.seed))
@@ -0,0 +1,77 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import cache
+import db
+import library
+import migrations
+import pdf_store
+import writer
+
+# Correctness checks for the HTTP API, against a small migrated database.
+# The app state is built here instead of by the lifespan, which would open
+# the real lms.db.
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = str(tmp_path / "lms.db")
+    pool = db.ConnectionPool(path)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    library.add_user(pool, "root", "root@example.edu", "x", "admin")
+    library.add_user(pool, "reader", "reader@example.edu", "x", "user")
+    library.add_book(pool, "Gitanjali", "Tagore", "Poetry", 199.0)
+    monkeypatch.setattr(api, "API_TOKEN", TOKEN)
+    api.app.state.pool = pool
+    api.app.state.writer = writer.WriteQueue(path)
+    api.app.state.cache = cache.QueryCache(watch_conn=db.open_connection(path))
+    api.app.state.pdf_store = pdf_store.PdfStore(str(tmp_path / "pdfs"))
+    yield TestClient(api.app, headers={"Authorization": f"Bearer {TOKEN}"})
+    api.app.state.writer.close()
+    pool.close()
+
+
+def test_assignment_stores_admin_id(client):
+    response = client.post("/assignments", json={"username": "reader", "title": "Gitanjali",
+                                                 "assigned_by": "root"})
+    assert response.status_code == 201
+    pool = api.app.state.pool
+    stored = pool.query_one("SELECT book_id, user_id, assigned_by FROM assigned_books WHERE id = ?",
+                            (response.json()["assignment_id"],))
+    assert stored == (library.book_id(pool, "Gitanjali"), library.user_id(pool, "reader"),
+                      library.user_id(pool, "root"))
+
+
+def test_assignment_by_unknown_admin(client):
+    response = client.post("/assignments", json={"username": "reader", "title": "Gitanjali",
+                                                 "assigned_by": "nobody"})
+    assert response.status_code == 404
+    assert api.app.state.pool.query_one("SELECT COUNT(*) FROM assigned_books")[0] == 0
+
+
+@pytest.mark.parametrize("cursor", [[{"a": 1}, 1], [["nested"], 1], ["Gitanjali", [1]], "not a list"])
+def test_crafted_cursor(client, cursor):
+    response = client.get("/books", params={"cursor": api.encode_cursor(cursor)})
+    assert response.status_code == 422
+
+
+def test_next_cursor_round_trip(client):
+    library.add_book(api.app.state.pool, "Godan", "Premchand", "Fiction", 150.0)
+    first = client.get("/books", params={"page_size": 1, "sort": "title"}).json()
+    second = client.get("/books", params={"page_size": 1, "sort": "title",
+                                          "cursor": first["next_cursor"]}).json()
+    assert [book["title"] for book in first["books"] + second["books"]] == ["Gitanjali", "Godan"]
+
+
+def test_uploaded_pdf_link_is_host_independent(client, monkeypatch):
+    monkeypatch.setattr(pdf_store, "PDF_BASE_URL", "https://library.example.edu")
+    upload = client.post("/pdfs", content=b"%PDF-1.4\n%%EOF\n").json()
+    assert upload["pdf_link"] == f"/pdfs/{upload['sha256']}"
+    assert upload["url"] == f"https://library.example.edu/pdfs/{upload['sha256']}"
+    library.add_book(api.app.state.pool, "Godan", "Premchand", "Fiction", 150.0, upload["pdf_link"])
+    books = client.get("/books", params={"sort": "title"}).json()["books"]
+    assert [book["pdf_link"] for book in books] == [None, upload["url"]]
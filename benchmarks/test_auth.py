@@ -0,0 +1,42 @@
+import auth
+
+# Login throttle bookkeeping
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_throttle_forgets_old_failures(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "monotonic", clock)
+    throttle = auth.LoginThrottle(window=60)
+    for i in range(1000):
+        throttle.failed(f"made-up-{i}", client=f"10.0.{i // 256}.{i % 256}")
+    assert len(throttle._failures) == 2000
+
+    clock.now += 61
+    throttle.failed("someone")
+    assert list(throttle._failures) == [("user", "someone")]
+    clock.now += 61
+    assert throttle.retry_after("someone") == 0.0
+    assert not throttle._failures
+
+
+def test_throttle_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth.time, "monotonic", Clock())
+    throttle = auth.LoginThrottle(max_per_user=3, max_tracked=100)
+    for _ in range(3):
+        throttle.failed("target")
+    for i in range(99):
+        throttle.failed(f"made-up-{i}")
+    assert len(throttle._failures) == 100
+    assert throttle.retry_after("target") > 0     # still locked out
+
+    throttle.failed("one-too-many")
+    assert len(throttle._failures) == 100
+    assert ("user", "target") not in throttle._failures    # least recently failed goes first
@@ -0,0 +1,33 @@
+import db
+import cache
+import migrations
+
+# Correctness checks for the query result cache
+
+
+def test_commit_during_load_is_not_cached(tmp_path):
+    path = str(tmp_path / "lms.db")
+    pool = db.ConnectionPool(path)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    query_cache = cache.QueryCache(watch_conn=db.open_connection(path))
+    other = db.open_connection(path)    # another process, as far as the cache can tell
+
+    def count_books():
+        return pool.query_one("SELECT COUNT(*) FROM books")[0]
+
+    def load_then_commit_elsewhere():
+        count = count_books()
+        other.execute("INSERT INTO books (title, author) VALUES ('Godan', 'Premchand')")
+        other.commit()
+        # Another session notices the commit before this load is stored
+        query_cache.get_or_load("genres", ("books",), lambda: [])
+        return count
+
+    assert query_cache.get_or_load("books", ("books",), load_then_commit_elsewhere) == 0
+    # The stale count was not kept, so this loads again and sees the new book
+    assert query_cache.get_or_load("books", ("books",), count_books) == 1
+    assert query_cache.get_or_load("books", ("books",), count_books) == 1
+    assert query_cache.stats()["hits"] == 1
+    other.close()
+    pool.close()
@@ -0,0 +1,23 @@
+import pytest
+
+import intent
+
+# Routing checks for SHAIGO's local intent router
+
+
+@pytest.fixture(scope="module")
+def router():
+    return intent.IntentRouter()
+
+
+@pytest.mark.parametrize("query", ["find books in the library", "search", "do you have"])
+def test_search_without_slots_lists_books(router, query):
+    parsed = router.route(query)
+    assert parsed.name == intent.LIST_BOOKS
+    assert parsed.slots == {}
+
+
+def test_search_with_slots(router):
+    parsed = router.route("any romance novels by nora roberts", known_genres=["Romance"])
+    assert parsed.name == intent.SEARCH
+    assert parsed.slots == {"title": None, "author": "nora roberts", "genre": "Romance"}
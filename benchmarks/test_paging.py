@@ -0,0 +1,34 @@
+import pytest
+
+import db
+import library
+import migrations
+import paging
+
+# Keyset paging must visit every row exactly once, NULL sort keys included
+
+
+@pytest.fixture
+def small_pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "lms.db"))
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    for i in range(7):
+        library.add_book(pool, f"Book {i}", None if i % 2 else f"Author {i % 3}", "Fiction", None)
+    pool.execute("INSERT INTO books (title, author) VALUES (NULL, 'Anonymous'), (NULL, NULL)")
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize("sort", list(paging.VIEWS["books"].sort_columns))
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cover_every_book(small_pool, sort, descending):
+    seen, cursor = [], None
+    while True:
+        page = paging.fetch_page(small_pool, "books", cursor=cursor, page_size=2,
+                                 sort=sort, descending=descending)
+        seen += [row[0] for row in page.rows]
+        if not page.has_more:
+            break
+        cursor = page.next_cursor
+    assert sorted(seen) == [row[0] for row in small_pool.query("SELECT id FROM books ORDER BY id")]
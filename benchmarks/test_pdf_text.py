@@ -0,0 +1,48 @@
+import http.client
+import io
+
+from pypdf import PdfWriter
+
+import db
+import library
+import migrations
+import pdf_store
+import pdf_text
+
+# Background PDF text extraction, against a small migrated database
+
+
+def blank_pdf():
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_bad_link_fails_and_queue_moves_on(tmp_path, monkeypatch):
+    pool = db.ConnectionPool(str(tmp_path / "lms.db"))
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    store = pdf_store.PdfStore(str(tmp_path / "pdfs"))
+    digest = store.save_file(blank_pdf())
+    library.add_book(pool, "Truncated", "A", "Fiction", 1.0, "https://example.org/truncated.pdf")
+    library.add_book(pool, "Stored", "B", "Fiction", 1.0, pdf_store.link(digest))
+
+    real_fetch = pdf_text.fetch
+
+    def fetch(store, pdf_link):
+        if "truncated" in pdf_link:
+            raise http.client.IncompleteRead(b"%PDF-1.7", 1000)
+        return real_fetch(store, pdf_link)
+
+    monkeypatch.setattr(pdf_text, "fetch", fetch)
+    extractor = pdf_text.Extractor(pool, store, workers=1)
+    try:
+        assert extractor.run_once() == 2
+    finally:
+        extractor.stop()
+    statuses = dict(pool.query("SELECT b.title, p.status FROM book_pdfs p JOIN books b ON b.id = p.book_id"))
+    assert statuses == {"Truncated": "failed", "Stored": "done"}
+    pool.close()
@@ -0,0 +1,136 @@
+import pytest
+
+import auth
+import library
+import paging
+import recommend
+import search
+import similar
+import stats
+import synthetic
+
+# Every read the app issues, against the generated catalog at each scale.
+# Nothing here goes through the QueryCache: these are the cold-cache costs.
+
+
+@pytest.mark.benchmark(group="catalog")
+def test_books_status(benchmark, pool):
+    rows = benchmark(library.books_status, pool)
+    assert rows
+
+
+@pytest.mark.benchmark(group="catalog")
+def test_search(benchmark, pool):
+    assert benchmark(search.search_books, pool, "silent river")
+
+
+@pytest.mark.benchmark(group="catalog")
+def test_search_by_author_and_genre(benchmark, pool):
+    benchmark(search.search_books, pool, None, author="sharma", genre="fiction")
+
+
+@pytest.mark.benchmark(group="catalog")
+def test_genres(benchmark, pool):
+    benchmark(pool.query, "SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL AND genre != ''")
+
+
+@pytest.mark.benchmark(group="paging")
+@pytest.mark.parametrize("view, sort", [
+    ("books", "title"), ("users", "username"), ("assignments", "id"),
+    ("borrowed", "borrowed_date"), ("returned", "returned_date"),
+])
+def test_first_page(benchmark, pool, view, sort):
+    page = benchmark(paging.fetch_page, pool, view, sort=sort, descending=True)
+    assert page.rows
+
+
+@pytest.mark.benchmark(group="paging")
+@pytest.mark.parametrize("view, sort", [(view, sort) for view, definition in paging.VIEWS.items()
+                                         for sort in definition.sort_columns])
+def test_deep_page(benchmark, pool, view, sort):
+    view_def = paging.VIEWS[view]
+    where = f"WHERE {view_def.condition}" if view_def.condition else ""
+    rows = pool.query_one(f"SELECT COUNT(*) FROM {view_def.source} {where}")[0]
+    # Seek from halfway through the view
+    middle = paging.fetch_page(pool, view, sort=sort, page_size=max(1, rows // 2)).next_cursor
+    page = benchmark(paging.fetch_page, pool, view, cursor=middle, sort=sort)
+    assert page.rows
+
+
+@pytest.mark.benchmark(group="circulation")
+def test_returned_books(benchmark, pool):
+    assert benchmark(library.returned_books, pool)
+
+
+@pytest.mark.benchmark(group="circulation")
+def test_user_loans(benchmark, pool, busiest_user):
+    benchmark(library.user_loans, pool, busiest_user[0])
+
+
+@pytest.mark.benchmark(group="circulation")
+def test_user_requests(benchmark, pool, busiest_user):
+    benchmark(library.user_requests, pool, busiest_user[0])
+
+
+@pytest.mark.benchmark(group="circulation")
+def test_all_requests(benchmark, pool):
+    assert benchmark(library.all_requests, pool)
+
+
+@pytest.mark.benchmark(group="circulation")
+def test_users(benchmark, pool):
+    assert benchmark(library.users, pool)
+
+
+@pytest.mark.benchmark(group="stats")
+def test_stats_summary(benchmark, pool):
+    assert benchmark(stats.summary, pool)["total_loans"]
+
+
+@pytest.mark.benchmark(group="stats")
+def test_top_books(benchmark, pool):
+    assert benchmark(stats.top_books, pool)
+
+
+@pytest.mark.benchmark(group="stats")
+def test_daily(benchmark, pool):
+    benchmark(stats.daily, pool, 365)
+
+
+@pytest.mark.benchmark(group="login")
+def test_login(benchmark, pool, hasher, busiest_user):
+    """login_user: throttle check, credentials lookup and bcrypt verify"""
+    throttle = auth.LoginThrottle()
+    username = busiest_user[1]
+
+    def login():
+        if throttle.retry_after(username, "127.0.0.1"):
+            return False
+        user = library.credentials(pool, username, "user")
+        return hasher.verify(synthetic.PASSWORD, user[1] if user else None)
+
+    assert benchmark(login)
+
+
+@pytest.mark.benchmark(group="startup")
+def test_similarity_index_build(benchmark, pool):
+    benchmark.pedantic(similar.build_index, args=(pool,), rounds=3, iterations=1)
+
+
+@pytest.mark.benchmark(group="startup")
+def test_recommender_build(benchmark, pool):
+    benchmark.pedantic(recommend.build_recommender, args=(pool,), rounds=3, iterations=1)
+
+
+@pytest.mark.benchmark(group="recommendations")
+def test_similar_to(benchmark, pool, popular_title):
+    index = similar.build_index(pool)
+    book_id = library.book_id(pool, popular_title)
+    assert benchmark(index.similar_to, book_id)
+
+
+@pytest.mark.benchmark(group="recommendations")
+def test_for_user(benchmark, pool, busiest_user):
+    recommender = recommend.build_recommender(pool)
+    # Bypass the per-user memo so every round does the work
+    benchmark(lambda: (recommender._user_recs.clear(), recommender.for_user(busiest_user[0]))[1])
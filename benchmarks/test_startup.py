@@ -0,0 +1,70 @@
+import ast
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import assets
+import startup
+
+# Cold-start guard: the modules app.py imports at the top must not drag in
+# the libraries startup.LazyModule defers, and importing them in a fresh
+# interpreter has to fit in the cold start budget. Preparing backgrounds
+# that are already built must not load PIL either.
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+DEFERRED = ("pandas", "numpy", "scipy", "PIL", "google.generativeai")
+
+
+def app_imports():
+    """Modules imported by top-level import statements in app.py"""
+    with open(APP, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def app_backgrounds():
+    """The page background file names from app.py's `backgrounds` dict"""
+    with open(APP, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "backgrounds" for t in node.targets):
+            return list(ast.literal_eval(node.value).values())
+    raise AssertionError("app.py has no backgrounds dict")
+
+
+def import_in_fresh_interpreter():
+    code = (f"import sys\n"
+            f"for name in {app_imports()!r}: __import__(name)\n"
+            f"print(','.join(m for m in {DEFERRED!r} if m in sys.modules))")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(APP),
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result.stdout.strip()
+
+
+@pytest.mark.benchmark(group="startup")
+def test_app_imports(benchmark):
+    seconds, loaded = benchmark.pedantic(import_in_fresh_interpreter, rounds=3, iterations=1)
+    assert not loaded, f"app.py imports load {loaded} eagerly"
+    assert seconds * 1000 < startup.COLD_START_BUDGET_MS
+
+
+def test_built_backgrounds_skip_pil(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "STATIC_DIR", str(tmp_path))
+    assets.build_all(app_backgrounds())
+    code = (f"import sys, assets\n"
+            f"assets.STATIC_DIR = {str(tmp_path)!r}\n"
+            f"assets.build_all({app_backgrounds()!r})\n"
+            f"print('PIL' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(APP),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False", "up-to-date backgrounds still load PIL"
@@ -0,0 +1,137 @@
+import io
+import itertools
+import threading
+
+import pytest
+
+import auth
+import importer
+import library
+import synthetic
+
+# Write paths, against the same per-session database copies as the reads.
+# Each round writes new rows, so the tables grow slowly while timing.
+
+_counter = itertools.count()
+
+# Checkout rush: RUSH_READERS sessions borrowing and returning at once
+RUSH_READERS = 8
+RUSH_ROUNDS = 25
+
+
+@pytest.mark.benchmark(group="circulation-writes")
+def test_borrow_and_return(benchmark, pool, busiest_user, popular_title):
+    # The bestseller usually has every copy out; put one more on the shelf
+    copies = pool.query_one("SELECT copies FROM books WHERE title = ?", (popular_title,))[0]
+    library.set_copies(pool, popular_title, copies + 1)
+
+    def borrow_and_return():
+        library.borrow_book(pool, popular_title, busiest_user[0])
+        library.return_book(pool, popular_title, busiest_user[0])
+
+    benchmark(borrow_and_return)
+
+
+@pytest.mark.benchmark(group="circulation-writes")
+def test_assign_book(benchmark, pool, busiest_user, popular_title):
+    benchmark(library.assign_book, pool, popular_title, busiest_user[1], 1)
+
+
+@pytest.mark.benchmark(group="circulation-writes")
+def test_request_book(benchmark, pool, busiest_user):
+    benchmark(lambda: library.request_book(pool, f"Wanted {next(_counter)}", busiest_user[0]))
+
+
+@pytest.mark.benchmark(group="circulation-writes")
+def test_update_request(benchmark, pool):
+    request_id = pool.query_one("SELECT MAX(id) FROM book_requests")[0]
+    statuses = itertools.cycle(library.REQUEST_STATUSES)
+    benchmark(lambda: library.update_request(pool, request_id, next(statuses)))
+
+
+@pytest.mark.benchmark(group="catalog-writes")
+def test_add_and_remove_book(benchmark, pool):
+    """Add Book / Remove Book, including the FTS index triggers"""
+    def add_and_remove():
+        title = f"Benchmark Book {next(_counter)}"
+        library.add_book(pool, title, "Bench Author", "Fiction", 499.0, "")
+        library.remove_book(pool, title)
+
+    benchmark(add_and_remove)
+
+
+@pytest.mark.benchmark(group="catalog-writes")
+def test_import_1000_books(benchmark, pool):
+    def feed():
+        batch = next(_counter)
+        rows = "\n".join(f"Imported {batch}-{i},Bench Author,Fiction,299" for i in range(1000))
+        return (io.BytesIO(f"title,author,genre,price\n{rows}\n".encode("utf-8")),), {}
+
+    def run(fileobj):
+        assert importer.import_books(pool, fileobj, "csv").inserted == 1000
+
+    benchmark.pedantic(run, setup=feed, rounds=5, iterations=1)
+
+
+@pytest.mark.benchmark(group="login")
+def test_register_user(benchmark, pool, hasher):
+    def register():
+        n = next(_counter)
+        library.add_user(pool, f"bench{n}", f"bench{n}@example.edu", hasher.hash(synthetic.PASSWORD), "user")
+
+    benchmark(register)
+
+
+@pytest.mark.benchmark(group="login")
+def test_rehash_on_login(benchmark, pool, hasher, busiest_user):
+    """The one-off UPDATE login_user makes when the stored cost is stale"""
+    upgraded = auth.PasswordHasher(rounds=synthetic.HASH_ROUNDS + 1)
+
+    def rehash():
+        library.set_password_hash(pool, busiest_user[0], upgraded.hash(synthetic.PASSWORD))
+
+    benchmark(rehash)
+
+
+@pytest.fixture(scope="module")
+def rush(pool):
+    """(reader id, title) pairs for the checkout rush, with copies to spare"""
+    readers = [row[0] for row in pool.query(
+        "SELECT user_id FROM circulation_user_stats ORDER BY loans DESC LIMIT ?", (RUSH_READERS,))]
+    titles = [row[0] for row in pool.query(
+        "SELECT title FROM books ORDER BY id LIMIT ?", (RUSH_READERS,))]
+    for title in titles:
+        copies = pool.query_one("SELECT copies FROM books WHERE title = ?", (title,))[0]
+        library.set_copies(pool, title, copies + RUSH_READERS)
+    return list(zip(readers, titles))
+
+
+def _checkout_rush(rush, borrow, give_back):
+    def reader(user, title):
+        for _ in range(RUSH_ROUNDS):
+            borrow(title, user)
+            give_back(title, user)
+
+    threads = [threading.Thread(target=reader, args=pair) for pair in rush]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.mark.benchmark(group="checkout-rush")
+def test_checkout_rush_own_transactions(benchmark, pool, rush):
+    """Every session commits its own borrow/return (the old app path)"""
+    benchmark.pedantic(_checkout_rush, args=(rush,
+                                             lambda title, user: library.borrow_book(pool, title, user),
+                                             lambda title, user: library.return_book(pool, title, user)),
+                       rounds=5, iterations=1)
+
+
+@pytest.mark.benchmark(group="checkout-rush")
+def test_checkout_rush_write_queue(benchmark, write_queue, rush):
+    """The same rush, group-committed on the writer thread"""
+    benchmark.pedantic(_checkout_rush, args=(rush,
+                                             lambda title, user: write_queue.run(library.borrow_book, title, user),
+                                             lambda title, user: write_queue.run(library.return_book, title, user)),
+                       rounds=5, iterations=1)
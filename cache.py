@@ -0,0 +1,110 @@
+import functools
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# ===== WRITE-AWARE QUERY RESULT CACHE =====
+# Read helpers are memoized together with the write generation of every
+# table they read. Write paths bump the generation of the tables they touch,
+# so a cached result is served until one of its tables actually changes.
+# Commits made by other processes are caught through PRAGMA data_version.
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+class QueryCache:
+    """Size-bounded LRU cache for read query results"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, watch_conn=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (generations, expires_at, value)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        # A dedicated connection whose data_version changes whenever any
+        # *other* connection commits (including other processes)
+        self._watch = watch_conn
+        self._seen_version = self._data_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _data_version(self):
+        if self._watch is None:
+            return None
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_foreign_writes(self):
+        """Drop everything if someone committed without telling us"""
+        with self._lock:
+            version = self._data_version()
+            if version != self._seen_version:
+                self._seen_version = version
+                self._entries.clear()
+
+    def invalidate(self, *tables):
+        """Record a committed write to `tables`; call after every write path"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] += 1
+            # Our own commit also moved data_version; don't treat it as foreign
+            self._seen_version = self._data_version()
+
+    def get_or_load(self, key, tables, loader, ttl=None):
+        """Return the cached value for `key`, or run `loader` and cache it.
+
+        `tables` are the tables the result depends on. `ttl` (seconds) bounds
+        the age of results that also depend on the clock.
+        """
+        self._check_foreign_writes()
+        with self._lock:
+            version = self._seen_version
+            generations = tuple(self._generations[table] for table in tables)
+            entry = self._entries.get(key)
+            if entry and entry[0] == generations and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Load outside the lock. If anything commits meanwhile, here or in
+        # another process, the result may predate it: return it but don't keep it.
+        value = loader()
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            current = self._data_version()
+            if current != self._seen_version:
+                self._seen_version = current
+                self._entries.clear()
+            if current != version or generations != tuple(self._generations[table] for table in tables):
+                return value
+            self._entries[key] = (generations, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def cached(self, *tables, ttl=None):
+        """Decorator memoizing a read helper on its (hashable) arguments"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+                return self.get_or_load(key, tables, lambda: func(*args, **kwargs), ttl=ttl)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,371 @@
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# ===== SHARED DATA ACCESS LAYER =====
+# Every page and helper talks to SQLite through a single ConnectionPool per
+# process instead of opening and closing its own connection on each call.
+
+DB_PATH = os.environ.get(
+    "LMS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lms.db")
+)
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every pooled connection when it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",    # 256 MB
+    "PRAGMA cache_size=-16384",      # 16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+# ===== SQL INSTRUMENTATION =====
+# Pooled connections time every statement they run: latency (execution plus
+# fetchone/fetchmany/fetchall), rows returned or changed and the calling
+# line outside this module. Statements slower than SLOW_QUERY_MS also get
+# their EXPLAIN QUERY PLAN stored in a rolling slow-query log. Set
+# LMS_SQL_MONITOR=0 to hand out plain connections instead.
+
+MONITOR_ENABLED = os.environ.get("LMS_SQL_MONITOR", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("LMS_SLOW_QUERY_MS", "50"))
+SLOW_LOG_SIZE = 200
+LATENCY_SAMPLES = 1000      # most recent latencies kept per statement for p95
+MAX_STATEMENTS = 1000       # distinct statements tracked
+MAX_SQL_LENGTH = 2000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+_SKIPPED_FILES = (_THIS_FILE, os.path.normcase(os.path.abspath(sys.modules[contextmanager.__module__].__file__)))
+
+
+_file_labels = {}     # code filename -> basename, or None for frames to skip
+
+
+def _file_label(filename):
+    label = _file_labels.get(filename, False)
+    if label is False:
+        path = os.path.normcase(os.path.abspath(filename))
+        label = _file_labels[filename] = None if path in _SKIPPED_FILES else os.path.basename(path)
+    return label
+
+
+def _call_site():
+    """'file.py:line in function' of the nearest caller outside this module"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        label = _file_label(frame.f_code.co_filename)
+        if label is not None:
+            return f"{label}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class _StatementStats:
+    __slots__ = ("calls", "total", "max", "rows", "latencies", "sites")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.sites = Counter()
+
+
+class QueryMonitor:
+    """Per-statement latency statistics and a slow-query log"""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._statements = {}
+        self._normalized = {}   # raw SQL -> whitespace-collapsed text
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, seconds, rows, site):
+        text = self._normalized.get(sql)
+        if text is None:
+            text = _WHITESPACE_RE.sub(" ", sql).strip()[:MAX_SQL_LENGTH]
+            if len(self._normalized) < MAX_STATEMENTS * 2:
+                self._normalized[sql] = text
+        with self._lock:
+            entry = self._statements.get(text)
+            if entry is None and len(self._statements) < MAX_STATEMENTS:
+                entry = self._statements[text] = _StatementStats()
+            if entry is not None:
+                entry.calls += 1
+                entry.total += seconds
+                entry.max = max(entry.max, seconds)
+                entry.rows += max(rows, 0)
+                entry.latencies.append(seconds)
+                entry.sites[site] += 1
+        if seconds * 1000 >= self.slow_ms:
+            plan = self.explain(conn, sql, params)
+            with self._lock:
+                self._slow.append({
+                    "at": time.time(), "sql": text, "ms": seconds * 1000,
+                    "rows": rows, "site": site, "plan": plan,
+                })
+
+    @staticmethod
+    def explain(conn, sql, params):
+        """EXPLAIN QUERY PLAN as an indented tree, or None if not applicable"""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE) or params is None:
+            return None
+        try:
+            # The plain Connection.execute, so this isn't recorded itself
+            plan = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except sqlite3.Error as e:
+            return f"(no plan: {e})"
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in plan:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return "\n".join(lines)
+
+    def top(self, by="total", limit=20):
+        """Statements ordered by total, p95, max or mean time, or calls"""
+        rows = []
+        with self._lock:
+            for sql, entry in self._statements.items():
+                latencies = sorted(entry.latencies)
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+                rows.append({
+                    "sql": sql,
+                    "calls": entry.calls,
+                    "total_ms": entry.total * 1000,
+                    "mean_ms": entry.total * 1000 / entry.calls,
+                    "p95_ms": p95 * 1000,
+                    "max_ms": entry.max * 1000,
+                    "rows": entry.rows,
+                    "site": entry.sites.most_common(1)[0][0],
+                })
+        rows.sort(key=lambda row: row[by if by == "calls" else f"{by}_ms"], reverse=True)
+        return rows[:limit]
+
+    def slow_queries(self):
+        """Slow-query log, newest first"""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+
+
+monitor = QueryMonitor()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to `monitor`.
+
+    A statement is recorded when its result is fully fetched (fetchall, or
+    fetchone/fetchmany running dry), when the cursor runs its next
+    statement, or when the cursor is closed or dropped.
+    """
+
+    _pending = None     # [sql, params, seconds, rows, site] of a read still being fetched
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending:
+            monitor.record(self.connection, *pending)
+
+    def _run(self, method, sql, params, first_params):
+        self._finish()
+        site = _call_site()
+        started = time.perf_counter()
+        method(sql, params)
+        seconds = time.perf_counter() - started
+        if self.description is None:
+            # Writes and DDL: done already
+            monitor.record(self.connection, sql, first_params, seconds, self.rowcount, site)
+        else:
+            self._pending = [sql, first_params, seconds, 0, site]
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if isinstance(seq_of_parameters, (list, tuple)):
+            first = seq_of_parameters[0] if seq_of_parameters else None
+        else:
+            first = None    # a generator; don't consume it for the plan
+        return self._run(super().executemany, sql, seq_of_parameters, first)
+
+    def _fetched(self, started, count, done):
+        pending = self._pending
+        if pending:
+            pending[2] += time.perf_counter() - started
+            pending[3] += count
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        if self._pending:
+            self._pending[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including execute shortcuts) are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def open_connection(path=DB_PATH):
+    """Open a tuned SQLite connection that may be shared across threads"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=InstrumentedConnection if MONITOR_ENABLED else sqlite3.Connection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Fixed-size pool of tuned SQLite connections.
+
+    Connections are opened lazily up to `size`; callers beyond that wait
+    for a connection to be handed back.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return open_connection(self.path)
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool afterwards"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Borrow a connection and commit everything done with it at once.
+
+        With `immediate`, the write lock is taken up front (BEGIN IMMEDIATE)
+        so nothing can change between this transaction's reads and writes.
+        """
+        with self.connection() as conn:
+            try:
+                if immediate:
+                    conn.execute("BEGIN IMMEDIATE")
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def query(self, sql, params=()):
+        """Run a read query and return all rows"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """Run a read query and return the first row (or None)"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        """Run a single write statement and commit; returns the cursor"""
+        with self.transaction() as conn:
+            return conn.execute(sql, params)
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
@@ -0,0 +1,337 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+
+import db
+
+# ===== BULK CATALOG IMPORT =====
+# Streams CSV, JSON (array or one object per line) and binary MARC 21 files
+# record by record, validates each book and inserts them in batches with
+# executemany, one transaction per batch. Titles that already exist (the
+# case-insensitive unique title index) or repeat within the file are
+# skipped by INSERT OR IGNORE. Each batch also advances the job's checkpoint
+# in import_jobs inside the same transaction, so re-running the same file
+# after a failure resumes after the last committed batch.
+
+BATCH_SIZE = 5000
+MAX_REJECTS = 200           # rejected rows kept for the report
+HASH_CHUNK = 1 << 20
+
+Book = namedtuple("Book", ["title", "author", "genre", "price", "pdf_link"])
+ImportResult = namedtuple("ImportResult", [
+    "job_id", "records", "inserted", "skipped", "rejected", "rejects", "resumed_from"
+])
+
+# Accepted header spellings for each books column
+FIELD_ALIASES = {
+    "title": ("title", "book title", "name", "book"),
+    "author": ("author", "authors", "writer", "by"),
+    "genre": ("genre", "category", "subject"),
+    "price": ("price", "cost", "list price", "price (₹)"),
+    "pdf_link": ("pdf_link", "pdf link", "pdf", "url", "link"),
+}
+_ALIAS_TO_FIELD = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "json",
+    ".ndjson": "json",
+    ".mrc": "marc",
+    ".marc": "marc",
+}
+
+PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?|\d+,\d{1,2}\b")
+
+
+def detect_format(filename):
+    fmt = FORMATS.get(os.path.splitext(filename.lower())[1])
+    if fmt is None:
+        raise ValueError(f"Unsupported file type: {filename}")
+    return fmt
+
+
+def fingerprint(fileobj):
+    """SHA-256 of a seekable file's contents, leaving it rewound"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+# ----- readers: binary file -> dicts -----
+
+def _text(fileobj):
+    return io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+
+
+def read_csv(fileobj):
+    text = _text(fileobj)
+    try:
+        for row in csv.DictReader(text):
+            yield {_ALIAS_TO_FIELD.get((key or "").strip().lower(), key): value
+                   for key, value in row.items()}
+    finally:
+        # Don't let the wrapper close the caller's file
+        text.detach()
+
+
+def _json_objects(text):
+    """Objects of a JSON array or JSON Lines stream, read in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,[")
+        if buffer.startswith("]"):
+            return
+        if buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                buffer = buffer[end:]
+                continue
+        if eof:
+            return
+        chunk = text.read(1 << 16)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_json(fileobj):
+    text = _text(fileobj)
+    try:
+        for obj in _json_objects(text):
+            if isinstance(obj, dict):
+                yield {_ALIAS_TO_FIELD.get(key.strip().lower(), key): value
+                       for key, value in obj.items()}
+            else:
+                yield {"title": None, "_error": f"expected an object, got {type(obj).__name__}"}
+    finally:
+        text.detach()
+
+
+MARC_RECORD_END = b"\x1d"
+MARC_FIELD_END = b"\x1e"
+MARC_SUBFIELD = b"\x1f"
+
+# (tag, subfield codes) tried in order for each books column
+MARC_FIELDS = {
+    "title": [("245", "ab")],
+    "author": [("100", "a"), ("110", "a"), ("700", "a")],
+    "genre": [("655", "a"), ("650", "a")],
+    "price": [("020", "c"), ("365", "b")],
+    "pdf_link": [("856", "u")],
+}
+
+
+def _marc_records(fileobj, chunk_size=1 << 16):
+    buffer = b""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            if buffer.strip():
+                yield buffer
+            return
+        buffer += chunk
+        *records, buffer = buffer.split(MARC_RECORD_END)
+        yield from records
+
+
+def parse_marc(record):
+    """Map one ISO 2709 (MARC 21) record to a dict of books columns"""
+    base = int(record[12:17])
+    directory = record[24:base - 1]
+    fields = {}
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode("ascii")
+        length = int(directory[i + 3:i + 7])
+        start = int(directory[i + 7:i + 12])
+        data = record[base + start:base + start + length].rstrip(MARC_FIELD_END)
+        fields.setdefault(tag, []).append(data)
+
+    book = {}
+    for column, sources in MARC_FIELDS.items():
+        for tag, codes in sources:
+            for data in fields.get(tag, ()):
+                # Skip the two indicator characters, then split subfields
+                parts = [part.decode("utf-8", "replace") for part in data[2:].split(MARC_SUBFIELD)[1:]]
+                values = [part[1:].strip() for part in parts if part and part[0] in codes]
+                if values:
+                    book[column] = " ".join(values)
+                    break
+            if column in book:
+                break
+    # Cataloguing punctuation: "Title / " and "Author, Name,"
+    for column in ("title", "author", "genre"):
+        if book.get(column):
+            book[column] = book[column].rstrip(" /:;,.")
+    return book
+
+
+def read_marc(fileobj):
+    for record in _marc_records(fileobj):
+        try:
+            yield parse_marc(record)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield {"title": None, "_error": f"unreadable MARC record: {e}"}
+
+
+READERS = {"csv": read_csv, "json": read_json, "marc": read_marc}
+
+
+# ----- validation -----
+
+def _clean(value):
+    if value is None:
+        return None
+    value = re.sub(r"\s+", " ", str(value)).strip()
+    return value or None
+
+
+def validate(record):
+    """Book for a raw record, or raise ValueError with the reason"""
+    if record.get("_error"):
+        raise ValueError(record["_error"])
+    title = _clean(record.get("title"))
+    if not title:
+        raise ValueError("missing title")
+    if len(title) > 500:
+        raise ValueError("title longer than 500 characters")
+    price = record.get("price")
+    if price in (None, ""):
+        price = None
+    elif not isinstance(price, (int, float)):
+        match = PRICE_RE.search(str(price))
+        if not match:
+            raise ValueError(f"invalid price {price!r}")
+        number = match.group()
+        # "1,299.00" uses commas for thousands, "12,99" as the decimal point
+        if re.fullmatch(r"\d+,\d{1,2}", number):
+            number = number.replace(",", ".")
+        price = float(number.replace(",", ""))
+    if price is not None and price < 0:
+        raise ValueError(f"negative price {price!r}")
+    return Book(title, _clean(record.get("author")), _clean(record.get("genre")),
+                price, _clean(record.get("pdf_link")))
+
+
+# ----- import jobs -----
+
+def _start_job(pool, source, digest, fmt):
+    """Job id and records already committed for this file (0 for a new job)"""
+    job = pool.query_one('''
+        SELECT id, records_done FROM import_jobs
+        WHERE fingerprint = ? AND status != 'done'
+        ORDER BY id DESC LIMIT 1
+    ''', (digest,))
+    if job:
+        pool.execute("UPDATE import_jobs SET status = 'running', error = NULL WHERE id = ?", (job[0],))
+        return job
+    cursor = pool.execute('''
+        INSERT INTO import_jobs (source, fingerprint, format, status)
+        VALUES (?, ?, ?, 'running')
+    ''', (source, digest, fmt))
+    return cursor.lastrowid, 0
+
+
+def _commit_batch(pool, job_id, batch, records_done, rejected):
+    with pool.transaction() as conn:
+        # rowcount sums the direct inserts only (not the FTS trigger's)
+        inserted = conn.executemany('''
+            INSERT OR IGNORE INTO books (title, author, genre, price, pdf_link)
+            VALUES (?, ?, ?, ?, ?)
+        ''', batch).rowcount if batch else 0
+        conn.execute('''
+            UPDATE import_jobs
+            SET records_done = ?, inserted = inserted + ?, skipped = skipped + ?,
+                rejected = rejected + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (records_done, inserted, len(batch) - inserted, rejected, job_id))
+    return inserted
+
+
+def import_books(pool, fileobj, fmt, source="upload", batch_size=BATCH_SIZE, progress=None):
+    """Stream a catalog file into books.
+
+    `fileobj` is a seekable binary file. `progress(done_bytes, total_bytes,
+    result)` is called after every committed batch. Returns an ImportResult;
+    `rejects` holds up to MAX_REJECTS (record number, reason) pairs.
+    """
+    reader = READERS[fmt]
+    digest = fingerprint(fileobj)
+    fileobj.seek(0, os.SEEK_END)
+    total_bytes = fileobj.tell()
+    fileobj.seek(0)
+
+    job_id, resume_after = _start_job(pool, source, digest, fmt)
+    records = inserted = skipped = rejected = 0
+    rejects = []
+    batch = []
+    batch_rejected = 0
+
+    def result():
+        return ImportResult(job_id, records, inserted, skipped, rejected, rejects, resume_after)
+
+    try:
+        for number, record in enumerate(reader(fileobj), start=1):
+            if number <= resume_after:
+                continue
+            records += 1
+            try:
+                batch.append(validate(record))
+            except ValueError as e:
+                batch_rejected += 1
+                if len(rejects) < MAX_REJECTS:
+                    rejects.append((number, str(e)))
+            if len(batch) + batch_rejected >= batch_size:
+                added = _commit_batch(pool, job_id, batch, number, batch_rejected)
+                inserted += added
+                skipped += len(batch) - added
+                rejected += batch_rejected
+                batch, batch_rejected = [], 0
+                if progress:
+                    progress(fileobj.tell(), total_bytes, result())
+        added = _commit_batch(pool, job_id, batch, resume_after + records, batch_rejected)
+        inserted += added
+        skipped += len(batch) - added
+        rejected += batch_rejected
+    except Exception as e:
+        pool.execute("UPDATE import_jobs SET status = 'failed', error = ? WHERE id = ?", (str(e), job_id))
+        raise
+    pool.execute("UPDATE import_jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                 (job_id,))
+    if progress:
+        progress(total_bytes, total_bytes, result())
+    return result()
+
+
+if __name__ == "__main__":
+    # python importer.py vendor_feed.csv [database]
+    import time
+
+    import migrations
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python importer.py FILE [database]")
+    pool = db.ConnectionPool(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH, size=1)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    started = time.perf_counter()
+    with open(sys.argv[1], "rb") as f:
+        summary = import_books(
+            pool, f, detect_format(sys.argv[1]), source=os.path.basename(sys.argv[1]),
+            progress=lambda done, total, r: print(f"\r{done * 100 // max(total, 1)}% "
+                                                  f"{r.inserted} added", end="", flush=True))
+    print(f"\n{summary._replace(rejects=summary.rejects[:5])} in {time.perf_counter() - started:.1f}s")
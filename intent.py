@@ -0,0 +1,225 @@
+import math
+import re
+from collections import Counter, defaultdict, namedtuple
+
+# ===== LOCAL INTENT ROUTER =====
+# Decides what a SHAIGO message is asking for without calling Gemini:
+# high-precision regex rules first, then a small multinomial naive Bayes
+# classifier trained on the examples below. Slots (title, author, genre)
+# are pulled out so the caller can answer with parameterized queries.
+# Only messages classified as open_ended should reach the LLM.
+
+Intent = namedtuple("Intent", ["name", "slots", "confidence", "source"])
+
+GREETING = "greeting"
+HELP = "help"
+LIST_BOOKS = "list_books"
+LIST_USERS = "list_users"
+SEARCH = "search_catalog"
+MY_LOANS = "my_loans"
+MY_REQUESTS = "my_requests"
+SIGNUP = "signup_help"
+SUMMARY = "book_summary"
+SIMILAR = "similar_books"
+INSIDE = "search_inside_books"
+OPEN_ENDED = "open_ended"
+
+# Below this classifier probability we don't trust the label
+MIN_CONFIDENCE = 0.45
+# Unclassifiable messages this short are treated as a title lookup ("gandhi")
+BARE_LOOKUP_WORDS = 3
+
+RULES = [
+    (GREETING, re.compile(r"^(hi|hello|hey|hiya|good (morning|afternoon|evening))\b[\s!.,]*(shaigo)?[\s!.]*$")),
+    (HELP, re.compile(r"^(help|\?|what can you do|how do i use (this|you))\b")),
+    (MY_LOANS, re.compile(r"\b(my (borrowed |current )?(books|loans)|books i (have|borrowed)|what (have|did) i borrow)")),
+    (MY_REQUESTS, re.compile(r"\b(my (book )?requests?|requests? i (made|submitted)|status of my request)")),
+    (SIMILAR, re.compile(r"\b(books? (like|similar to)|similar to|more like|something like)\b")),
+    (INSIDE, re.compile(r"\b(inside|within|in the text of) (the |our |any )?(books?|pdfs?)\b|"
+                        r"\b(which|what) (books?|pdfs?|pages?) (mentions?|talks? about|discuss(es)?|covers?)\b")),
+    (LIST_USERS, re.compile(r"\b(show|list|all|registered)\s+(the\s+)?users\b|^users$")),
+    (LIST_BOOKS, re.compile(r"\b(available books|(show|list)( me)?( all)?( the)? books|all books)\b")),
+    (SIGNUP, re.compile(r"\b(sign ?up|register|create (an |my )?account|new account)\b")),
+    (SEARCH, re.compile(r"\bby\s+\w|^any\b|\b(do you have|is there|are there|find|search|look(ing)? for|available)\b")),
+    (SUMMARY, re.compile(r"^(tell me about|summary of|summari[sz]e|describe|what is|what's)\b")),
+]
+
+TRAINING_EXAMPLES = [
+    (GREETING, "hi"), (GREETING, "hello there"), (GREETING, "hey shaigo"),
+    (GREETING, "good morning"), (GREETING, "hi how are you"),
+    (HELP, "help"), (HELP, "what can you do"), (HELP, "how does this work"),
+    (HELP, "what can i ask you"), (HELP, "show me the commands"),
+    (LIST_BOOKS, "show available books"), (LIST_BOOKS, "list all books"),
+    (LIST_BOOKS, "what books are in the library"), (LIST_BOOKS, "show me the catalog"),
+    (LIST_BOOKS, "which books can i borrow"), (LIST_BOOKS, "full book list"),
+    (LIST_USERS, "show users"), (LIST_USERS, "list registered users"),
+    (LIST_USERS, "who are the members"), (LIST_USERS, "how many users are registered"),
+    (SEARCH, "books by tolkien"), (SEARCH, "what is available by agatha christie"),
+    (SEARCH, "do you have dune"), (SEARCH, "is the hobbit available"),
+    (SEARCH, "find fantasy books"), (SEARCH, "search for python programming"),
+    (SEARCH, "any romance novels"), (SEARCH, "looking for a history book"),
+    (SEARCH, "which books did chetan bhagat write"), (SEARCH, "do we have autobiographies"),
+    (SEARCH, "is gandhi in stock"), (SEARCH, "can i get the zoya factor"),
+    (MY_LOANS, "my borrowed books"), (MY_LOANS, "what books do i have"),
+    (MY_LOANS, "which books have i borrowed"), (MY_LOANS, "show my loans"),
+    (MY_LOANS, "when are my books due"), (MY_LOANS, "books i have checked out"),
+    (MY_REQUESTS, "my requests"), (MY_REQUESTS, "status of my book request"),
+    (MY_REQUESTS, "was my request approved"), (MY_REQUESTS, "show the books i requested"),
+    (SIGNUP, "how do i sign up"), (SIGNUP, "how to register"),
+    (SIGNUP, "create an account"), (SIGNUP, "i want to join the library"),
+    (SUMMARY, "tell me about dune"), (SUMMARY, "summary of the alchemist"),
+    (SUMMARY, "what is the hobbit about"), (SUMMARY, "describe playing it my way"),
+    (SUMMARY, "who wrote the immortals of meluha"), (SUMMARY, "what happens in 1984"),
+    (SUMMARY, "is the zoya factor a good read"), (SUMMARY, "plot of pride and prejudice"),
+    (SIMILAR, "books like dune"), (SIMILAR, "anything similar to the hobbit"),
+    (SIMILAR, "more like the zoya factor"), (SIMILAR, "what else is like gandhi"),
+    (SIMILAR, "if i liked the alchemist what should i read next"),
+    (INSIDE, "search inside books for photosynthesis"), (INSIDE, "which books mention the salt march"),
+    (INSIDE, "find pages about quantum tunnelling"), (INSIDE, "where is recursion explained in our pdfs"),
+    (INSIDE, "which page talks about the french revolution"),
+    (OPEN_ENDED, "how do i improve my reading habits"), (OPEN_ENDED, "why should i read classics"),
+    (OPEN_ENDED, "explain the difference between fiction and nonfiction"),
+    (OPEN_ENDED, "what makes a good book club discussion"),
+    (OPEN_ENDED, "how can i focus while studying"), (OPEN_ENDED, "recommend a study technique"),
+    (OPEN_ENDED, "what are the benefits of reading"), (OPEN_ENDED, "how do i cite a book in apa"),
+]
+
+# Words that frame a catalog question but are not part of what to look for
+FILLER_RE = re.compile(
+    r"\b(?:find|search|for|look|looking|do|you|we|have|has|any|is|are|there|"
+    r"available|in|stock|the library|show|me|what|which|books?|titles?|novels?|"
+    r"written|can|i|get|a|an|please)\b"
+)
+SUMMARY_LEAD_RE = re.compile(
+    r"^(?:tell me about|summary of|summari[sz]e|describe|what is|what's|who wrote|plot of|"
+    r"what happens in)\s+|.*\b(?:books? like|similar to|more like|something like|is like)\s+"
+)
+# Words that frame a search-inside-books question
+INSIDE_FRAME_RE = re.compile(
+    r"\b(?:inside|within|in the text of|in)\s+(?:the\s+|our\s+|any\s+)?(?:books?|pdfs?)\b|"
+    r"\b(?:mentions?(?: of)?|mentioning|talks? about|talking about|discuss(?:es|ing)?|covers?|"
+    r"explained|explains?|about|where|pages?|search|which|of|the)\b"
+)
+BY_AUTHOR_RE = re.compile(r"\b(?:written\s+)?by\s+(.+)$")
+QUOTED_RE = re.compile(r"\"([^\"]+)\"|'([^']+)'")
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _features(text):
+    tokens = TOKEN_RE.findall(text.lower())
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over unigram + bigram features"""
+
+    def __init__(self, examples, alpha=0.5):
+        self.alpha = alpha
+        self.label_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.vocabulary = set()
+        for label, text in examples:
+            self.label_counts[label] += 1
+            features = _features(text)
+            self.feature_counts[label].update(features)
+            self.vocabulary.update(features)
+        self.total_examples = sum(self.label_counts.values())
+        self.label_totals = {label: sum(c.values()) for label, c in self.feature_counts.items()}
+
+    def predict(self, text):
+        """Most likely label and its probability"""
+        features = [f for f in _features(text) if f in self.vocabulary]
+        vocab_size = len(self.vocabulary)
+        scores = {}
+        for label, count in self.label_counts.items():
+            score = math.log(count / self.total_examples)
+            denominator = self.label_totals[label] + self.alpha * vocab_size
+            counts = self.feature_counts[label]
+            for feature in features:
+                score += math.log((counts[feature] + self.alpha) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        total = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / total
+
+
+def _find_genre(text, known_genres):
+    for genre in known_genres:
+        genre = (genre or "").strip()
+        if genre and re.search(rf"\b{re.escape(genre.lower())}\b", text):
+            return genre
+    return None
+
+
+def extract_slots(text, known_genres=()):
+    """Pull title, author and genre out of a catalog question"""
+    slots = {"title": None, "author": None, "genre": None}
+    quoted = QUOTED_RE.search(text)
+    if quoted:
+        slots["title"] = (quoted.group(1) or quoted.group(2)).strip()
+        text = text[:quoted.start()] + " " + text[quoted.end():]
+
+    by_author = BY_AUTHOR_RE.search(text)
+    if by_author:
+        slots["author"] = by_author.group(1).strip(" ?!.")
+        text = text[:by_author.start()]
+
+    slots["genre"] = _find_genre(text, known_genres)
+    if slots["genre"]:
+        text = re.sub(rf"\b{re.escape(slots['genre'].lower())}\b", " ", text)
+
+    if not slots["title"]:
+        text = SUMMARY_LEAD_RE.sub("", text)
+        text = re.sub(r"\babout\b", " ", text)
+        residual = FILLER_RE.sub(" ", text)
+        residual = re.sub(r"[^\w\s'-]", " ", residual)
+        residual = re.sub(r"\s+", " ", residual).strip()
+        slots["title"] = residual or None
+    return slots
+
+
+def extract_phrase(text):
+    """What to look for inside the books: a quoted phrase, or the words left over"""
+    quoted = QUOTED_RE.search(text)
+    if quoted:
+        return (quoted.group(1) or quoted.group(2)).strip()
+    residual = FILLER_RE.sub(" ", INSIDE_FRAME_RE.sub(" ", text))
+    residual = re.sub(r"[^\w\s'-]", " ", residual)
+    return re.sub(r"\s+", " ", residual).strip() or None
+
+
+class IntentRouter:
+    """Rules first, then the trained classifier; build once per process"""
+
+    def __init__(self, examples=TRAINING_EXAMPLES):
+        self.classifier = NaiveBayes(examples)
+
+    def route(self, query, known_genres=()):
+        text = re.sub(r"\s+", " ", query.lower().strip())
+        for name, pattern in RULES:
+            if pattern.search(text):
+                return self._finish(name, text, 1.0, "rule", known_genres)
+
+        name, confidence = self.classifier.predict(text)
+        if confidence < MIN_CONFIDENCE:
+            name = SEARCH if len(text.split()) <= BARE_LOOKUP_WORDS else OPEN_ENDED
+        return self._finish(name, text, confidence, "classifier", known_genres)
+
+    def _finish(self, name, text, confidence, source, known_genres):
+        slots = {}
+        if name in (SEARCH, SUMMARY, SIMILAR):
+            slots = extract_slots(text, known_genres)
+            # "tell me about fantasy" is a genre browse, not a book summary
+            if name == SUMMARY and (slots["genre"] or slots["author"]) and not slots["title"]:
+                name = SEARCH
+            if name in (SUMMARY, SIMILAR) and not slots["title"]:
+                name = HELP
+            # "find books in the library" names nothing to look for: list them
+            if name == SEARCH and not any(slots.values()):
+                name, slots = LIST_BOOKS, {}
+        elif name == INSIDE:
+            slots = {"phrase": extract_phrase(text)}
+            if not slots["phrase"]:
+                name = HELP
+        return Intent(name, slots, confidence, source)
@@ -0,0 +1,234 @@
+import sqlite3
+
+# ===== CIRCULATION OPERATIONS =====
+# The catalog and circulation actions shared by the Streamlit app and the
+# HTTP API (api.py). Everything here takes a db.ConnectionPool and raises
+# instead of rendering, so each front end reports errors its own way.
+# Callers that cache reads invalidate the tables listed in WRITES. Every
+# function named there can also be run on a writer.WriteQueue.
+
+REQUEST_STATUSES = ("Pending", "Approved", "Rejected", "Procured")
+
+# Tables written by each operation (loans triggers also update books.available)
+WRITES = {
+    "borrow_book": ("loans", "books"),
+    "return_book": ("loans", "books"),
+    "set_copies": ("books",),
+    "add_book": ("books",),
+    "remove_book": ("books",),
+    "add_user": ("users",),
+    "remove_user": ("users",),
+    "set_password_hash": ("users",),
+    "assign_book": ("assigned_books",),
+    "request_book": ("book_requests",),
+    "update_request": ("book_requests",),
+}
+
+
+class NotFound(LookupError):
+    """A book, user, loan or request that the caller named does not exist"""
+
+
+class Unavailable(RuntimeError):
+    """Every copy of the book is out on loan"""
+
+
+def book_id(pool, title):
+    """Id of the book with this title (case-insensitive)"""
+    book = pool.query_one("SELECT id FROM books WHERE title = ? COLLATE NOCASE", (title,))
+    if book is None:
+        raise NotFound(f"Book '{title}' not found")
+    return book[0]
+
+
+def user_id(pool, username):
+    user = pool.query_one("SELECT id FROM users WHERE username = ?", (username,))
+    if user is None:
+        raise NotFound(f"User '{username}' not found")
+    return user[0]
+
+
+def borrow_book(pool, title, user):
+    """Lend a free copy of `title` to user id `user`; returns (loan id, book id).
+
+    The loan is only inserted while a copy is available, and the write lock
+    is held from the check to the commit, so two borrowers can never get
+    the same last copy.
+    """
+    with pool.transaction(immediate=True) as conn:
+        book = conn.execute("SELECT id FROM books WHERE title = ? COLLATE NOCASE", (title,)).fetchone()
+        if book is None:
+            raise NotFound(f"Book '{title}' not found")
+        # The loans_inventory_insert trigger takes the copy
+        cursor = conn.execute('''
+            INSERT INTO loans (book_id, user_id)
+            SELECT id, ? FROM books WHERE id = ? AND available > 0
+        ''', (user, book[0]))
+        if not cursor.rowcount:
+            raise Unavailable(f"All copies of '{title}' are checked out")
+        return cursor.lastrowid, book[0]
+
+
+def return_book(pool, title, user):
+    """Close the user's oldest open loan of `title`; returns the loan id"""
+    with pool.transaction() as conn:
+        book = conn.execute("SELECT id FROM books WHERE title = ? COLLATE NOCASE", (title,)).fetchone()
+        if book is None:
+            raise NotFound(f"Book '{title}' not found")
+        loans = conn.execute('''
+            UPDATE loans SET returned_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT id FROM loans
+                        WHERE book_id = ? AND user_id = ? AND returned_at IS NULL
+                        ORDER BY borrowed_at LIMIT 1)
+            RETURNING id
+        ''', (book[0], user)).fetchall()
+        if not loans:
+            raise NotFound(f"You have not borrowed '{title}'")
+        return loans[0][0]
+
+
+def set_copies(pool, title, copies):
+    """Change how many copies of a book the library owns"""
+    if copies < 0:
+        raise ValueError("Copies can't be negative")
+    with pool.transaction(immediate=True) as conn:
+        book = conn.execute("SELECT id, copies - available FROM books WHERE title = ? COLLATE NOCASE",
+                            (title,)).fetchone()
+        if book is None:
+            raise NotFound(f"Book '{title}' not found")
+        book_id, on_loan = book
+        if copies < on_loan:
+            raise ValueError(f"{on_loan} copies of '{title}' are on loan")
+        conn.execute("UPDATE books SET copies = ?, available = ? - ? WHERE id = ?",
+                     (copies, copies, on_loan, book_id))
+
+
+def add_book(pool, title, author, genre, price, pdf_link=None, copies=1):
+    """Add a book to the catalog; returns its id"""
+    try:
+        cursor = pool.execute('''
+            INSERT INTO books (title, author, genre, price, pdf_link, copies, available)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (title, author, genre, price, pdf_link, copies, copies))
+    except sqlite3.IntegrityError:
+        raise ValueError(f"A book titled '{title}' already exists")
+    return cursor.lastrowid
+
+
+def remove_book(pool, title):
+    """Delete books by title (case-insensitive); returns the removed ids"""
+    with pool.transaction() as conn:
+        removed = [row[0] for row in conn.execute(
+            "SELECT id FROM books WHERE title = ? COLLATE NOCASE", (title,)).fetchall()]
+        conn.execute("DELETE FROM books WHERE title = ? COLLATE NOCASE", (title,))
+    return removed
+
+
+def add_user(pool, username, email, password_hash, role):
+    """Create an account; returns its id"""
+    try:
+        cursor = pool.execute("INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)",
+                              (username, email, password_hash, role))
+    except sqlite3.IntegrityError:
+        raise ValueError("Username or email already exists")
+    return cursor.lastrowid
+
+
+def remove_user(pool, username):
+    pool.execute("DELETE FROM users WHERE username = ?", (username,))
+
+
+def set_password_hash(pool, user, password_hash):
+    pool.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user))
+
+
+def assign_book(pool, title, username, assigned_by):
+    """Assign a book to a user by name; returns the assignment id"""
+    book = book_id(pool, title)
+    user = user_id(pool, username)
+    cursor = pool.execute("INSERT INTO assigned_books (book_id, user_id, assigned_by) VALUES (?, ?, ?)",
+                          (book, user, assigned_by))
+    return cursor.lastrowid
+
+
+def request_book(pool, title, user):
+    """File a request for a book the library doesn't have; returns its id"""
+    title = title.strip()
+    if not title:
+        raise ValueError("Please enter a book title")
+    cursor = pool.execute("INSERT INTO book_requests (book_title, user_id) VALUES (?, ?)", (title, user))
+    return cursor.lastrowid
+
+
+def update_request(pool, request_id, status):
+    if status not in REQUEST_STATUSES:
+        raise ValueError(f"Unknown status {status!r}")
+    cursor = pool.execute("UPDATE book_requests SET status = ? WHERE id = ?", (status, request_id))
+    if not cursor.rowcount:
+        raise NotFound(f"Request {request_id} not found")
+
+
+def books_status(pool):
+    """All books with availability, by title"""
+    return pool.query('''
+        SELECT b.title, b.author,
+               CASE WHEN b.available > 0 THEN 'Available' ELSE 'Borrowed' END as status
+        FROM books b
+        ORDER BY b.title
+    ''')
+
+
+def returned_books(pool):
+    """(title, username, returned at) for every closed loan"""
+    return pool.query('''
+        SELECT b.title, u.username, l.returned_at
+        FROM loans l
+        JOIN books b ON l.book_id = b.id
+        JOIN users u ON l.user_id = u.id
+        WHERE l.returned_at IS NOT NULL
+    ''')
+
+
+def users(pool):
+    return pool.query("SELECT username, email, role FROM users ORDER BY username")
+
+
+def credentials(pool, username, role):
+    """(id, password hash) of the account used to log in, or None"""
+    return pool.query_one("SELECT id, password_hash FROM users WHERE username = ? AND role = ?",
+                          (username, role))
+
+
+def user_loans(pool, user):
+    """Books currently borrowed by one user, newest first"""
+    return pool.query('''
+        SELECT b.title, l.borrowed_at
+        FROM loans l
+        JOIN books b ON l.book_id = b.id
+        WHERE l.user_id = ? AND l.returned_at IS NULL
+        ORDER BY l.borrowed_at DESC
+    ''', (user,))
+
+
+def user_requests(pool, user):
+    """One user's book requests, newest first"""
+    return pool.query('''
+        SELECT
+            id,
+            book_title,
+            requested_on,
+            status
+        FROM book_requests
+        WHERE user_id = ?
+        ORDER BY requested_on DESC
+    ''', (user,))
+
+
+def all_requests(pool):
+    return pool.query('''
+        SELECT br.id, br.book_title, u.username, br.requested_on, br.status
+        FROM book_requests br
+        JOIN users u ON br.user_id = u.id
+        ORDER BY br.requested_on DESC
+    ''')
+
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import db
+
+# ===== PERSISTENT LLM RESPONSE CACHE =====
+# SHAIGO answers are stored in their own SQLite file (so cache traffic never
+# contends with, or invalidates, the library database), keyed by the
+# normalized prompt plus the model and generation config that produced them.
+
+LLM_CACHE_PATH = os.environ.get(
+    "LMS_LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_cache.db")
+)
+
+DEFAULT_TTL = 7 * 24 * 3600     # seconds
+DEFAULT_MAX_ENTRIES = 5000
+EVICT_EVERY = 50                # check the size bound every N inserts
+
+
+def normalize_prompt(prompt):
+    """Case, whitespace and trailing punctuation don't change the answer"""
+    prompt = re.sub(r"\s+", " ", prompt.strip().lower())
+    return prompt.strip(" ?!.")
+
+
+def make_key(prompt, model, config=None):
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model": model, "config": config or {}},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with TTL and LRU size bound"""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.pool = db.ConnectionPool(path, size=2)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pool.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.pool.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at)")
+
+    def get(self, key):
+        """Cached response for `key`, or None if missing or expired"""
+        now = time.time()
+        row = self.pool.query_one(
+            "SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (key,))
+        if row is None or now - row[1] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+        self.pool.execute(
+            "UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, model, prompt, response):
+        now = time.time()
+        self.pool.execute('''
+            INSERT OR REPLACE INTO llm_cache
+                (cache_key, model, prompt, response, created_at, last_used_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (key, model, normalize_prompt(prompt), response, now, now))
+        with self._lock:
+            self._inserts += 1
+            due = self._inserts % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('''
+                    DELETE FROM llm_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_cache ORDER BY last_used_at LIMIT ?
+                    )
+                ''', (count - self.max_entries,))
+
+    def get_or_generate(self, prompt, model, config, generate, refresh=False):
+        """Return the cached answer to `prompt`, calling `generate()` on a miss.
+
+        `refresh=True` skips the lookup and overwrites the stored answer.
+        Failures raised by `generate` are not cached.
+        """
+        key = make_key(prompt, model, config)
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        response = generate()
+        if response:
+            self.put(key, model, prompt, response)
+        return response
+
+    def stream_or_generate(self, prompt, model, config, stream, refresh=False):
+        """Streaming variant of get_or_generate.
+
+        Yields the cached answer in one piece on a hit; otherwise yields the
+        chunks of `stream()` as they arrive and stores the joined answer
+        once the stream has finished without error.
+        """
+        key = make_key(prompt, model, config)
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        for chunk in stream():
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks)
+        if response:
+            self.put(key, model, prompt, response)
+
+    def clear(self):
+        self.pool.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        entries = self.pool.query_one("SELECT COUNT(*) FROM llm_cache")[0]
+        with self._lock:
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
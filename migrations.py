@@ -0,0 +1,604 @@
+import logging
+import re
+
+# ===== VERSIONED SCHEMA MIGRATIONS =====
+# Each migration is (version, name, steps). A step is either a SQL string or
+# a callable taking the connection. Applied versions are recorded in
+# schema_version so every migration runs exactly once per database.
+
+logger = logging.getLogger(__name__)
+
+# Default loan period used for due_at
+LOAN_DAYS = 14
+
+
+def _merge_duplicate_titles(conn):
+    """Fold books whose titles only differ by case into the oldest copy"""
+    duplicates = conn.execute('''
+        SELECT MIN(id), GROUP_CONCAT(id)
+        FROM books
+        GROUP BY title COLLATE NOCASE
+        HAVING COUNT(*) > 1
+    ''').fetchall()
+    for keep_id, ids in duplicates:
+        extra_ids = [int(book_id) for book_id in ids.split(",") if int(book_id) != keep_id]
+        for book_id in extra_ids:
+            for table in ("borrowed_books", "returned_books", "assigned_books"):
+                conn.execute(f"UPDATE {table} SET book_id = ? WHERE book_id = ?", (keep_id, book_id))
+            conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        logger.warning("Merged duplicate titles %s into book %s", extra_ids, keep_id)
+
+
+def _copy_loans(conn):
+    """Move borrowed_books and returned_books rows into loans, oldest first.
+
+    Returns kept no borrow date (the old return flow deleted it), so those
+    loans come across with borrowed_at NULL.
+    """
+    conn.execute(f'''
+        INSERT INTO loans (book_id, user_id, borrowed_at, due_at, returned_at)
+        SELECT book_id, user_id, borrowed_at, due_at, returned_at FROM (
+            SELECT book_id, user_id, borrowed_date AS borrowed_at,
+                   datetime(borrowed_date, '+{LOAN_DAYS} days') AS due_at,
+                   NULL AS returned_at, borrowed_date AS happened_at
+            FROM borrowed_books
+            UNION ALL
+            SELECT book_id, user_id, NULL, NULL, returned_date, returned_date
+            FROM returned_books
+        )
+        WHERE book_id IS NOT NULL AND user_id IS NOT NULL
+        ORDER BY happened_at
+    ''')
+
+
+# Store links as pdf_store.link() used to write them, host and all
+_ABSOLUTE_STORE_LINK = re.compile(r"^https?://.+?(/pdfs/[0-9a-f]{64})$")
+
+
+def _relative_store_links(conn):
+    """Strip the host from store links, so moving the API doesn't break them"""
+    rows = conn.execute("SELECT id, pdf_link FROM books WHERE pdf_link LIKE 'http%/pdfs/%'").fetchall()
+    for book_id, pdf_link in rows:
+        match = _ABSOLUTE_STORE_LINK.match(pdf_link)
+        if match:
+            conn.execute("UPDATE books SET pdf_link = ? WHERE id = ?", (match.group(1), book_id))
+
+
+def _count_copies(conn):
+    """One copy per book, or as many as it has open loans already"""
+    conn.execute('''
+        WITH open_loans AS (
+            SELECT book_id, COUNT(*) AS n FROM loans WHERE returned_at IS NULL GROUP BY book_id
+        )
+        UPDATE books SET copies = MAX(1, o.n), available = MAX(1, o.n) - o.n
+        FROM open_loans o WHERE o.book_id = books.id
+    ''')
+
+
+MIGRATIONS = [
+    (1, "baseline schema", [
+        # Users table for admins and users
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            email TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT CHECK(role IN ('admin', 'user'))
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            author TEXT,
+            genre TEXT,
+            price REAL,
+            pdf_link TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS assigned_books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            user_id INTEGER,
+            assigned_by INTEGER,
+            assigned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(assigned_by) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS borrowed_books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            user_id INTEGER,
+            borrowed_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS returned_books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            user_id INTEGER,
+            returned_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS book_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_title TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            requested_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'Pending',
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        ''',
+    ]),
+    (2, "loan, request and title lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_borrowed_books_book_user ON borrowed_books(book_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_returned_books_book_user ON returned_books(book_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_assigned_books_user ON assigned_books(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_book_requests_user_requested ON book_requests(user_id, requested_on)",
+        "CREATE INDEX IF NOT EXISTS idx_books_title ON books(title)",
+    ]),
+    (3, "case-insensitive unique book titles", [
+        _merge_duplicate_titles,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_books_title_nocase ON books(title COLLATE NOCASE)",
+    ]),
+    (4, "full-text catalog search", [
+        # External-content FTS5 index over books, kept in sync by triggers
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, genre,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, genre)
+            VALUES (new.id, new.title, new.author, new.genre);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author, genre ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+            INSERT INTO books_fts(rowid, title, author, genre)
+            VALUES (new.id, new.title, new.author, new.genre);
+        END
+        ''',
+        "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+    ]),
+    (5, "unified loans ledger", [
+        # One row per loan; returning a book sets returned_at instead of
+        # moving the row, so the borrow date survives the return
+        f'''
+        CREATE TABLE IF NOT EXISTS loans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            borrowed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            due_at TIMESTAMP DEFAULT (datetime('now', '+{LOAN_DAYS} days')),
+            returned_at TIMESTAMP,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        ''',
+        _copy_loans,
+        "DROP TABLE borrowed_books",
+        "DROP TABLE returned_books",
+        # Open loans are a small slice of the ledger; partial indexes keep
+        # availability, "my books" and the borrowed report off the history
+        "CREATE INDEX IF NOT EXISTS idx_loans_open_book ON loans(book_id, user_id) WHERE returned_at IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_loans_open_user ON loans(user_id, borrowed_at) WHERE returned_at IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_loans_open_borrowed ON loans(borrowed_at) WHERE returned_at IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_loans_returned ON loans(returned_at) WHERE returned_at IS NOT NULL",
+        # Compatibility views with the old table shapes, writable through
+        # INSTEAD OF triggers so older code paths keep working
+        '''
+        CREATE VIEW IF NOT EXISTS borrowed_books AS
+        SELECT id, book_id, user_id, borrowed_at AS borrowed_date
+        FROM loans WHERE returned_at IS NULL
+        ''',
+        '''
+        CREATE VIEW IF NOT EXISTS returned_books AS
+        SELECT id, book_id, user_id, returned_at AS returned_date
+        FROM loans WHERE returned_at IS NOT NULL
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS borrowed_books_insert INSTEAD OF INSERT ON borrowed_books BEGIN
+            INSERT INTO loans (book_id, user_id, borrowed_at)
+            VALUES (new.book_id, new.user_id, COALESCE(new.borrowed_date, CURRENT_TIMESTAMP));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS borrowed_books_delete INSTEAD OF DELETE ON borrowed_books BEGIN
+            UPDATE loans SET returned_at = CURRENT_TIMESTAMP WHERE id = old.id;
+        END
+        ''',
+        # Inserting a return closes the oldest matching open loan (or, with
+        # no open loan, records a closed one)
+        '''
+        CREATE TRIGGER IF NOT EXISTS returned_books_insert INSTEAD OF INSERT ON returned_books BEGIN
+            UPDATE loans SET returned_at = COALESCE(new.returned_date, CURRENT_TIMESTAMP)
+            WHERE id = (SELECT id FROM loans
+                        WHERE book_id = new.book_id AND user_id = new.user_id
+                          AND returned_at IS NULL
+                        ORDER BY borrowed_at LIMIT 1);
+            INSERT INTO loans (book_id, user_id, borrowed_at, due_at, returned_at)
+            SELECT new.book_id, new.user_id, NULL, NULL, COALESCE(new.returned_date, CURRENT_TIMESTAMP)
+            WHERE changes() = 0;
+        END
+        ''',
+    ]),
+    (6, "trigger-maintained circulation statistics", [
+        # Running aggregates over loans, read by stats.py (stats.rebuild repairs them)
+        '''
+        CREATE TABLE IF NOT EXISTS circulation_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_loans INTEGER NOT NULL DEFAULT 0,
+            open_loans INTEGER NOT NULL DEFAULT 0,
+            open_dated INTEGER NOT NULL DEFAULT 0,
+            open_borrowed_jd REAL NOT NULL DEFAULT 0,
+            returned_loans INTEGER NOT NULL DEFAULT 0,
+            returned_dated INTEGER NOT NULL DEFAULT 0,
+            returned_days REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS circulation_book_stats (
+            book_id INTEGER PRIMARY KEY,
+            loans INTEGER NOT NULL DEFAULT 0,
+            open_loans INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS circulation_user_stats (
+            user_id INTEGER PRIMARY KEY,
+            loans INTEGER NOT NULL DEFAULT 0,
+            open_loans INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS circulation_daily (
+            day TEXT PRIMARY KEY,
+            borrowed INTEGER NOT NULL DEFAULT 0,
+            returned INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_circulation_book_stats_loans ON circulation_book_stats(loans)",
+        # Every loan adds +1 to each aggregate when inserted and -1 when deleted;
+        # an update takes the old row's contribution out and puts the new one's in
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_stats_insert AFTER INSERT ON loans BEGIN
+            UPDATE circulation_totals SET
+                total_loans = total_loans + 1,
+                open_loans = open_loans + CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END,
+                open_dated = open_dated + CASE WHEN new.returned_at IS NULL AND new.borrowed_at IS NOT NULL THEN 1 ELSE 0 END,
+                open_borrowed_jd = open_borrowed_jd
+                    + CASE WHEN new.returned_at IS NULL AND new.borrowed_at IS NOT NULL THEN julianday(new.borrowed_at) ELSE 0 END,
+                returned_loans = returned_loans + CASE WHEN new.returned_at IS NOT NULL THEN 1 ELSE 0 END,
+                returned_dated = returned_dated + CASE WHEN new.returned_at IS NOT NULL AND new.borrowed_at IS NOT NULL THEN 1 ELSE 0 END,
+                returned_days = returned_days
+                    + CASE WHEN new.returned_at IS NOT NULL AND new.borrowed_at IS NOT NULL
+                           THEN (julianday(new.returned_at) - julianday(new.borrowed_at))
+                           ELSE 0 END
+            WHERE id = 1;
+            INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+            VALUES (new.book_id, 1, CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END)
+            ON CONFLICT(book_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+            VALUES (new.user_id, 1, CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END)
+            ON CONFLICT(user_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_daily (day, borrowed)
+            SELECT date(new.borrowed_at), 1 WHERE new.borrowed_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET borrowed = borrowed + excluded.borrowed;
+            INSERT INTO circulation_daily (day, returned)
+            SELECT date(new.returned_at), 1 WHERE new.returned_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET returned = returned + excluded.returned;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_stats_delete AFTER DELETE ON loans BEGIN
+            UPDATE circulation_totals SET
+                total_loans = total_loans - 1,
+                open_loans = open_loans + CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END,
+                open_dated = open_dated + CASE WHEN old.returned_at IS NULL AND old.borrowed_at IS NOT NULL THEN -1 ELSE 0 END,
+                open_borrowed_jd = open_borrowed_jd
+                    + CASE WHEN old.returned_at IS NULL AND old.borrowed_at IS NOT NULL THEN -julianday(old.borrowed_at) ELSE 0 END,
+                returned_loans = returned_loans + CASE WHEN old.returned_at IS NOT NULL THEN -1 ELSE 0 END,
+                returned_dated = returned_dated + CASE WHEN old.returned_at IS NOT NULL AND old.borrowed_at IS NOT NULL THEN -1 ELSE 0 END,
+                returned_days = returned_days
+                    + CASE WHEN old.returned_at IS NOT NULL AND old.borrowed_at IS NOT NULL
+                           THEN -(julianday(old.returned_at) - julianday(old.borrowed_at))
+                           ELSE 0 END
+            WHERE id = 1;
+            INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+            VALUES (old.book_id, -1, CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END)
+            ON CONFLICT(book_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+            VALUES (old.user_id, -1, CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END)
+            ON CONFLICT(user_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_daily (day, borrowed)
+            SELECT date(old.borrowed_at), -1 WHERE old.borrowed_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET borrowed = borrowed + excluded.borrowed;
+            INSERT INTO circulation_daily (day, returned)
+            SELECT date(old.returned_at), -1 WHERE old.returned_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET returned = returned + excluded.returned;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_stats_update
+        AFTER UPDATE OF book_id, user_id, borrowed_at, returned_at ON loans BEGIN
+            UPDATE circulation_totals SET
+                total_loans = total_loans - 1,
+                open_loans = open_loans + CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END,
+                open_dated = open_dated + CASE WHEN old.returned_at IS NULL AND old.borrowed_at IS NOT NULL THEN -1 ELSE 0 END,
+                open_borrowed_jd = open_borrowed_jd
+                    + CASE WHEN old.returned_at IS NULL AND old.borrowed_at IS NOT NULL THEN -julianday(old.borrowed_at) ELSE 0 END,
+                returned_loans = returned_loans + CASE WHEN old.returned_at IS NOT NULL THEN -1 ELSE 0 END,
+                returned_dated = returned_dated + CASE WHEN old.returned_at IS NOT NULL AND old.borrowed_at IS NOT NULL THEN -1 ELSE 0 END,
+                returned_days = returned_days
+                    + CASE WHEN old.returned_at IS NOT NULL AND old.borrowed_at IS NOT NULL
+                           THEN -(julianday(old.returned_at) - julianday(old.borrowed_at))
+                           ELSE 0 END
+            WHERE id = 1;
+            INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+            VALUES (old.book_id, -1, CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END)
+            ON CONFLICT(book_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+            VALUES (old.user_id, -1, CASE WHEN old.returned_at IS NULL THEN -1 ELSE 0 END)
+            ON CONFLICT(user_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_daily (day, borrowed)
+            SELECT date(old.borrowed_at), -1 WHERE old.borrowed_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET borrowed = borrowed + excluded.borrowed;
+            INSERT INTO circulation_daily (day, returned)
+            SELECT date(old.returned_at), -1 WHERE old.returned_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET returned = returned + excluded.returned;
+            UPDATE circulation_totals SET
+                total_loans = total_loans + 1,
+                open_loans = open_loans + CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END,
+                open_dated = open_dated + CASE WHEN new.returned_at IS NULL AND new.borrowed_at IS NOT NULL THEN 1 ELSE 0 END,
+                open_borrowed_jd = open_borrowed_jd
+                    + CASE WHEN new.returned_at IS NULL AND new.borrowed_at IS NOT NULL THEN julianday(new.borrowed_at) ELSE 0 END,
+                returned_loans = returned_loans + CASE WHEN new.returned_at IS NOT NULL THEN 1 ELSE 0 END,
+                returned_dated = returned_dated + CASE WHEN new.returned_at IS NOT NULL AND new.borrowed_at IS NOT NULL THEN 1 ELSE 0 END,
+                returned_days = returned_days
+                    + CASE WHEN new.returned_at IS NOT NULL AND new.borrowed_at IS NOT NULL
+                           THEN (julianday(new.returned_at) - julianday(new.borrowed_at))
+                           ELSE 0 END
+            WHERE id = 1;
+            INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+            VALUES (new.book_id, 1, CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END)
+            ON CONFLICT(book_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+            VALUES (new.user_id, 1, CASE WHEN new.returned_at IS NULL THEN 1 ELSE 0 END)
+            ON CONFLICT(user_id) DO UPDATE SET
+                loans = loans + excluded.loans, open_loans = open_loans + excluded.open_loans;
+            INSERT INTO circulation_daily (day, borrowed)
+            SELECT date(new.borrowed_at), 1 WHERE new.borrowed_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET borrowed = borrowed + excluded.borrowed;
+            INSERT INTO circulation_daily (day, returned)
+            SELECT date(new.returned_at), 1 WHERE new.returned_at IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET returned = returned + excluded.returned;
+        END
+        ''',
+        # Backfill from the loans already recorded (the same queries as stats.rebuild)
+        '''
+        INSERT INTO circulation_totals (id, total_loans, open_loans, open_dated, open_borrowed_jd,
+                                        returned_loans, returned_dated, returned_days)
+        SELECT 1,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE returned_at IS NULL),
+               COUNT(borrowed_at) FILTER (WHERE returned_at IS NULL),
+               COALESCE(SUM(julianday(borrowed_at)) FILTER (WHERE returned_at IS NULL), 0),
+               COUNT(returned_at),
+               COUNT(borrowed_at) FILTER (WHERE returned_at IS NOT NULL),
+               COALESCE(SUM(julianday(returned_at) - julianday(borrowed_at)), 0)
+        FROM loans
+        ''',
+        '''
+        INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+        SELECT book_id, COUNT(*), COUNT(*) FILTER (WHERE returned_at IS NULL)
+        FROM loans GROUP BY book_id
+        ''',
+        '''
+        INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+        SELECT user_id, COUNT(*), COUNT(*) FILTER (WHERE returned_at IS NULL)
+        FROM loans GROUP BY user_id
+        ''',
+        '''
+        INSERT INTO circulation_daily (day, borrowed, returned)
+        SELECT day, SUM(borrowed), SUM(returned) FROM (
+            SELECT date(borrowed_at) AS day, 1 AS borrowed, 0 AS returned
+            FROM loans WHERE borrowed_at IS NOT NULL
+            UNION ALL
+            SELECT date(returned_at), 0, 1 FROM loans WHERE returned_at IS NOT NULL
+        )
+        GROUP BY day
+        ''',
+    ]),
+    (7, "bulk import jobs", [
+        # One row per imported file; records_done is the resume checkpoint
+        '''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            fingerprint TEXT NOT NULL,
+            format TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running' CHECK(status IN ('running', 'failed', 'done')),
+            records_done INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_import_jobs_fingerprint ON import_jobs(fingerprint, status)",
+    ]),
+    (8, "copies inventory", [
+        # available = copies - open loans, kept current by the triggers
+        # below; the CHECK stops any path from lending a copy that isn't there
+        "ALTER TABLE books ADD COLUMN copies INTEGER NOT NULL DEFAULT 1 CHECK (copies >= 0)",
+        "ALTER TABLE books ADD COLUMN available INTEGER NOT NULL DEFAULT 1 CHECK (available >= 0)",
+        _count_copies,
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_inventory_insert AFTER INSERT ON loans
+        WHEN new.returned_at IS NULL BEGIN
+            UPDATE books SET available = available - 1 WHERE id = new.book_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_inventory_delete AFTER DELETE ON loans
+        WHEN old.returned_at IS NULL BEGIN
+            UPDATE books SET available = available + 1 WHERE id = old.book_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loans_inventory_update AFTER UPDATE OF book_id, returned_at ON loans BEGIN
+            UPDATE books SET available = available + 1 WHERE id = old.book_id AND old.returned_at IS NULL;
+            UPDATE books SET available = available - 1 WHERE id = new.book_id AND new.returned_at IS NULL;
+        END
+        ''',
+    ]),
+    (9, "full text of book PDFs", [
+        # One row per book with a link, kept by the triggers below; text is
+        # stored once per file (by SHA-256) with its page numbers
+        '''
+        CREATE TABLE IF NOT EXISTS book_pdfs (
+            book_id INTEGER PRIMARY KEY,
+            pdf_link TEXT NOT NULL,
+            sha256 TEXT,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'done', 'failed')),
+            error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_book_pdfs_status ON book_pdfs(status)",
+        "CREATE INDEX IF NOT EXISTS idx_book_pdfs_sha256 ON book_pdfs(sha256)",
+        '''
+        CREATE TABLE IF NOT EXISTS pdf_documents (
+            sha256 TEXT PRIMARY KEY,
+            pages INTEGER NOT NULL,
+            text_pages INTEGER NOT NULL,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages USING fts5(
+            text,
+            sha256 UNINDEXED,
+            page UNINDEXED,
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        # A new or changed link queues the book again; removed books drop out
+        '''
+        CREATE TRIGGER IF NOT EXISTS book_pdfs_insert AFTER INSERT ON books
+        WHEN COALESCE(new.pdf_link, '') != '' BEGIN
+            INSERT OR REPLACE INTO book_pdfs (book_id, pdf_link) VALUES (new.id, new.pdf_link);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS book_pdfs_update AFTER UPDATE OF pdf_link ON books
+        WHEN new.pdf_link IS NOT old.pdf_link BEGIN
+            DELETE FROM book_pdfs WHERE book_id = new.id;
+            INSERT INTO book_pdfs (book_id, pdf_link)
+            SELECT new.id, new.pdf_link WHERE COALESCE(new.pdf_link, '') != '';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS book_pdfs_delete AFTER DELETE ON books BEGIN
+            DELETE FROM book_pdfs WHERE book_id = old.id;
+        END
+        ''',
+        # Queue every book that already has a link
+        '''
+        INSERT OR IGNORE INTO book_pdfs (book_id, pdf_link)
+        SELECT id, pdf_link FROM books WHERE COALESCE(pdf_link, '') != ''
+        ''',
+    ]),
+    (10, "keyset paging sort indexes", [
+        # One per paging.VIEWS sort key, on the same expression, so every
+        # page is an index seek instead of a scan and sort of the whole view
+        # (the rowid rides along in each index as the tie-breaker)
+        "CREATE INDEX IF NOT EXISTS idx_books_sort_title ON books(COALESCE(title, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_books_sort_author ON books(COALESCE(author, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_books_sort_genre ON books(COALESCE(genre, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_books_sort_price ON books(COALESCE(price, 0))",
+        "CREATE INDEX IF NOT EXISTS idx_users_sort_username ON users(COALESCE(username, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_users_sort_email ON users(COALESCE(email, ''))",
+        "CREATE INDEX IF NOT EXISTS idx_assigned_books_sort_date ON assigned_books(COALESCE(assigned_date, ''))",
+        '''
+        CREATE INDEX IF NOT EXISTS idx_loans_open_sort_borrowed ON loans(COALESCE(borrowed_at, ''))
+        WHERE returned_at IS NULL
+        ''',
+    ]),
+    (11, "host-independent PDF links", [
+        # The book_pdfs trigger queues these books again; their files are
+        # already indexed, so pdf_text just marks them done
+        _relative_store_links,
+    ]),
+]
+
+
+def current_version(conn):
+    """Highest migration version applied to this database"""
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    for version, name, steps in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+        # BEGIN IMMEDIATE takes the write lock, so when several processes
+        # start together only one applies the migration; the rest re-check.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+            conn.commit()
+            logger.info("Applied migration %s: %s", version, name)
+        except Exception:
+            conn.rollback()
+            raise
@@ -0,0 +1,160 @@
+from collections import namedtuple
+
+# ===== KEYSET PAGINATION =====
+# Pages are fetched by seeking past the last (sort key, id) seen instead of
+# using OFFSET, so page N costs the same as page 1 however big the table is.
+
+DEFAULT_PAGE_SIZE = 25
+PAGE_SIZES = (25, 50, 100)
+
+Page = namedtuple("Page", ["rows", "next_cursor", "has_more"])
+
+# A browsable view: its SELECT list and FROM clause, its unique id column,
+# the columns it can be sorted by and filtered on (name -> SQL expression),
+# the tables it reads (used to invalidate cached pages) and an optional
+# fixed WHERE condition
+View = namedtuple("View", ["columns", "source", "id_column", "sort_columns", "filter_columns", "tables",
+                           "condition"], defaults=(None,))
+
+VIEWS = {
+    "books": View(
+        columns="b.id, b.title, b.author, b.genre, b.price, b.pdf_link, "
+                "CASE WHEN b.available > 0 THEN 'Available' ELSE 'Checked Out' END, "
+                "b.available, b.copies",
+        source="books b",
+        id_column="b.id",
+        sort_columns={
+            "id": "b.id",
+            "title": "COALESCE(b.title, '')",
+            "author": "COALESCE(b.author, '')",
+            "genre": "COALESCE(b.genre, '')",
+            "price": "COALESCE(b.price, 0)",
+        },
+        filter_columns={
+            "author": "b.author",
+            "genre": "b.genre",
+        },
+        tables=("books",),
+    ),
+    "users": View(
+        columns="u.id, u.username, u.email, u.role",
+        source="users u",
+        id_column="u.id",
+        sort_columns={
+            "id": "u.id",
+            "username": "COALESCE(u.username, '')",
+            "email": "COALESCE(u.email, '')",
+        },
+        filter_columns={
+            "role": "u.role",
+        },
+        tables=("users",),
+    ),
+    "assignments": View(
+        columns="b.title, u.username, a.assigned_date",
+        source='''
+            assigned_books a
+            JOIN books b ON a.book_id = b.id
+            JOIN users u ON a.user_id = u.id
+        ''',
+        id_column="a.id",
+        sort_columns={
+            "id": "a.id",
+            "assigned_date": "COALESCE(a.assigned_date, '')",
+        },
+        filter_columns={
+            "username": "u.username",
+            "title": "b.title",
+        },
+        tables=("assigned_books", "books", "users"),
+    ),
+    "borrowed": View(
+        columns="b.title, u.username, l.borrowed_at, "
+                "(julianday('now') - julianday(l.borrowed_at))",
+        # CROSS JOIN keeps loans as the outer loop, walking the sort index;
+        # left to itself the planner starts from users and sorts every open loan
+        source='''
+            loans l
+            CROSS JOIN books b ON l.book_id = b.id
+            CROSS JOIN users u ON l.user_id = u.id
+        ''',
+        id_column="l.id",
+        sort_columns={
+            "id": "l.id",
+            "borrowed_date": "COALESCE(l.borrowed_at, '')",
+        },
+        filter_columns={
+            "username": "u.username",
+            "title": "b.title",
+        },
+        tables=("loans", "books", "users"),
+        condition="l.returned_at IS NULL",
+    ),
+    "returned": View(
+        columns="b.title, u.username, l.returned_at, l.borrowed_at, "
+                "(julianday(l.returned_at) - julianday(l.borrowed_at))",
+        source='''
+            loans l
+            JOIN books b ON l.book_id = b.id
+            JOIN users u ON l.user_id = u.id
+        ''',
+        id_column="l.id",
+        sort_columns={
+            "id": "l.id",
+            "returned_date": "l.returned_at",
+        },
+        filter_columns={
+            "username": "u.username",
+            "title": "b.title",
+        },
+        tables=("loans", "books", "users"),
+        condition="l.returned_at IS NOT NULL",
+    ),
+}
+
+
+def fetch_page(pool, view_name, cursor=None, page_size=DEFAULT_PAGE_SIZE,
+               sort="id", descending=False, filters=None):
+    """Fetch one page of a view.
+
+    `cursor` is the `next_cursor` of the previous page (None for the first
+    page). `filters` maps filter names to values; values are matched
+    case-insensitively and empty values are ignored.
+    """
+    view = VIEWS[view_name]
+    if sort not in view.sort_columns:
+        raise ValueError(f"Cannot sort {view_name} by {sort!r}")
+    sort_expr = view.sort_columns[sort]
+
+    where = [view.condition] if view.condition else []
+    params = []
+    for name, value in (filters or {}).items():
+        if value in (None, ""):
+            continue
+        if name not in view.filter_columns:
+            raise ValueError(f"Cannot filter {view_name} by {name!r}")
+        where.append(f"{view.filter_columns[name]} = ? COLLATE NOCASE")
+        params.append(value)
+
+    order = "DESC" if descending else "ASC"
+    if cursor is not None:
+        # The plain bound lets SQLite range-seek the sort index; the row value
+        # comparison then skips the ties already shown
+        where.append(f"{sort_expr} {'<=' if descending else '>='} ? AND "
+                     f"({sort_expr}, {view.id_column}) {'<' if descending else '>'} (?, ?)")
+        params.extend((cursor[0], *cursor))
+    params.append(page_size + 1)
+
+    # The sort key and id ride along at the end of each row for seeking
+    rows = pool.query(f'''
+        SELECT {view.columns}, {sort_expr}, {view.id_column}
+        FROM {view.source}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {sort_expr} {order}, {view.id_column} {order}
+        LIMIT ?
+    ''', params)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1][-2], rows[-1][-1]) if has_more else None
+    return Page([row[:-2] for row in rows], next_cursor, has_more)
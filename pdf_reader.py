@@ -0,0 +1,188 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import pypdfium2
+
+import pdf_store
+
+# ===== PAGE-LEVEL PDF READER =====
+# The Learning Den reader shows a book a few pages at a time. Only the pages
+# asked for are rendered: pdfium reads the file lazily, so page 850 of a
+# 900-page textbook costs about the same as page 1. Rendered pages are WebP
+# files in data/page_cache/, kept under a size bound by evicting the least
+# recently used ones. After every request the next PREFETCH_PAGES are
+# rendered on a background thread, so turning the page is usually a cache
+# hit. pdfium is not thread-safe, so every call into it holds one lock.
+
+CACHE_DIR = os.environ.get(
+    "LMS_PAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "page_cache")
+)
+CACHE_MAX_BYTES = int(os.environ.get("LMS_PAGE_CACHE_MB", "512")) * 1024 * 1024
+CACHE_LOW_WATER = 0.9       # eviction frees space down to this share of the bound
+
+PAGE_WIDTH = 1000           # pixels
+WEBP_QUALITY = 80
+PAGES_PER_VIEW = 2
+PREFETCH_PAGES = 4
+OPEN_DOCUMENTS = 8          # pdfium documents kept open between requests
+
+
+def readable_book(pool, title):
+    """(title, sha256) of the stored PDF for a book title, or None"""
+    book = pool.query_one('''
+        SELECT b.title, b.pdf_link, bp.sha256
+        FROM books b
+        LEFT JOIN book_pdfs bp ON bp.book_id = b.id
+        WHERE b.title = ? COLLATE NOCASE
+    ''', (title,))
+    if book is None:
+        return None
+    # Linked files are in the store once pdf_text has fetched them
+    digest = book[2] or pdf_store.digest_from_link(book[1])
+    return (book[0], digest) if digest else None
+
+
+class PageRenderer:
+    """Renders PDF pages from a PdfStore to cached WebP files"""
+
+    def __init__(self, store, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 width=PAGE_WIDTH, prefetch=PREFETCH_PAGES):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.width = width
+        self.prefetch = prefetch
+        self._pdfium_lock = threading.Lock()
+        self._documents = OrderedDict()     # sha256 -> open PdfDocument
+        self._cache_lock = threading.Lock()
+        self._cache_bytes = None            # counted on first write
+        self._queued = set()
+        self._prefetch_queue = queue.SimpleQueue()
+        self.hits = 0
+        self.misses = 0
+        threading.Thread(target=self._prefetch_loop, name="pdf-prefetch", daemon=True).start()
+
+    def _document(self, digest):
+        """Open (or reuse) a document; the caller holds the pdfium lock"""
+        document = self._documents.get(digest)
+        if document is None:
+            if not self.store.exists(digest):
+                raise FileNotFoundError(f"PDF {digest} is not in the store")
+            document = self._documents[digest] = pypdfium2.PdfDocument(self.store.path(digest))
+            while len(self._documents) > OPEN_DOCUMENTS:
+                self._documents.popitem(last=False)[1].close()
+        self._documents.move_to_end(digest)
+        return document
+
+    def page_count(self, digest):
+        with self._pdfium_lock:
+            return len(self._document(digest))
+
+    def _cache_path(self, digest, number):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{number}-{self.width}.webp")
+
+    def page(self, digest, number):
+        """Path of the rendered image of page `number` (1-based)"""
+        path = self._cache_path(digest, number)
+        try:
+            os.utime(path)      # mark as recently used
+            self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+        self.misses += 1
+        self._render(digest, number, path)
+        return path
+
+    def pages(self, digest, first, count=PAGES_PER_VIEW):
+        """[(page number, image path), ...] for `count` pages from `first`,
+        then prefetch the pages after them"""
+        last = min(first + count - 1, self.page_count(digest))
+        rendered = [(number, self.page(digest, number)) for number in range(max(first, 1), last + 1)]
+        for number in range(last + 1, last + 1 + self.prefetch):
+            self._schedule(digest, number)
+        return rendered
+
+    def _render(self, digest, number, path):
+        with self._pdfium_lock:
+            if os.path.exists(path):
+                return      # the prefetcher got there first
+            document = self._document(digest)
+            if not 1 <= number <= len(document):
+                raise ValueError(f"Page {number} is out of range (1-{len(document)})")
+            page = document[number - 1]
+            try:
+                image = page.render(scale=self.width / page.get_width()).to_pil()
+            finally:
+                page.close()
+        # Encode outside the lock; write under a temporary name so readers
+        # never see half a file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        image.save(partial, "WEBP", quality=WEBP_QUALITY, method=2)
+        os.replace(partial, path)
+        self._added(os.path.getsize(path))
+
+    # ----- prefetching -----
+
+    def _schedule(self, digest, number):
+        key = (digest, number)
+        with self._cache_lock:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        self._prefetch_queue.put(key)
+
+    def _prefetch_loop(self):
+        while True:
+            digest, number = self._prefetch_queue.get()
+            path = self._cache_path(digest, number)
+            try:
+                if not os.path.exists(path) and number <= self.page_count(digest):
+                    self._render(digest, number, path)
+            except Exception:
+                pass    # the reader will render (and report) it if it's really needed
+            finally:
+                with self._cache_lock:
+                    self._queued.discard((digest, number))
+
+    # ----- LRU size bound -----
+
+    def _cached_files(self):
+        for entry in os.scandir(self.cache_dir) if os.path.isdir(self.cache_dir) else ():
+            if entry.is_dir():
+                for file in os.scandir(entry.path):
+                    if file.name.endswith(".webp"):
+                        yield file
+
+    def _added(self, size):
+        with self._cache_lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(file.stat().st_size for file in self._cached_files())
+            else:
+                self._cache_bytes += size
+            if self._cache_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used pages until under the low-water mark"""
+        files = sorted(((file.stat().st_mtime, file.stat().st_size, file.path) for file in self._cached_files()))
+        self._cache_bytes = sum(size for _, size, _ in files)
+        target = self.max_bytes * CACHE_LOW_WATER
+        for _, size, path in files:
+            if self._cache_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._cache_bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cache_bytes": self._cache_bytes}
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import tempfile
+
+# ===== MANAGED PDF STORAGE =====
+# Uploaded book PDFs live under data/pdfs/, named by the SHA-256 of their
+# contents (data/pdfs/ab/ab12....pdf), so uploading the same file twice
+# stores it once and a file never changes under its name. Uploads are
+# streamed to disk a chunk at a time and hashed on the way, then moved into
+# place. api.py serves the files at /pdfs/<sha256> with Range support and
+# immutable caching headers. books.pdf_link keeps only that path, so rows
+# don't depend on the host; url() prefixes PDF_BASE_URL (where browsers
+# reach api.py) when a link is shown.
+
+PDF_DIR = os.environ.get(
+    "LMS_PDF_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pdfs")
+)
+PDF_BASE_URL = os.environ.get("LMS_PDF_BASE_URL", "http://localhost:8000").rstrip("/")
+
+CHUNK_SIZE = 1024 * 1024
+MAX_PDF_BYTES = int(os.environ.get("LMS_MAX_PDF_MB", "500")) * 1024 * 1024
+HEADER_WINDOW = 1024        # "%PDF-" must appear in the first KB
+
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+_LINK_RE = re.compile(r"/([0-9a-f]{64})(?:\.pdf)?/?$")
+
+
+class PdfTooLarge(ValueError):
+    """The upload is bigger than MAX_PDF_BYTES"""
+
+
+def link(digest):
+    """The pdf_link for a stored file"""
+    return f"/pdfs/{digest}"
+
+
+def url(pdf_link):
+    """Where a browser opens a pdf_link: store links go through PDF_BASE_URL"""
+    if pdf_link and pdf_link.startswith("/"):
+        return f"{PDF_BASE_URL}{pdf_link}"
+    return pdf_link
+
+
+def digest_from_link(pdf_link):
+    """The SHA-256 a store link points at, or None for external links"""
+    match = _LINK_RE.search(pdf_link or "")
+    return match.group(1) if match else None
+
+
+class Upload:
+    """A PDF being streamed into the store; use as a context manager"""
+
+    def __init__(self, store):
+        self._store = store
+        os.makedirs(store.root, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.root, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self.size = 0
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self._store.max_bytes:
+            raise PdfTooLarge(f"PDF is larger than {self._store.max_bytes // (1024 * 1024)} MB")
+        if len(self._head) < HEADER_WINDOW:
+            self._head += chunk[:HEADER_WINDOW - len(self._head)]
+            if len(self._head) == HEADER_WINDOW and b"%PDF-" not in self._head:
+                raise ValueError("Not a PDF file")   # don't download the rest of a web page
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self):
+        """Move the file into place (unless it's already stored); returns its digest"""
+        if b"%PDF-" not in self._head:
+            raise ValueError("Not a PDF file")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self._store.path(digest)
+        if os.path.exists(path):
+            os.remove(self._tmp_path)      # same contents already stored
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+        return digest
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+
+class PdfStore:
+    """Content-addressed directory of PDF files"""
+
+    def __init__(self, root=PDF_DIR, max_bytes=MAX_PDF_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, digest):
+        """Where the file with this SHA-256 lives (whether or not it exists)"""
+        if not _DIGEST_RE.fullmatch(digest or ""):
+            raise ValueError(f"Invalid PDF id {digest!r}")
+        return os.path.join(self.root, digest[:2], f"{digest}.pdf")
+
+    def exists(self, digest):
+        try:
+            return os.path.exists(self.path(digest))
+        except ValueError:
+            return False
+
+    def upload(self):
+        return Upload(self)
+
+    def save_file(self, fileobj, chunk_size=CHUNK_SIZE):
+        """Stream a file object into the store; returns the digest"""
+        with self.upload() as upload:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                upload.write(chunk)
+            return upload.finish()
@@ -0,0 +1,209 @@
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+import pdf_store
+
+# ===== FULL TEXT OF BOOK PDFS =====
+# Every book with a pdf_link has a row in book_pdfs, kept by triggers on
+# books (see migration 9). A background Extractor picks up pending rows,
+# brings linked files into pdf_store (so each file is fetched once and
+# shared by content hash), extracts the text page by page on a pool of
+# worker processes and indexes it in pdf_pages (FTS5) with page numbers.
+# Text is stored once per file, however many books point at it.
+# search.search_inside() queries the index.
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get("LMS_PDF_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+POLL_INTERVAL = 60          # seconds between checks for work nobody woke us for
+CLAIM_BATCH = 8             # books resolved per round
+DOWNLOAD_TIMEOUT = 30       # seconds
+MAX_PAGE_CHARS = 20000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def extract_pages(path):
+    """(page count, [(page number, text), ...]) for one PDF; runs in a worker process"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""   # one unreadable page shouldn't lose the whole book
+        text = _WHITESPACE_RE.sub(" ", text).strip()[:MAX_PAGE_CHARS]
+        if text:
+            pages.append((number, text))
+    return len(reader.pages), pages
+
+
+def fetch(store, pdf_link):
+    """SHA-256 of the file behind `pdf_link`, downloading external links into the store"""
+    digest = pdf_store.digest_from_link(pdf_link)
+    if digest:
+        if not store.exists(digest):
+            raise ValueError("PDF is missing from the store")
+        return digest
+    if not pdf_link.startswith(("http://", "https://")):
+        raise ValueError("Not a web link")
+    request = urllib.request.Request(pdf_link, headers={"User-Agent": "KnowledgeHub/1.0"})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response, store.upload() as upload:
+        for chunk in iter(lambda: response.read(pdf_store.CHUNK_SIZE), b""):
+            upload.write(chunk)
+        return upload.finish()
+
+
+def progress(pool):
+    """Books per extraction status, plus indexed files and pages"""
+    counts = dict(pool.query("SELECT status, COUNT(*) FROM book_pdfs GROUP BY status"))
+    documents, pages = pool.query_one("SELECT COUNT(*), COALESCE(SUM(text_pages), 0) FROM pdf_documents")
+    return {"pending": counts.get("pending", 0), "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0), "documents": documents, "pages": pages}
+
+
+def retry_failed(pool):
+    """Queue every failed book again; returns how many"""
+    return pool.execute("UPDATE book_pdfs SET status = 'pending', error = NULL WHERE status = 'failed'").rowcount
+
+
+def prune(pool):
+    """Drop the text of files no book links to any more"""
+    with pool.transaction(immediate=True) as conn:
+        conn.execute('''
+            DELETE FROM pdf_pages WHERE sha256 NOT IN
+                (SELECT sha256 FROM book_pdfs WHERE sha256 IS NOT NULL)
+        ''')
+        return conn.execute('''
+            DELETE FROM pdf_documents WHERE sha256 NOT IN
+                (SELECT sha256 FROM book_pdfs WHERE sha256 IS NOT NULL)
+        ''').rowcount
+
+
+class Extractor:
+    """Indexes pending book PDFs on a background thread and worker processes"""
+
+    def __init__(self, pool, store, workers=WORKERS):
+        self.pool = pool
+        self.store = store
+        self.workers = workers
+        self._processes = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Run in the background until stop(); call wake() after adding PDFs"""
+        self._thread = threading.Thread(target=self._loop, name="pdf-text", daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        if self._processes:
+            self._processes.shutdown(cancel_futures=True)
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                while self.run_once() and not self._stopping.is_set():
+                    pass
+            except Exception:
+                logger.exception("PDF text extraction failed")
+            self._wake.wait(POLL_INTERVAL)
+
+    def _executor(self):
+        if self._processes is None:
+            # spawn, not fork: the parent is a threaded server
+            self._processes = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._processes
+
+    def run_once(self):
+        """Index the next batch of pending books; returns how many were handled"""
+        rows = self.pool.query("SELECT book_id, pdf_link FROM book_pdfs WHERE status = 'pending' "
+                               "ORDER BY book_id LIMIT ?", (CLAIM_BATCH,))
+        books_by_digest = {}
+        for book, pdf_link in rows:
+            try:
+                digest = fetch(self.store, pdf_link)
+            except Exception as e:
+                # Any bad link (truncated download, malformed URL, ...) must
+                # leave the queue, or it would head every batch from now on
+                self._failed([(book, pdf_link)], e)
+                continue
+            books_by_digest.setdefault(digest, []).append((book, pdf_link))
+
+        indexed = {row[0] for row in self.pool.query(
+            f"SELECT sha256 FROM pdf_documents WHERE sha256 IN ({', '.join('?' * len(books_by_digest))})",
+            tuple(books_by_digest))} if books_by_digest else set()
+        for digest in indexed:
+            self._save(digest, None, books_by_digest[digest])
+
+        futures = {self._executor().submit(extract_pages, self.store.path(digest)): digest
+                   for digest in books_by_digest if digest not in indexed}
+        for future in as_completed(futures):
+            digest = futures[future]
+            try:
+                self._save(digest, future.result(), books_by_digest[digest])
+            except Exception as e:
+                self._failed(books_by_digest[digest], e)
+        return len(rows)
+
+    def _save(self, digest, extracted, books):
+        with self.pool.transaction(immediate=True) as conn:
+            known = conn.execute("SELECT 1 FROM pdf_documents WHERE sha256 = ?", (digest,)).fetchone()
+            if extracted is not None and known is None:
+                page_count, pages = extracted
+                conn.executemany("INSERT INTO pdf_pages (text, sha256, page) VALUES (?, ?, ?)",
+                                 ((text, digest, number) for number, text in pages))
+                conn.execute("INSERT INTO pdf_documents (sha256, pages, text_pages) VALUES (?, ?, ?)",
+                             (digest, page_count, len(pages)))
+            # Only if the link hasn't changed meanwhile (that queued the book again)
+            conn.executemany('''
+                UPDATE book_pdfs SET status = 'done', sha256 = ?, error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE book_id = ? AND pdf_link = ?
+            ''', ((digest, book, pdf_link) for book, pdf_link in books))
+
+    def _failed(self, books, error):
+        logger.warning("Could not index %s: %s", [pdf_link for _, pdf_link in books], error)
+        with self.pool.transaction() as conn:
+            conn.executemany('''
+                UPDATE book_pdfs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE book_id = ? AND pdf_link = ?
+            ''', ((str(error)[:500], book, pdf_link) for book, pdf_link in books))
+
+
+if __name__ == "__main__":
+    # python pdf_text.py [retry|prune] [path/to/lms.db]
+    #   no command: index every pending PDF, then exit
+    #   retry: queue failed books again first
+    #   prune: drop the text of files no book links to
+    args = sys.argv[1:]
+    command = args.pop(0) if args and args[0] in ("retry", "prune") else None
+    pool = db.ConnectionPool(args[0] if args else db.DB_PATH)
+    if command == "prune":
+        print(f"Pruned {prune(pool)} files")
+        sys.exit()
+    if command == "retry":
+        print(f"Queued {retry_failed(pool)} failed books again")
+    extractor = Extractor(pool, pdf_store.PdfStore())
+    while extractor.run_once():
+        print(progress(pool))
+    extractor.stop()
+    print(progress(pool))
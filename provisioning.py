@@ -0,0 +1,183 @@
+import csv
+import io
+import multiprocessing
+import os
+import re
+import secrets
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+import auth
+
+# ===== BULK USER PROVISIONING =====
+# Creates accounts from a roster CSV (username, email, optional password and
+# role). Rows that would hit the users UNIQUE constraints are found with one
+# query per batch *before* hashing, so no bcrypt time is spent on them. The
+# remaining passwords are hashed across a process pool (bcrypt is CPU bound)
+# and each batch is inserted with executemany in a single transaction.
+
+BCRYPT_ROUNDS = auth.BCRYPT_ROUNDS     # same cost as register_user
+BATCH_SIZE = 500
+MAX_WORKERS = os.cpu_count() or 2
+ROLES = ("user", "admin")
+
+USERNAME_RE = re.compile(r"^[\w.@-]{1,64}$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+$")
+
+ProvisionResult = namedtuple("ProvisionResult", ["created", "problems", "credentials"])
+# problems: (row number, username, reason); credentials: (username, password)
+# for rows whose password was generated
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def get_executor():
+    """Process pool shared by every provisioning run in this process.
+
+    Uses spawn so workers don't inherit the web server's threads and locks.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def hash_many(passwords, rounds=BCRYPT_ROUNDS):
+    """bcrypt hashes of `passwords`, computed in parallel, in order"""
+    passwords = list(passwords)
+    if not passwords:
+        return []
+    if MAX_WORKERS == 1:
+        # A pool on a single core only adds process start-up and IPC
+        return [_hash(password, rounds) for password in passwords]
+    chunksize = max(1, len(passwords) // (MAX_WORKERS * 4))
+    return list(get_executor().map(_hash, passwords, [rounds] * len(passwords), chunksize=chunksize))
+
+
+def read_roster(fileobj):
+    """(row number, {username, email, password, role}) for each CSV row"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        for number, row in enumerate(csv.DictReader(text), start=2):  # row 1 is the header
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+            yield number, {
+                "username": row.get("username") or row.get("user") or "",
+                "email": row.get("email") or "",
+                "password": row.get("password") or "",
+                "role": (row.get("role") or "").lower(),
+            }
+    finally:
+        text.detach()
+
+
+def _existing(conn, column, values):
+    if not values:
+        return set()
+    placeholders = ", ".join("?" * len(values))
+    return {row[0].lower() for row in conn.execute(
+        f"SELECT {column} FROM users WHERE {column} COLLATE NOCASE IN ({placeholders})", list(values))}
+
+
+def _insert(pool, rows, problems):
+    """Insert one batch; fall back to row by row if another writer raced us"""
+    sql = "INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)"
+    try:
+        with pool.transaction() as conn:
+            conn.executemany(sql, [row[1:] for row in rows])
+        return len(rows)
+    except sqlite3.IntegrityError:
+        created = 0
+        for number, *values in rows:
+            try:
+                pool.execute(sql, values)
+                created += 1
+            except sqlite3.IntegrityError:
+                problems.append((number, values[0], "username or email already exists"))
+        return created
+
+
+def provision_users(pool, fileobj, default_role="user", rounds=BCRYPT_ROUNDS,
+                    batch_size=BATCH_SIZE, progress=None):
+    """Create every valid account in a roster CSV.
+
+    `progress(rows_done, created)` is called after each batch. Rows without
+    a password get a generated one, returned in `credentials`.
+    """
+    created = rows_done = 0
+    problems, credentials = [], []
+    seen_usernames, seen_emails = set(), set()
+
+    def flush(batch):
+        nonlocal created
+        with pool.connection() as conn:
+            taken_usernames = _existing(conn, "username", [r["username"] for _, r in batch])
+            taken_emails = _existing(conn, "email", [r["email"] for _, r in batch if r["email"]])
+        to_create = []
+        for number, row in batch:
+            if row["username"].lower() in taken_usernames:
+                problems.append((number, row["username"], "username already exists"))
+            elif row["email"] and row["email"].lower() in taken_emails:
+                problems.append((number, row["username"], f"email {row['email']} already exists"))
+            else:
+                to_create.append((number, row))
+
+        hashes = hash_many([row["password"] for _, row in to_create], rounds)
+        rows = [(number, row["username"], row["email"] or None, password_hash, row["role"])
+                for (number, row), password_hash in zip(to_create, hashes)]
+        created += _insert(pool, rows, problems)
+
+    batch = []
+    for number, row in read_roster(fileobj):
+        rows_done += 1
+        row["role"] = row["role"] or default_role
+        username = row["username"]
+        if not USERNAME_RE.match(username):
+            problems.append((number, username, "missing or invalid username"))
+            continue
+        if row["email"] and not EMAIL_RE.match(row["email"]):
+            problems.append((number, username, f"invalid email {row['email']!r}"))
+            continue
+        if row["role"] not in ROLES:
+            problems.append((number, username, f"unknown role {row['role']!r}"))
+            continue
+        if username.lower() in seen_usernames:
+            problems.append((number, username, "duplicate username in file"))
+            continue
+        if row["email"] and row["email"].lower() in seen_emails:
+            problems.append((number, username, "duplicate email in file"))
+            continue
+        seen_usernames.add(username.lower())
+        if row["email"]:
+            seen_emails.add(row["email"].lower())
+        if not row["password"]:
+            row["password"] = secrets.token_urlsafe(9)
+            credentials.append((number, username, row["password"]))
+
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+            if progress:
+                progress(rows_done, created)
+    if batch:
+        flush(batch)
+    if progress:
+        progress(rows_done, created)
+
+    # Only report generated passwords for accounts that were actually created
+    failed = {number for number, _, _ in problems}
+    credentials = [(username, password) for number, username, password in credentials
+                   if number not in failed]
+    problems.sort()
+    return ProvisionResult(created, problems, credentials)
@@ -0,0 +1,177 @@
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy import sparse
+
+# ===== CO-BORROWING RECOMMENDATIONS =====
+# Item-item collaborative filtering over the loan history. The books x books
+# co-occurrence matrix (how many readers borrowed both) is built once as
+# X.T @ X from a sparse users x books matrix; new loans are added to a small
+# pending delta that is folded into the matrix in batches. Each book's top
+# neighbours (cosine: co-readers / sqrt(readers_a * readers_b)) are kept
+# precomputed, so serving a "readers also borrowed" list is a dict lookup
+# and a per-user list only merges the neighbour lists of the user's books.
+
+TOP_NEIGHBORS = 20
+# Only the most recent books in a user's history shape their recommendations
+USER_HISTORY = 20
+FOLD_EVERY = 1000       # pending co-occurrence increments before folding
+
+
+class Recommender:
+    """Item-item recommender with incrementally maintained neighbour lists"""
+
+    def __init__(self, loans=()):
+        self._lock = threading.RLock()
+        self.rebuild(loans)
+
+    def rebuild(self, loans):
+        """Recompute everything from (user id, book id) pairs, oldest first"""
+        with self._lock:
+            self._user_books = defaultdict(dict)     # user -> {book id: None}, oldest first
+            self._col_of = {}                        # book id -> matrix column
+            self._book_ids = []
+            for user_id, book_id in loans:
+                self._user_books[user_id][book_id] = None
+                self._column(book_id)
+
+            user_ids = list(self._user_books)
+            rows, cols = [], []
+            for row, user_id in enumerate(user_ids):
+                for book_id in self._user_books[user_id]:
+                    rows.append(row)
+                    cols.append(self._col_of[book_id])
+            n_books = len(self._book_ids)
+            readers = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                shape=(len(user_ids), n_books))
+
+            cooc = (readers.T @ readers).tocsr()
+            cooc.setdiag(0)
+            cooc.eliminate_zeros()
+            self._cooc = cooc
+            self._counts = np.asarray(readers.sum(axis=0), dtype=np.float64).ravel()
+            self._delta = defaultdict(Counter)      # col -> {col: extra co-readers}
+            self._pending = 0
+            self._version = 0
+            self._user_recs = {}
+
+            self._neighbors = {}
+            for col in range(n_books):
+                self._neighbors[self._book_ids[col]] = self._top_neighbors(col)
+
+    def _column(self, book_id):
+        col = self._col_of.get(book_id)
+        if col is None:
+            col = self._col_of[book_id] = len(self._book_ids)
+            self._book_ids.append(book_id)
+        return col
+
+    def _top_neighbors(self, col):
+        """Best co-borrowed books for one column, as [(book id, score)]"""
+        if col < self._cooc.shape[0]:
+            start, end = self._cooc.indptr[col], self._cooc.indptr[col + 1]
+            others = self._cooc.indices[start:end]
+            together = self._cooc.data[start:end].astype(np.float64)
+        else:
+            others = np.zeros(0, dtype=np.int64)
+            together = np.zeros(0, dtype=np.float64)
+        extra = self._delta.get(col)
+        if extra:
+            others = np.concatenate([others, np.fromiter(extra.keys(), dtype=np.int64)])
+            together = np.concatenate([together, np.fromiter(extra.values(), dtype=np.float64)])
+            others, inverse = np.unique(others, return_inverse=True)
+            together = np.bincount(inverse, weights=together)
+        if not len(others):
+            return []
+
+        scores = together / np.sqrt(self._counts[col] * self._counts[others])
+        if len(scores) > TOP_NEIGHBORS:
+            top = np.argpartition(-scores, TOP_NEIGHBORS - 1)[:TOP_NEIGHBORS]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._book_ids[others[i]], float(scores[i])) for i in top]
+
+    def _fold(self):
+        """Merge the pending increments into the sparse matrix"""
+        n_books = len(self._book_ids)
+        rows, cols, data = [], [], []
+        for col, extra in self._delta.items():
+            for other, count in extra.items():
+                rows.append(col)
+                cols.append(other)
+                data.append(count)
+        cooc = self._cooc
+        if cooc.shape[0] < n_books:
+            cooc = sparse.csr_matrix((cooc.data, cooc.indices, cooc.indptr.tolist()
+                                      + [cooc.indptr[-1]] * (n_books - cooc.shape[0])),
+                                     shape=(n_books, n_books))
+        self._cooc = (cooc + sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)), shape=(n_books, n_books))).tocsr()
+        self._delta = defaultdict(Counter)
+        self._pending = 0
+
+    def add_loan(self, user_id, book_id):
+        """Record a loan and refresh the neighbour lists it changes"""
+        with self._lock:
+            history = self._user_books[user_id]
+            if book_id in history:
+                # Re-borrowing says nothing new; just mark it as recent
+                history.pop(book_id)
+                history[book_id] = None
+                self._user_recs.pop(user_id, None)
+                return
+            col = self._column(book_id)
+            if len(self._counts) < len(self._book_ids):
+                self._counts = np.concatenate(
+                    [self._counts, np.zeros(len(self._book_ids) - len(self._counts))])
+            self._counts[col] += 1
+
+            touched = [col]
+            for other_id in history:
+                other = self._col_of[other_id]
+                self._delta[col][other] += 1
+                self._delta[other][col] += 1
+                self._pending += 2
+                touched.append(other)
+            history[book_id] = None
+
+            # Books that merely share readers with this one keep slightly
+            # stale scores until their own lists are next refreshed
+            for touched_col in touched:
+                self._neighbors[self._book_ids[touched_col]] = self._top_neighbors(touched_col)
+            if self._pending >= FOLD_EVERY:
+                self._fold()
+            self._version += 1
+
+    def also_borrowed(self, book_id, n=5):
+        """Books most often borrowed by readers of `book_id`"""
+        return [other for other, _ in self._neighbors.get(book_id, ())[:n]]
+
+    def for_user(self, user_id, n=5):
+        """Books a reader hasn't borrowed, ranked from their recent history"""
+        with self._lock:
+            cached = self._user_recs.get(user_id)
+            if cached is not None and cached[0] == self._version:
+                return cached[1][:n]
+            history = self._user_books.get(user_id, {})
+            recent = list(history)[-USER_HISTORY:]
+            scores = Counter()
+            for book_id in recent:
+                for other, score in self._neighbors.get(book_id, ()):
+                    if other not in history:
+                        scores[other] += score
+            recs = [book_id for book_id, _ in scores.most_common(TOP_NEIGHBORS)]
+            self._user_recs[user_id] = (self._version, recs)
+            return recs[:n]
+
+
+def load_loans(pool):
+    """Every loan, current and returned, oldest first"""
+    return pool.query("SELECT user_id, book_id FROM loans ORDER BY id")
+
+
+def build_recommender(pool):
+    return Recommender(load_loans(pool))
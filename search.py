@@ -0,0 +1,93 @@
+import re
+
+# ===== CATALOG SEARCH (FTS5) =====
+# Ranked search over books_fts (see migration 4). User text is never
+# interpolated into SQL: it is turned into an FTS5 MATCH expression made
+# only of quoted tokens, which is then passed as a bound parameter.
+# search_inside() does the same over the page text of book PDFs
+# (pdf_pages, see pdf_text.py).
+
+# bm25 column weights: title, author, genre
+RANK_WEIGHTS = (10.0, 5.0, 2.0)
+DEFAULT_LIMIT = 10
+SNIPPET_TOKENS = 16
+
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def build_match_expression(text, column=None):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Quoted "phrases" must match as phrases; every other word is matched as
+    a prefix, so "tolk hob" finds "Tolkien - The Hobbit". Returns None when
+    the text has no searchable words.
+    """
+    if not text:
+        return None
+    terms = []
+    for phrase in _PHRASE_RE.findall(text):
+        words = _TOKEN_RE.findall(phrase)
+        if words:
+            terms.append(_quote(" ".join(words)))
+    for word in _TOKEN_RE.findall(_PHRASE_RE.sub(" ", text)):
+        terms.append(_quote(word) + "*")
+    if not terms:
+        return None
+    expression = " AND ".join(terms)
+    if column:
+        expression = f"{column} : ({expression})"
+    return expression
+
+
+def search_books(pool, text=None, author=None, genre=None, limit=DEFAULT_LIMIT):
+    """BM25-ranked catalog search.
+
+    Returns rows of (id, title, author, genre, price, pdf_link, status,
+    available copies, copies), best match first.
+    """
+    clauses = [
+        build_match_expression(text),
+        build_match_expression(author, "author"),
+        build_match_expression(genre, "genre"),
+    ]
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return []
+
+    return pool.query(f'''
+        SELECT b.id, b.title, b.author, b.genre, b.price, b.pdf_link,
+               CASE WHEN b.available > 0 THEN 'Available' ELSE 'Checked Out' END AS status,
+               b.available, b.copies
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ?
+        ORDER BY bm25(books_fts, {", ".join(str(w) for w in RANK_WEIGHTS)})
+        LIMIT ?
+    ''', (" AND ".join(clauses), limit))
+
+
+def search_inside(pool, text, limit=DEFAULT_LIMIT):
+    """BM25-ranked search of the text inside book PDFs.
+
+    Returns rows of (book id, title, author, pdf_link, page number,
+    snippet), best match first. Matched words in the snippet are **bold**.
+    """
+    expression = build_match_expression(text)
+    if not expression:
+        return []
+
+    return pool.query(f'''
+        SELECT b.id, b.title, b.author, b.pdf_link, pdf_pages.page,
+               snippet(pdf_pages, 0, '**', '**', ' … ', {SNIPPET_TOKENS})
+        FROM pdf_pages
+        JOIN book_pdfs bp ON bp.sha256 = pdf_pages.sha256 AND bp.status = 'done'
+        JOIN books b ON b.id = bp.book_id
+        WHERE pdf_pages MATCH ?
+        ORDER BY bm25(pdf_pages)
+        LIMIT ?
+    ''', (expression, limit))
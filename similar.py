@@ -0,0 +1,221 @@
+import math
+import re
+import threading
+
+import numpy as np
+
+# ===== "SIMILAR BOOKS IN OUR COLLECTION" INDEX =====
+# TF-IDF vectors over each book's title words, author and genre, held in an
+# in-memory inverted index (term -> NumPy arrays of rows and term counts).
+# A lookup only touches the postings of the query's few terms, scores them
+# with cosine similarity and takes the top k with argpartition, so it stays
+# in the low milliseconds at 100k titles. Books are added and removed
+# incrementally; removed rows are tombstoned until the next rebuild.
+
+DEFAULT_K = 5
+INITIAL_CAPACITY = 1024
+# Refresh document norms once this share of rows was added under older IDFs
+RENORM_FRACTION = 0.1
+
+STOPWORDS = frozenset(
+    "a an and at by for from in into is it its of on or the to with".split()
+)
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def book_terms(title, author=None, genre=None):
+    """Term counts describing one book.
+
+    Title words count once each; the author and genre are whole-value terms
+    so "Anuja Chauhan" only matches her own books, plus the author's name
+    words so a surname alone still finds them.
+    """
+    terms = {}
+    for word in WORD_RE.findall((title or "").lower()):
+        if word not in STOPWORDS:
+            terms[word] = terms.get(word, 0) + 1
+    author = (author or "").strip().lower()
+    if author:
+        terms["author:" + author] = 1
+        for word in WORD_RE.findall(author):
+            terms["by:" + word] = 1
+    genre = (genre or "").strip().lower()
+    if genre:
+        terms["genre:" + genre] = 1
+    return terms
+
+
+class SimilarityIndex:
+    """Incrementally updated TF-IDF index with cosine top-k lookups"""
+
+    def __init__(self, books=()):
+        self._lock = threading.RLock()
+        self._reset()
+        for book in books:
+            self._add(*book, normalize=False)
+        self._renormalize()
+
+    def _reset(self):
+        self._ids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._norms = np.ones(INITIAL_CAPACITY, dtype=np.float32)
+        self._alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._size = 0                  # rows used, including tombstones
+        self._live = 0
+        self._row_of = {}               # book id -> row
+        self._doc_terms = []            # row -> {term: count}
+        self._postings = {}             # term -> ([rows], [counts])
+        self._arrays = {}               # term -> (rows array, counts array)
+        self._df = {}                   # term -> live documents containing it
+        self._stale_rows = 0
+
+    def __len__(self):
+        return self._live
+
+    def _idf(self, term):
+        return math.log((1 + self._live) / (1 + self._df.get(term, 0))) + 1.0
+
+    def _norm(self, terms):
+        return math.sqrt(sum((count * self._idf(t)) ** 2 for t, count in terms.items())) or 1.0
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        for name in ("_ids", "_norms", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _add(self, book_id, title, author=None, genre=None, normalize=True):
+        if book_id in self._row_of:
+            self._remove(book_id)
+        if self._size == len(self._ids):
+            self._grow()
+        row = self._size
+        self._size += 1
+        terms = book_terms(title, author, genre)
+        self._ids[row] = book_id
+        self._alive[row] = True
+        self._row_of[book_id] = row
+        self._doc_terms.append(terms)
+        self._live += 1
+        for term, count in terms.items():
+            rows, counts = self._postings.setdefault(term, ([], []))
+            rows.append(row)
+            counts.append(count)
+            self._arrays.pop(term, None)
+            self._df[term] = self._df.get(term, 0) + 1
+        if normalize:
+            self._norms[row] = self._norm(terms)
+        self._stale_rows += 1
+
+    def _remove(self, book_id):
+        row = self._row_of.pop(book_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._live -= 1
+        for term in self._doc_terms[row]:
+            self._df[term] -= 1
+
+    def _renormalize(self):
+        """Recompute every document norm under the current IDFs"""
+        # Flatten all postings once and do the arithmetic in NumPy
+        rows, counts, lengths, df = [], [], [], []
+        for term, (term_rows, term_counts) in self._postings.items():
+            rows.extend(term_rows)
+            counts.extend(term_counts)
+            lengths.append(len(term_rows))
+            df.append(self._df[term])
+        idf = np.log((1 + self._live) / (1 + np.asarray(df, dtype=np.float64))) + 1.0
+        weights = np.asarray(counts, dtype=np.float64) * np.repeat(idf, lengths)
+        norms_sq = np.bincount(np.asarray(rows, dtype=np.int64), weights=weights ** 2,
+                               minlength=self._size)
+        self._norms[:self._size] = np.sqrt(norms_sq).clip(min=1e-9)
+        self._stale_rows = 0
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, counts = self._postings[term]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(counts, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def add(self, book_id, title, author=None, genre=None):
+        """Index a new book (re-indexes it if the id is already present)"""
+        with self._lock:
+            self._add(book_id, title, author, genre)
+            if self._stale_rows > RENORM_FRACTION * max(self._live, 1):
+                self._renormalize()
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def rebuild(self, books):
+        """Replace the whole index, dropping tombstones"""
+        with self._lock:
+            self._reset()
+            for book in books:
+                self._add(*book, normalize=False)
+            self._renormalize()
+
+    def _top_k(self, terms, k, exclude=()):
+        if not terms or not self._live:
+            return []
+        scores = np.zeros(self._size, dtype=np.float32)
+        query_norm = 0.0
+        for term, count in terms.items():
+            if term not in self._postings:
+                continue
+            idf = self._idf(term)
+            weight = count * idf
+            query_norm += weight * weight
+            rows, counts = self._term_arrays(term)
+            # Each row appears at most once per term, so plain += is safe
+            scores[rows] += weight * idf * counts
+        if query_norm == 0.0:
+            return []
+        scores /= self._norms[:self._size] * math.sqrt(query_norm)
+        scores[~self._alive[:self._size]] = 0.0
+        for book_id in exclude:
+            row = self._row_of.get(book_id)
+            if row is not None:
+                scores[row] = 0.0
+
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self._ids[row]), float(scores[row])) for row in top if scores[row] > 0]
+
+    def similar_to(self, book_id, k=DEFAULT_K):
+        """Books most like an indexed book, as (book id, score), best first"""
+        with self._lock:
+            row = self._row_of.get(book_id)
+            if row is None:
+                return []
+            return self._top_k(self._doc_terms[row], k, exclude=(book_id,))
+
+    def query(self, title, author=None, genre=None, k=DEFAULT_K, exclude=()):
+        """Books most like a free-text description, as (book id, score)"""
+        with self._lock:
+            return self._top_k(book_terms(title, author, genre), k, exclude)
+
+
+def load_books(pool):
+    return pool.query("SELECT id, title, author, genre FROM books")
+
+
+def build_index(pool):
+    return SimilarityIndex(load_books(pool))
+
+
+def describe(pool, book_ids):
+    """(id, title, author, genre) rows for `book_ids`, in the same order"""
+    if not book_ids:
+        return []
+    placeholders = ", ".join("?" * len(book_ids))
+    rows = pool.query(
+        f"SELECT id, title, author, genre FROM books WHERE id IN ({placeholders})", list(book_ids))
+    by_id = {row[0]: row for row in rows}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
@@ -0,0 +1,70 @@
+import importlib
+import threading
+from collections import deque
+
+# ===== FAST STARTUP =====
+# Heavy libraries (pandas, the Gemini SDK, NumPy/SciPy through similar.py
+# and recommend.py) are bound to LazyModule stand-ins in app.py and only
+# imported the first time one of their attributes is used, so the login
+# screen never pays for them. RunTimer records how long each script run
+# takes, so the admin Performance page can show cold start and rerun cost
+# against the budgets below.
+
+COLD_START_BUDGET_MS = 2500     # first script run in a fresh process, imports included
+RERUN_BUDGET_MS = 150           # p95 of every later run
+RUN_SAMPLES = 500
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is first used"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__dict__["_name"])
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class RunTimer:
+    """Durations of complete script runs in this process"""
+
+    def __init__(self):
+        self.cold_start = None      # seconds, the first complete run
+        self._runs = deque(maxlen=RUN_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            if self.cold_start is None:
+                self.cold_start = seconds
+            else:
+                self._runs.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            runs = list(self._runs)
+        p50, p95 = percentile(runs, 0.5), percentile(runs, 0.95)
+        return {
+            "cold_start_ms": self.cold_start * 1000 if self.cold_start is not None else None,
+            "reruns": len(runs),
+            "rerun_p50_ms": p50 * 1000 if p50 is not None else None,
+            "rerun_p95_ms": p95 * 1000 if p95 is not None else None,
+        }
@@ -0,0 +1,111 @@
+import sys
+
+import db
+
+# ===== CIRCULATION STATISTICS =====
+# Running aggregates over the loans ledger, kept current by triggers on
+# loans (the tables and triggers are defined in migration 6), so dashboard
+# metrics are a single-row read however long the loan history gets. Every
+# loan contributes +1 when it is inserted and -1 when it is deleted; an
+# update removes the old row's contribution and adds the new one's.
+#
+# Averages are stored as sums: the mean current borrow duration is
+# now - (sum of open borrow julian days / open loans with a date).
+
+
+def rebuild(conn):
+    """Recompute every aggregate from the loans table (repair).
+
+    Runs in the caller's transaction.
+    """
+    for table in ("circulation_totals", "circulation_book_stats",
+                  "circulation_user_stats", "circulation_daily"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute('''
+        INSERT INTO circulation_totals (id, total_loans, open_loans, open_dated, open_borrowed_jd,
+                                        returned_loans, returned_dated, returned_days)
+        SELECT 1,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE returned_at IS NULL),
+               COUNT(borrowed_at) FILTER (WHERE returned_at IS NULL),
+               COALESCE(SUM(julianday(borrowed_at)) FILTER (WHERE returned_at IS NULL), 0),
+               COUNT(returned_at),
+               COUNT(borrowed_at) FILTER (WHERE returned_at IS NOT NULL),
+               COALESCE(SUM(julianday(returned_at) - julianday(borrowed_at)), 0)
+        FROM loans
+    ''')
+    conn.execute('''
+        INSERT INTO circulation_book_stats (book_id, loans, open_loans)
+        SELECT book_id, COUNT(*), COUNT(*) FILTER (WHERE returned_at IS NULL)
+        FROM loans GROUP BY book_id
+    ''')
+    conn.execute('''
+        INSERT INTO circulation_user_stats (user_id, loans, open_loans)
+        SELECT user_id, COUNT(*), COUNT(*) FILTER (WHERE returned_at IS NULL)
+        FROM loans GROUP BY user_id
+    ''')
+    conn.execute('''
+        INSERT INTO circulation_daily (day, borrowed, returned)
+        SELECT day, SUM(borrowed), SUM(returned) FROM (
+            SELECT date(borrowed_at) AS day, 1 AS borrowed, 0 AS returned
+            FROM loans WHERE borrowed_at IS NOT NULL
+            UNION ALL
+            SELECT date(returned_at), 0, 1 FROM loans WHERE returned_at IS NOT NULL
+        )
+        GROUP BY day
+    ''')
+
+
+def summary(pool):
+    """Dashboard totals, read from the single circulation_totals row"""
+    row = pool.query_one('''
+        SELECT total_loans, open_loans, returned_loans,
+               CASE WHEN open_dated > 0
+                    THEN julianday('now') - open_borrowed_jd / open_dated END,
+               CASE WHEN returned_dated > 0 THEN returned_days / returned_dated END
+        FROM circulation_totals WHERE id = 1
+    ''')
+    total, open_loans, returned, avg_open_days, avg_kept_days = row or (0, 0, 0, None, None)
+    return {
+        "total_loans": total,
+        "open_loans": open_loans,
+        "returned_loans": returned,
+        "avg_open_days": avg_open_days,
+        "avg_kept_days": avg_kept_days,
+    }
+
+
+def top_books(pool, limit=10):
+    """Most borrowed books as (title, loans, currently out)"""
+    return pool.query('''
+        SELECT b.title, s.loans, s.open_loans
+        FROM circulation_book_stats s
+        JOIN books b ON b.id = s.book_id
+        WHERE s.loans > 0
+        ORDER BY s.loans DESC
+        LIMIT ?
+    ''', (limit,))
+
+
+def daily(pool, days=30):
+    """Loans and returns per day over the last `days` days, oldest first"""
+    return pool.query('''
+        SELECT day, borrowed, returned
+        FROM circulation_daily
+        WHERE day >= date('now', ?)
+        ORDER BY day
+    ''', (f"-{days - 1} days",))
+
+
+if __name__ == "__main__":
+    # Repair: python stats.py rebuild [path/to/lms.db]
+    import migrations
+
+    if sys.argv[1:2] != ["rebuild"]:
+        sys.exit("usage: python stats.py rebuild [database]")
+    pool = db.ConnectionPool(sys.argv[2] if len(sys.argv) > 2 else db.DB_PATH, size=1)
+    with pool.connection() as conn:
+        migrations.migrate(conn)
+    with pool.transaction() as conn:
+        rebuild(conn)
+    print(summary(pool))
@@ -0,0 +1,203 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import db
+
+# ===== SINGLE-WRITER QUEUE =====
+# Circulation and catalog writes from every session are handed to one writer
+# thread per process instead of each opening a transaction of its own. The
+# writer holds the only write connection, takes every command that is waiting
+# (up to MAX_BATCH) and runs them in one BEGIN IMMEDIATE ... COMMIT, so
+# sessions stop fighting over the write lock and a burst pays for one commit
+# instead of one per write: whatever queues up while a batch commits becomes
+# the next batch. Each command runs
+# inside its own SAVEPOINT: one that raises is rolled back alone and its
+# caller gets the exception, while the rest of the batch still commits.
+# Lock contention with other processes (the API workers, bulk imports) is
+# retried with backoff; callers only see it once RETRIES are used up.
+#
+# A command is any function written against a db.ConnectionPool, e.g.
+# library.borrow_book; the writer passes it a pool-like view of the batch.
+
+MAX_BATCH = 64
+MAX_WAIT = 0.0              # seconds to linger for more commands before committing
+RETRIES = 5
+RETRY_BACKOFF = 0.05        # seconds, doubled on each retry
+
+_STOP = object()
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class BatchPool:
+    """The writer's connection, dressed as a db.ConnectionPool for one command.
+
+    Transactions become savepoints inside the batch, and nothing commits
+    until the whole batch does.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._depth = 0
+
+    @contextmanager
+    def connection(self):
+        yield self._conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # The batch already holds the write lock, so `immediate` is implied
+        self._depth += 1
+        name = f"sp{self._depth}"
+        self._conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute(f"ROLLBACK TO {name}")
+            raise
+        finally:
+            self._conn.execute(f"RELEASE {name}")
+            self._depth -= 1
+
+    def query(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        with self.transaction() as conn:
+            return conn.execute(sql, params)
+
+
+class WriteQueue:
+    """One writer thread that group-commits queued write commands"""
+
+    def __init__(self, path=db.DB_PATH, max_batch=MAX_BATCH, max_wait=MAX_WAIT,
+                 retries=RETRIES, backoff=RETRY_BACKOFF):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.SimpleQueue()
+        self._conn = None
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        self._batches = 0
+        self._retried = 0
+        self._thread = threading.Thread(target=self._loop, name="lms-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        """Queue `fn(pool, *args)`; returns a Future for its result"""
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def run(self, fn, *args):
+        """Queue `fn(pool, *args)` and wait until its batch has committed.
+
+        Returns what `fn` returned, or raises what it raised.
+        """
+        return self.submit(fn, *args).result()
+
+    def close(self):
+        """Finish the queued writes and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "writes": self._writes,
+                "batches": self._batches,
+                "writes_per_batch": self._writes / self._batches if self._batches else 0.0,
+                "retries": self._retried,
+            }
+
+    # ----- writer thread -----
+
+    def _loop(self):
+        self._conn = db.open_connection(self.path)
+        # Transactions are managed here, not by the sqlite3 module
+        self._conn.isolation_level = None
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._commit(batch)
+                if stop:
+                    return
+        finally:
+            self._conn.close()
+
+    def _next_batch(self):
+        """Block for one command, then gather what else is (or soon will be) queued"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                wait = deadline - time.monotonic()
+                item = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        for attempt in range(self.retries + 1):
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                outcomes = [self._apply(fn, args) for _, fn, args in batch]
+                self._conn.execute("COMMIT")
+                break
+            except sqlite3.OperationalError as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                if not _is_busy(e) or attempt == self.retries:
+                    outcomes = [(False, e)] * len(batch)
+                    break
+                with self._stats_lock:
+                    self._retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                outcomes = [(False, e)] * len(batch)
+                break
+
+        with self._stats_lock:
+            self._writes += len(batch)
+            self._batches += 1
+        for (future, _, _), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _apply(self, fn, args):
+        """Run one command inside the open batch; returns (ok, result or error)"""
+        pool = BatchPool(self._conn)
+        try:
+            with pool.transaction():
+                return True, fn(pool, *args)
+        except sqlite3.OperationalError as e:
+            if _is_busy(e):
+                raise   # retry the whole batch
+            return False, e
+        except Exception as e:
+            return False, e